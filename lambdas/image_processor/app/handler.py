@@ -14,6 +14,7 @@ from app.utility.bucket_manager import BucketManager, ScanLocationStore
 from app.utility.sirius_service import SiriusService
 from app.utility.extraction_service import ExtractionService
 from app.utility.path_selection_service import PathSelectionService
+from app.utility.runtime_context import get_runtime_context
 
 logger = custom_logger("processor")
 patch_all()
@@ -27,6 +28,9 @@ class ImageProcessor:
         self.extraction_folder_path = "extraction"
         self.output_folder_path = "/tmp/output"
         self.folder_name = self.get_timestamp_as_str()
+        self.download_scans_on_demand = (
+            os.getenv("DOWNLOAD_SCANS_ON_DEMAND", "true").lower() == "true"
+        )
         self.continuation_instruction_count = 0
         self.continuation_preference_count = 0
         self.continuation_unknown_count = 0
@@ -40,16 +44,28 @@ class ImageProcessor:
         Main Process that receives a request triggered from SQS and extracts the
         instructions and preferences and pushes them to S3.
         """
-        bucket_manager = BucketManager(request_id=self.request_id, info_msg=self.info_msg)
-        sirius_service = SiriusService(environment=self.environment)
+        # Objects that don't change between requests are shared across warm invocations
+        runtime_context = get_runtime_context()
+        runtime_context.start_invocation()
+
+        bucket_manager = BucketManager(
+            request_id=self.request_id,
+            info_msg=self.info_msg,
+            runtime_context=runtime_context,
+        )
+        sirius_service = SiriusService(
+            environment=self.environment, runtime_context=runtime_context
+        )
         extraction_service = ExtractionService(
             extraction_folder_path=self.extraction_folder_path,
             folder_name=self.folder_name,
             output_folder_path=self.output_folder_path,
             info_msg=self.info_msg,
+            runtime_context=runtime_context,
         )
         path_selection_service = PathSelectionService(folder_name=self.folder_name)
 
+        downloaded_scan_locations = None
         try:
             self.uid = self.get_uid_from_event()
             current_subsegment = xray_recorder.current_subsegment()
@@ -64,9 +80,12 @@ class ImageProcessor:
             sirius_response_dict = sirius_service.make_request_to_sirius(self.uid)
             logger.debug(f"Response from Sirius: {str(sirius_response_dict)}")
 
-            # Download all files from sirius and store their path locations
+            # Download all files from sirius and store their path locations. In on demand mode
+            # the LPA scans are only downloaded, most relevant first, as the matcher needs them
             downloaded_scan_locations = bucket_manager.download_scanned_images(
-                sirius_response_dict, self.output_folder_path
+                sirius_response_dict,
+                self.output_folder_path,
+                on_demand=self.download_scans_on_demand,
             )
 
             # Extract all relevant images relating to instructions and preferences from downloaded documents
@@ -123,6 +142,16 @@ class ImageProcessor:
                     f"{dark_images_found} extracted images were found to be too dark to be likely to be readable"
                 )
 
+            # The manifest is written once the images have been checked, so the request
+            # handler only sees them as complete when they're usable
+            bucket_manager.put_manifest_to_bucket(
+                uid=self.uid,
+                path_selection=paths_to_extracted_images,
+                continuation_instruction_count=self.continuation_instruction_count,
+                continuation_preference_count=self.continuation_preference_count,
+                continuation_unknown_count=self.continuation_unknown_count,
+            )
+
             logger.debug("Finished pushing images to bucket")
 
             # Cleanup all the folders
@@ -138,6 +167,10 @@ class ImageProcessor:
             error_message = f"{self.request_id} {e} --- {stack_trace}"
             logger.error(error_message)
             bucket_manager.put_error_image_to_bucket(self.uid)
+        finally:
+            # Don't leave prefetches running into the next invocation
+            if downloaded_scan_locations is not None:
+                downloaded_scan_locations.close()
 
     @staticmethod
     def get_timestamp_as_str() -> str:
@@ -193,10 +226,14 @@ class ImageProcessor:
         Args:
         - downloaded_image_locations (dict): A dictionary containing the paths to the downloaded images.
         """
+        # Wait for any prefetched scans to finish so their files are removed too
+        downloaded_document_locations.close()
+
         downloaded_document_paths = []
-        # Extract the paths from the 'scans' key and add them to the list
+        # Extract the paths from the 'scans' key and add them to the list. Scans that were
+        # never downloaded on demand have no local path.
         for path in downloaded_document_locations.scans:
-            downloaded_document_paths.append(path.location)
+            downloaded_document_paths.append(path.local_location)
 
         # Extract the paths from the 'continuations' keys and add them to the list
         for _, path in downloaded_document_locations.continuations.items():
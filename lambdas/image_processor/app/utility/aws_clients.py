@@ -0,0 +1,22 @@
+import os
+
+from botocore.config import Config
+
+
+def client_config() -> Config:
+    """
+    Returns the botocore config shared by the lambda's boto3 clients.
+
+    Clients are built once per container (see RuntimeContext), so the connection pool is
+    sized for the concurrent S3 transfers and kept alive between warm invocations.
+    """
+    return Config(
+        max_pool_connections=int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "20")),
+        connect_timeout=int(os.getenv("AWS_CONNECT_TIMEOUT", "5")),
+        read_timeout=int(os.getenv("AWS_READ_TIMEOUT", "60")),
+        retries={
+            "max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "3")),
+            "mode": "standard",
+        },
+        tcp_keepalive=True,
+    )
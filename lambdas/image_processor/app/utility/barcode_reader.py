@@ -0,0 +1,247 @@
+import os
+import threading
+from collections.abc import Sequence
+from typing import Callable, Iterable, List, Optional, Union
+
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode
+
+from app.utility.custom_logging import custom_logger
+from app.utility.page_image import PageImage, load_page_image
+from app.utility.page_scheduler import get_page_scheduler
+
+logger = custom_logger("barcode_reader")
+
+
+class BarcodeReader:
+    """
+    Reads the barcode printed in the top right of LPA form pages.
+
+    Decoding is attempted in order of cost and stops at the first barcode found:
+    the grayscale region at native resolution, then candidate barcode regions found by
+    the locator, scaled up. Only if the locator found a region it couldn't decode, or
+    isn't used, is the whole region stretched the way it always has been, so that
+    barcodes which could only be read that way still are. Pages without anything that
+    looks like a barcode, the common case, never pay for the stretch.
+    """
+
+    def __init__(
+        self,
+        use_locator: bool = None,
+        max_candidates: int = 3,
+        slow_fallback: bool = True,
+    ):
+        if use_locator is None:
+            use_locator = os.getenv("BARCODE_LOCATOR", "1") == "1"
+        self.use_locator = use_locator
+        self.max_candidates = max_candidates
+        self.slow_fallback = slow_fallback
+
+    def read(self, page: Union[PageImage, np.ndarray, str]) -> Optional[str]:
+        """
+        Returns the first barcode found in the top right of the page, decoded as utf8,
+        or None if there isn't one.
+        """
+        if isinstance(page, PageImage):
+            image = page.image
+            gray = page.gray
+        else:
+            image = load_page_image(page)
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        gray_roi = self.region_of_interest(gray)
+        barcode = self.decode_first(gray_roi)
+        if barcode is not None:
+            return barcode
+
+        if self.use_locator:
+            candidates = self.locate_candidates(gray_roi)
+            for x, y, w, h in candidates:
+                candidate = cv2.resize(
+                    gray_roi[y : y + h, x : x + w],
+                    None,
+                    fx=2,
+                    fy=2,
+                    interpolation=cv2.INTER_LINEAR,
+                )
+                barcode = self.decode_first(candidate)
+                if barcode is not None:
+                    logger.debug("Decoded barcode from located region")
+                    return barcode
+            if len(candidates) == 0:
+                # Nothing on the page looks like a barcode for the stretch to find
+                return None
+
+        if not self.slow_fallback:
+            return None
+
+        # Slow fallback, the same as the original barcode stage
+        height, width = image.shape[:2]
+        roi_resized = cv2.resize(self.region_of_interest(image), (height, 4 * width))
+        barcode = self.decode_first(roi_resized)
+        if barcode is not None:
+            logger.debug("Decoded barcode from upscaled region")
+        return barcode
+
+    @staticmethod
+    def region_of_interest(image: np.ndarray) -> np.ndarray:
+        """
+        Returns the top right third of the page, where the form barcode is printed.
+        """
+        height, width = image.shape[:2]
+        return image[0 : height // 3, 2 * width // 3 : width]
+
+    @staticmethod
+    def decode_first(image: np.ndarray) -> Optional[str]:
+        """
+        Returns the first barcode decoded from the image as utf8, or None if there isn't one.
+        """
+        barcodes = decode(image)
+        if len(barcodes) > 0:
+            return barcodes[0].data.decode("utf-8")
+        return None
+
+    def locate_candidates(self, gray: np.ndarray) -> List[tuple]:
+        """
+        Finds regions of the image that look like barcodes, i.e. with strong gradients in one
+        direction and weak gradients in the other.
+
+        Returns:
+        - A list of (x, y, width, height) boxes, largest first.
+        """
+        grad_x = cv2.Sobel(gray, ddepth=cv2.CV_32F, dx=1, dy=0, ksize=-1)
+        grad_y = cv2.Sobel(gray, ddepth=cv2.CV_32F, dx=0, dy=1, ksize=-1)
+        # Bars are strong in one direction only, which covers vertical and horizontal barcodes
+        gradient = cv2.convertScaleAbs(cv2.absdiff(np.abs(grad_x), np.abs(grad_y)))
+
+        blurred = cv2.blur(gradient, (9, 9))
+        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+        closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+        closed = cv2.erode(closed, None, iterations=4)
+        closed = cv2.dilate(closed, None, iterations=4)
+
+        contours, _ = cv2.findContours(
+            closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        min_area = gray.shape[0] * gray.shape[1] * 0.005
+        image_height, image_width = gray.shape[:2]
+        boxes = []
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h < min_area:
+                continue
+            # Keep the quiet zone either side of the bars
+            pad = max(w, h) // 10
+            x0, y0 = max(x - pad, 0), max(y - pad, 0)
+            x1, y1 = min(x + w + pad, image_width), min(y + h + pad, image_height)
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+            if len(boxes) == self.max_candidates:
+                break
+        return boxes
+
+
+class BarcodeScan(Sequence):
+    """
+    The pages of a document for matching on barcodes alone.
+
+    Barcodes are read from low resolution previews of each page in all four orientations,
+    without any OCR based orientation detection. Previews are read without the reader's slow
+    fallback, as documents that don't match here go through the preprocessed pages anyway. A page is only rendered at full resolution,
+    and turned upright using the orientation its barcode was read in, when it's accessed by
+    index, i.e. when it has matched a template page. Each page has its own lock, so different
+    pages can be rendered at the same time.
+    """
+
+    rotations = [0, 90, 180, 270]
+    rotate_codes = {
+        90: cv2.ROTATE_90_CLOCKWISE,
+        180: cv2.ROTATE_180,
+        270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    }
+
+    def __init__(
+        self,
+        preview_pages: Sequence,
+        render_page: Callable[[int], PageImage],
+        reader: BarcodeReader = None,
+    ):
+        """
+        Args:
+        - preview_pages (Sequence): Low resolution pages of the document.
+        - render_page (Callable): Renders a single page (1-based) at full resolution.
+        - reader (BarcodeReader): Used to read the barcode on each page. Defaults to
+          native resolution and located regions only.
+        """
+        self.preview_pages = preview_pages
+        self.reader = reader or BarcodeReader(slow_fallback=False)
+        self.page_rotations = {}
+        self._render_page = render_page
+        self._pages = {}
+        self._page_locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.preview_pages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        with self._lock:
+            page_lock = self._page_locks.setdefault(index, threading.Lock())
+        with page_lock:
+            if index not in self._pages:
+                page = self._render_page(index + 1)
+                rotation = self.page_rotations.get(index, 0)
+                if rotation:
+                    page.rotate(rotation)
+                self._pages[index] = page
+            return self._pages[index]
+
+    @property
+    def rendered_count(self) -> int:
+        return len(self._pages)
+
+    def read_barcodes(self, indexes: Iterable[int]) -> List[Optional[str]]:
+        """
+        Returns the barcode on each of the given pages, or None where there isn't one.
+        Results are in the same order as indexes.
+        """
+        indexes = list(indexes)
+        # Previews are rendered in this thread, before fanning out
+        previews = [self.preview_pages[index] for index in indexes]
+        results = get_page_scheduler().map(self.read_preview_barcode, previews)
+
+        barcodes = []
+        for index, (barcode, rotation) in zip(indexes, results):
+            if barcode is not None:
+                self.page_rotations[index] = rotation
+            barcodes.append(barcode)
+        return barcodes
+
+    def read_preview_barcode(self, preview: PageImage) -> tuple:
+        """
+        Returns the barcode on a preview page and the clockwise rotation in degrees that turns
+        the page upright, or (None, None) if no orientation has a barcode.
+        """
+        for rotation in self.rotations:
+            if rotation == 0:
+                page = preview
+            else:
+                page = PageImage(
+                    cv2.rotate(preview.image, self.rotate_codes[rotation]),
+                    page_number=preview.page_number,
+                    source=preview.source,
+                )
+            barcode = self.reader.read(page)
+            if barcode is not None:
+                if rotation:
+                    logger.debug(
+                        f"Found barcode on page {preview.page_number} rotated {rotation} degrees"
+                    )
+                return barcode, rotation
+        return None, None
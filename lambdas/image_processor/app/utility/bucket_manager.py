@@ -1,6 +1,13 @@
+import json
 import os
+import threading
+import time
 import boto3
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from app.utility.aws_clients import client_config
 from app.utility.custom_logging import custom_logger
+from app.utility.runtime_context import RuntimeContext
 
 logger = custom_logger("bucket_manager")
 
@@ -9,6 +16,10 @@ class ScanLocation:
     def __init__(self, template: str = "", location: str = ""):
         self.__template = template
         self.__location = location
+        self.__start_download = None
+        self.__on_access = None
+        self.__download = None
+        self.__lock = threading.Lock()
 
     @property
     def template(self) -> str:
@@ -16,11 +27,82 @@ class ScanLocation:
 
     @property
     def location(self) -> str:
+        """
+        The location of the scan. For scans downloaded on demand, accessing the location
+        starts the download if needed and waits for it to finish.
+        """
+        if self.__start_download is not None:
+            self.__wait_for_download()
         return self.__location
 
+    @property
+    def local_location(self) -> Optional[str]:
+        """
+        The location of the scan without triggering an on demand download.
+        None if the scan is downloaded on demand and hasn't been downloaded.
+        """
+        with self.__lock:
+            if self.__start_download is not None:
+                return None
+            return self.__location
+
     def set_location(self, location):
         self.__location = location
 
+    def set_download_on_demand(
+        self,
+        start_download: Callable[[], Future],
+        on_access: Callable[[], None] = None,
+    ) -> None:
+        """
+        Defers downloading the scan until its location is first needed.
+
+        Args:
+            start_download: Starts the download, returning a future for the local path.
+            on_access: Called the first time the location is needed, e.g. to prefetch the next scan.
+        """
+        self.__start_download = start_download
+        self.__on_access = on_access
+
+    def start_download(self) -> Optional[Future]:
+        """
+        Starts an on demand download if it hasn't already been started.
+        """
+        with self.__lock:
+            if self.__download is None and self.__start_download is not None:
+                self.__download = self.__start_download()
+            return self.__download
+
+    def cancel_download(self) -> None:
+        """
+        Cancels an on demand download that hasn't started, and waits for one that has,
+        so that local_location no longer changes.
+        """
+        with self.__lock:
+            download = self.__download
+            if download is None or download.cancel():
+                self.__on_access = None
+                return
+        try:
+            self.__wait_for_download()
+        except Exception as e:
+            logger.debug(f"Cancelled download of {self.__location} failed: {e}")
+
+    def __wait_for_download(self) -> None:
+        download = self.start_download()
+        on_access, self.__on_access = self.__on_access, None
+        if on_access is not None:
+            on_access()
+
+        try:
+            location = download.result()
+        except Exception as e:
+            raise Exception(f"Error downloading scanned document {self.template}: {e}")
+
+        with self.__lock:
+            self.__location = location
+            self.__start_download = None
+
 
 class ScanLocationStore:
     def __init__(self, scans: ScanLocation = None, continuations: ScanLocation = None):
@@ -30,6 +112,7 @@ class ScanLocationStore:
             scans = []
         self.scans = scans
         self.continuations = continuations
+        self.executor = None
 
     def add_scan(self, scan: ScanLocation):
         self.scans.append(scan)
@@ -37,16 +120,32 @@ class ScanLocationStore:
     def add_continuation(self, key: str, continuation: ScanLocation):
         self.continuations[key] = continuation
 
+    def close(self) -> None:
+        """
+        Cancels any on demand downloads that haven't started, waits for those in progress
+        and shuts down the download executor.
+        """
+        for scan in self.scans:
+            scan.cancel_download()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
 
 class BucketManager:
-    def __init__(self, request_id, info_msg):
+    def __init__(self, request_id, info_msg, runtime_context: RuntimeContext = None):
         self.environment = os.getenv("ENVIRONMENT")
         self.target_environment = os.getenv("TARGET_ENVIRONMENT")
         self.request_id = request_id
         self.sirius_bucket = f"opg-backoffice-datastore-{self.target_environment}"
         self.iap_bucket = f"lpa-iap-{self.environment}"
-        self.s3 = self.setup_s3_connection()
+        self.runtime_context = runtime_context or RuntimeContext()
+        self.s3 = self.runtime_context.get_or_create(
+            ("s3", self.environment), self.setup_s3_connection
+        )
         self.info_msg = info_msg
+        self.download_workers = int(os.getenv("S3_DOWNLOAD_WORKERS", "8"))
+        self.upload_workers = int(os.getenv("S3_UPLOAD_WORKERS", "8"))
 
     def setup_s3_connection(self) -> boto3.client:
         """
@@ -61,9 +160,10 @@ class BucketManager:
                 "s3",
                 endpoint_url="http://localstack-request-handler:4566",
                 region_name="eu-west-1",
+                config=client_config(),
             )
         else:
-            s3 = boto3.client("s3", region_name="eu-west-1")
+            s3 = boto3.client("s3", region_name="eu-west-1", config=client_config())
         return s3
 
     @staticmethod
@@ -103,17 +203,24 @@ class BucketManager:
         return sorted(scan_list, key=key_func)
 
     def download_scanned_images(
-        self, s3_urls_dict: dict, output_folder_path: str
+        self, s3_urls_dict: dict, output_folder_path: str, on_demand: bool = False
     ) -> ScanLocationStore:
         """
         Downloads scanned images from S3 and saves them to a local folder.
 
+        In on demand mode the LPA scans aren't downloaded up front. Each one is downloaded,
+        in relevance order, when its location is first needed, and the next scan is
+        prefetched at the same time. Continuation sheets are always downloaded as they're
+        all needed for matching.
+
         Args:
             s3_urls_dict: A dictionary containing URLs for scanned images in S3.
             output_folder_path: Path to base output folder for s3 downloads
+            on_demand: Whether to download the LPA scans on demand
 
         Returns:
             A dictionary containing the local file paths of the downloaded scanned images.
+            The store should be closed once the scans are no longer needed.
         """
         scan_locations = ScanLocationStore()
 
@@ -153,62 +260,134 @@ class BucketManager:
                 "No documents returned by Sirius. Sirius response dictionary"
             )
 
-        for lpa_location in lpa_locations_reordered:
-            try:
-                # Extract the file path and bucket name from the S3 URL
-                path_parts = self.extract_s3_file_path(lpa_location.location)
-                # Construct the local file path for the downloaded scan
-                scan_location = f'{output_folder_path}/{path_parts["file_path"]}'
-                logger.debug(
-                    f"Attempting download from bucket: {path_parts['bucket']}, "
-                    f"key: {path_parts['file_path']}, path: {scan_location}"
-                )
-                # Download the scan from S3 and save it to the local file path
-                self.s3.download_file(
-                    path_parts["bucket"], path_parts["file_path"], scan_location
+        # Start all downloads at once, results are collected below in the original order
+        scan_locations.executor = ThreadPoolExecutor(
+            max_workers=self.download_workers, thread_name_prefix="s3-download"
+        )
+        try:
+            if on_demand:
+                self.set_scans_to_download_on_demand(
+                    lpa_locations_reordered, scan_locations.executor, output_folder_path
                 )
-                # Add the local file path to the dictionary of downloaded scan locations
-                lpa_location.set_location(scan_location)
-                scan_locations.add_scan(lpa_location)
-            except Exception as e:
-                raise Exception(
-                    f"Error downloading scanned document {lpa_location.template}: {e}"
+                for lpa_location in lpa_locations_reordered:
+                    scan_locations.add_scan(lpa_location)
+                lpa_downloads = []
+            else:
+                lpa_downloads = [
+                    scan_locations.executor.submit(
+                        self.download_scan, lpa_location.location, output_folder_path
+                    )
+                    for lpa_location in lpa_locations_reordered
+                ]
+            continuation_downloads = [
+                scan_locations.executor.submit(
+                    self.download_scan,
+                    continuation_location.location,
+                    output_folder_path,
                 )
+                for continuation_location in continuation_locations
+            ]
+
+            for lpa_location, download in zip(lpa_locations_reordered, lpa_downloads):
+                try:
+                    scan_location = download.result()
+                    # Add the local file path to the dictionary of downloaded scan locations
+                    lpa_location.set_location(scan_location)
+                    scan_locations.add_scan(lpa_location)
+                except Exception as e:
+                    raise Exception(
+                        f"Error downloading scanned document {lpa_location.template}: {e}"
+                    )
+
+            # Download the continuation sheet scans, if they exist
+            location_position = 0
+            for continuation_location, download in zip(
+                continuation_locations, continuation_downloads
+            ):
+                try:
+                    scan_location = download.result()
+                    # Add the local file path to the dictionary of downloaded scan locations
+                    location_position += 1
+
+                    continuation_location.set_location(scan_location)
+                    scan_locations.add_continuation(
+                        key=f"continuation_{location_position}",
+                        continuation=continuation_location,
+                    )
+
+                except Exception as e:
+                    raise Exception(
+                        f"Error downloading scanned continuation sheet {continuation_location.location}: {e}"
+                    )
+        except Exception:
+            # Don't start any downloads still queued if one has already failed
+            scan_locations.close()
+            raise
+
+        if not on_demand:
+            scan_locations.close()
 
-        # Download the continuation sheet scans, if they exist
-        if not continuation_locations or len(continuation_locations) == 0:
-            return scan_locations
+        return scan_locations
 
-        location_position = 0
-        for continuation_location in continuation_locations:
-            try:
-                # Extract the file path and bucket name from the S3 URL
-                path_parts = self.extract_s3_file_path(continuation_location.location)
-                # Construct the local file path for the downloaded scan
-                scan_location = f'{output_folder_path}/{path_parts["file_path"]}'
-                logger.debug(
-                    f"Attempting download from bucket: {path_parts['bucket']}, "
-                    f"key: {path_parts['file_path']}, path: {scan_location}"
-                )
-                # Download the scan from S3 and save it to the local file path
-                self.s3.download_file(
-                    path_parts["bucket"], path_parts["file_path"], scan_location
-                )
-                # Add the local file path to the dictionary of downloaded scan locations
-                location_position += 1
+    def set_scans_to_download_on_demand(
+        self,
+        lpa_locations: list,
+        executor: ThreadPoolExecutor,
+        output_folder_path: str,
+    ) -> None:
+        """
+        Sets each scan to download when its location is first needed, prefetching the
+        next scan in the list at the same time.
+        """
+        for position, lpa_location in enumerate(lpa_locations):
+            s3_location = lpa_location.location
 
-                continuation_location.set_location(scan_location)
-                scan_locations.add_continuation(
-                    key=f"continuation_{location_position}",
-                    continuation=continuation_location,
+            def start_download(s3_location=s3_location) -> Future:
+                return executor.submit(
+                    self.download_scan, s3_location, output_folder_path
                 )
 
-            except Exception as e:
-                raise Exception(
-                    f"Error downloading scanned continuation sheet {continuation_location.location}: {e}"
-                )
+            next_location = (
+                lpa_locations[position + 1]
+                if position + 1 < len(lpa_locations)
+                else None
+            )
+            lpa_location.set_download_on_demand(
+                start_download,
+                on_access=next_location.start_download if next_location else None,
+            )
 
-        return scan_locations
+        # The first scan is nearly always needed so start it straight away
+        lpa_locations[0].start_download()
+
+    def download_scan(self, s3_location: str, output_folder_path: str) -> str:
+        """
+        Downloads a single scan from S3 to the output folder.
+
+        Args:
+            s3_location: The S3 URL of the scan.
+            output_folder_path: Path to base output folder for s3 downloads
+
+        Returns:
+            The local file path of the downloaded scan.
+        """
+        # Extract the file path and bucket name from the S3 URL
+        path_parts = self.extract_s3_file_path(s3_location)
+        # Construct the local file path for the downloaded scan
+        scan_location = f'{output_folder_path}/{path_parts["file_path"]}'
+        logger.debug(
+            f"Attempting download from bucket: {path_parts['bucket']}, "
+            f"key: {path_parts['file_path']}, path: {scan_location}"
+        )
+        # Download the scan from S3 and save it to the local file path
+        start = time.perf_counter()
+        self.s3.download_file(
+            path_parts["bucket"], path_parts["file_path"], scan_location
+        )
+        logger.debug(
+            f"Downloaded {path_parts['file_path']} in {time.perf_counter() - start:.3f}s"
+        )
+        return scan_location
 
     def put_images_to_bucket(
         self,
@@ -226,34 +405,69 @@ class BucketManager:
                                 and the value is the path of the image file.
         Returns: list of images uploaded
         """
-        images_uploaded = []
-        for key, value in path_selection.items():
-            image = f"iap-{uid}-{key}"
+        metadata = {
+            "ContinuationSheetsInstructions": str(continuation_instruction_count),
+            "ContinuationSheetsPreferences": str(continuation_preference_count),
+            "ContinuationSheetsUnknown": str(continuation_unknown_count),
+            "ProcessError": "0",
+        }
+
+        # The instructions object carries the counts the request handler reads, so it's
+        # written last to make sure every image it refers to already exists
+        other_keys = [key for key in path_selection if key != "instructions"]
+
+        with ThreadPoolExecutor(
+            max_workers=self.upload_workers, thread_name_prefix="s3-upload"
+        ) as executor:
+            uploads = {
+                key: executor.submit(
+                    self.put_image_to_bucket, path_selection[key], uid, key, metadata
+                )
+                for key in other_keys
+            }
             try:
+                for upload in uploads.values():
+                    upload.result()
+            except Exception:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        if "instructions" in path_selection:
+            self.put_image_to_bucket(
+                path_selection["instructions"], uid, "instructions", metadata
+            )
+
+        return [f"iap-{uid}-{key}" for key in path_selection]
+
+    def put_image_to_bucket(
+        self, image_path: str, uid: str, key: str, metadata: dict
+    ) -> str:
+        """
+        Puts a single image in the IAP bucket.
+        Raises an Exception if there is an error in adding the file to the bucket.
+
+        Returns: the name of the uploaded image
+        """
+        image = f"iap-{uid}-{key}"
+        try:
+            start = time.perf_counter()
+            with open(image_path, "rb") as body:
                 self.s3.put_object(
                     Bucket=self.iap_bucket,
                     Key=image,
-                    Body=open(value, "rb"),
+                    Body=body,
                     ServerSideEncryption="AES256",
-                    Metadata={
-                        "ContinuationSheetsInstructions": str(
-                            continuation_instruction_count
-                        ),
-                        "ContinuationSheetsPreferences": str(
-                            continuation_preference_count
-                        ),
-                        "ContinuationSheetsUnknown": str(continuation_unknown_count),
-                        "ProcessError": "0",
-                    },
-                )
-                logger.debug(f"File '{image}' added to the '{self.iap_bucket}' bucket.")
-                images_uploaded.append(image)
-            except Exception as e:
-                raise Exception(
-                    f"Failed to add file '{image}' to the '{self.iap_bucket}' bucket: {e}"
+                    Metadata=metadata,
                 )
-
-        return images_uploaded
+            logger.debug(
+                f"File '{image}' added to the '{self.iap_bucket}' bucket "
+                f"in {time.perf_counter() - start:.3f}s."
+            )
+        except Exception as e:
+            raise Exception(
+                f"Failed to add file '{image}' to the '{self.iap_bucket}' bucket: {e}"
+            )
+        return image
 
     def put_error_image_to_bucket(self, uid) -> None:
         """
@@ -275,3 +489,59 @@ class BucketManager:
             logger.debug("Error file added to S3 bucket.")
         except Exception as e:
             raise Exception(f"Error: Failed to add error file to bucket. {e}")
+
+        self.put_manifest_to_bucket(
+            uid=uid,
+            path_selection={},
+            continuation_instruction_count=0,
+            continuation_preference_count=0,
+            continuation_unknown_count=0,
+            process_error=True,
+        )
+
+    def put_manifest_to_bucket(
+        self,
+        uid: str,
+        path_selection: dict,
+        continuation_instruction_count: int,
+        continuation_preference_count: int,
+        continuation_unknown_count: int,
+        process_error: bool = False,
+    ) -> None:
+        """
+        Puts a JSON manifest describing the processed images in the specified S3 bucket.
+        The request handler reads this in a single request rather than checking every image.
+        Raises an Exception if there is an error in adding the manifest to the bucket.
+
+        Args:
+        path_selection (dict): The uploaded images, keyed by image name with the path to each image file.
+        """
+        images = {
+            f"iap-{uid}-{key}": os.stat(value).st_size
+            for key, value in path_selection.items()
+        }
+        if process_error:
+            # The error file is an empty instructions image, listed so the request handler
+            # can tell it apart from a collection that has been queued again
+            images[f"iap-{uid}-instructions"] = 0
+        manifest = {
+            "uid": str(uid),
+            "processError": 1 if process_error else 0,
+            "continuationSheets": {
+                "instructions": continuation_instruction_count,
+                "preferences": continuation_preference_count,
+                "unknown": continuation_unknown_count,
+            },
+            "images": images,
+        }
+        try:
+            self.s3.put_object(
+                Bucket=self.iap_bucket,
+                Key=f"iap-{uid}-manifest",
+                Body=json.dumps(manifest, separators=(",", ":")).encode("utf-8"),
+                ContentType="application/json",
+                ServerSideEncryption="AES256",
+            )
+            logger.debug(f"Manifest added to the '{self.iap_bucket}' bucket.")
+        except Exception as e:
+            raise Exception(f"Error: Failed to add manifest to bucket. {e}")
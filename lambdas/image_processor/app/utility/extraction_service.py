@@ -1,30 +1,27 @@
 import datetime
 import copy
 import os
-import tempfile
 
 import cv2
 import re
-import uuid
-
-from pytesseract import Output
-import pytesseract
-import imutils
 
 import numpy as np
 import imageio
-from pyzbar.pyzbar import decode
-from collections import Counter
-from fuzzywuzzy import fuzz
+from collections import Counter, defaultdict
 
 from form_tools.form_operators import FormOperator
-from form_tools.form_meta.form_meta import FormPage
-from app.utility.ocr import get_text_from_image_file
+from form_tools.form_meta.compiled_form_meta import compile_meta_store
+from app.utility.barcode_reader import BarcodeReader, BarcodeScan
+from app.utility.ocr import get_text_from_images, detect_orientation
 from app.utility.image_reader import ImageReader
+from app.utility.page_image import PageImage, PageSequence, load_page_image
 from app.utility.custom_logging import custom_logger
 from app.utility.bucket_manager import ScanLocationStore
+from app.utility.runtime_context import RuntimeContext
+from app.utility.template_texts import TemplateTexts
+from app.utility.page_scheduler import get_page_scheduler
 from typing import List
-from PIL import UnidentifiedImageError, Image
+from PIL import UnidentifiedImageError
 from aws_xray_sdk.core import xray_recorder
 
 logger = custom_logger("extraction_service")
@@ -79,25 +76,66 @@ class MatchingItemsStore:
 
 class ExtractionService:
     def __init__(
-        self, extraction_folder_path, folder_name, output_folder_path, info_msg
+        self,
+        extraction_folder_path,
+        folder_name,
+        output_folder_path,
+        info_msg,
+        runtime_context: RuntimeContext = None,
     ):
         self.extraction_folder_path = extraction_folder_path
         self.folder_name = folder_name
         self.output_folder_path = output_folder_path
         self.info_msg = info_msg
+        self.runtime_context = runtime_context or RuntimeContext()
         self.matched_continuations_from_scans = MatchingItemsStore()
         self.complete_meta_store = {}
-        self.processed_image_locations = {}
+        self.processed_images = {}
+        self.barcode_scans = {}
+        # Documents with barcoded templates are first matched on barcodes read from low
+        # resolution pages, so that those identified by barcode never need OCR
+        self.barcode_fast_path = os.getenv("BARCODE_FAST_PATH", "1") == "1"
+        self.barcode_preview_dpi = int(os.getenv("BARCODE_PREVIEW_DPI", "150"))
+        # Template pages shortlisted per scan page before scoring, 0 scores them all
+        self.template_shortlist_size = int(os.getenv("TEMPLATE_SHORTLIST_SIZE", "5"))
+        # Preprocessed pages are only written to disk if a debug directory is set
+        self.debug_page_image_dir = os.getenv("DEBUG_PAGE_IMAGE_DIR")
+
+    def get_form_operator(self) -> FormOperator:
+        """
+        Returns the FormOperator for the extraction config, reusing the one held by the
+        runtime context if it has already been built.
+        """
+        config_path = f"{self.extraction_folder_path}/opg-config.yaml"
+        return self.runtime_context.get_or_create(
+            ("form_operator", config_path),
+            lambda: FormOperator.create_from_config(config_path),
+        )
+
+    def get_complete_meta_store(self, form_operator: FormOperator) -> dict:
+        """
+        Returns all the form metadata in the extraction folder, reusing the metadata held by
+        the runtime context if it has already been loaded and validated.
+
+        The metadata is compiled into read only snapshots so that pages and fields aren't
+        rebuilt every time they're looked up.
+        """
+        form_meta_directory = f"{self.extraction_folder_path}/metadata"
+        meta_store = self.runtime_context.get_or_create(
+            ("form_meta_store", form_meta_directory),
+            lambda: compile_meta_store(
+                form_operator.form_meta_store(form_meta_directory)
+            ),
+        )
+        # Shallow copy so the shared store itself can't be modified by a request
+        return dict(meta_store)
 
     @xray_recorder.capture()
     def run_iap_extraction(self, scan_locations: ScanLocationStore) -> list:
-        form_operator = FormOperator.create_from_config(
-            f"{self.extraction_folder_path}/opg-config.yaml"
-        )
+        form_operator = self.get_form_operator()
         continuation_keys_to_use = []
         run_timestamp = int(datetime.datetime.utcnow().timestamp())
-        form_meta_directory = f"{self.extraction_folder_path}/metadata"
-        self.complete_meta_store = form_operator.form_meta_store(form_meta_directory)
+        self.complete_meta_store = self.get_complete_meta_store(form_operator)
 
         # Find matches based on Scans (only one should match)
         scan_sheet_store = self.get_matching_scan_item(
@@ -282,27 +320,11 @@ class ExtractionService:
                 complete_meta_store, scan_location.template
             )
 
-            try:
-                processed_image_locations = self.processed_image_locations[
-                    scan_location.location
-                ]
-            except KeyError:
-                self.processed_image_locations[
-                    scan_location.location
-                ] = self.get_preprocessed_images(scan_location.location, form_operator)
-                processed_image_locations = self.processed_image_locations[
-                    scan_location.location
-                ]
-
-            if not processed_image_locations:
-                logger.debug(f"No processed images in {scan_location.location}.")
-                continue
-
             logger.debug(
                 f"Attempting to match {scan_location.template} - {scan_location.location} based on barcodes..."
             )
-            matched_items = self.find_matches_from_barcodes(
-                processed_image_locations, filtered_metastore, scan_location.location
+            matched_items = self.match_on_barcodes(
+                scan_location.location, filtered_metastore, form_operator
             )
 
             # It's possible for continuation sheets to be matched on barcode whilst the main page isn't.
@@ -341,24 +363,16 @@ class ExtractionService:
                 complete_meta_store, scan_location.template
             )
 
-            try:
-                processed_image_locations = self.processed_image_locations[
-                    scan_location.location
-                ]
-            except KeyError:
-                self.processed_image_locations[
-                    scan_location.location
-                ] = self.get_preprocessed_images(scan_location.location, form_operator)
-                processed_image_locations = self.processed_image_locations[
-                    scan_location.location
-                ]
-
-            if not processed_image_locations:
+            processed_images = self.get_cached_preprocessed_images(
+                scan_location.location, form_operator
+            )
+
+            if not processed_images:
                 logger.debug(f"No processed images in {scan_location.location}.")
                 continue
 
             matched_items = self.get_ocr_matches(
-                processed_image_locations,
+                processed_images,
                 form_operator,
                 filtered_metastore,
                 scan_location.location,
@@ -404,42 +418,38 @@ class ExtractionService:
             filtered_metastore = self.filter_metastore_based_on_template(
                 complete_meta_store, scan_location.template
             )
-            # Get preprocessed images for current scan location
-            try:
-                processed_image_locations = self.processed_image_locations[
-                    scan_location.location
-                ]
-            except KeyError:
-                self.processed_image_locations[
-                    scan_location.location
-                ] = self.get_preprocessed_images(scan_location.location, form_operator)
-                processed_image_locations = self.processed_image_locations[
-                    scan_location.location
-                ]
-
-            if not processed_image_locations:
-                logger.debug(f"No processed images in {scan_location.location}.")
-                continue
 
             logger.debug(
                 f"Attempting to match {scan_location.location} based on barcodes..."
             )
             # Attempt to match based on barcodes
-            matched_items = self.find_matches_from_barcodes(
-                processed_image_locations, filtered_metastore, scan_location.location
+            matched_items = self.match_on_barcodes(
+                scan_location.location, filtered_metastore, form_operator
             )
 
+            if matched_items is None:
+                continue
+
             logger.debug(
                 f"Barcode matches for {scan_location.location}: {len(matched_items.image_page_map)}"
             )
 
             # If no matches found using barcodes, attempt to match using OCR
             if len(matched_items.image_page_map) == 0:
+                # Get preprocessed images for current scan location
+                processed_images = self.get_cached_preprocessed_images(
+                    scan_location.location, form_operator
+                )
+
+                if not processed_images:
+                    logger.debug(f"No processed images in {scan_location.location}.")
+                    continue
+
                 logger.debug(
                     f"Attempting to match {scan_location.location} based on OCR..."
                 )
                 matched_items = self.get_ocr_matches(
-                    processed_image_locations,
+                    processed_images,
                     form_operator,
                     filtered_metastore,
                     scan_location.location,
@@ -530,12 +540,95 @@ class ExtractionService:
             )
             raise Exception(e)
 
+    def match_on_barcodes(
+        self,
+        form_path: str,
+        form_metastore: FilteredMetastore,
+        form_operator: FormOperator,
+    ) -> MatchingMetaToImages:
+        """
+        Matches a form to its templates on barcodes alone.
+
+        Where the templates have barcodes the form is first matched on low resolution pages
+        without preprocessing, so no OCR is needed. If that doesn't find a match the form is
+        matched on its preprocessed pages, as it always has been.
+
+        Returns:
+            MatchingMetaToImages: The barcode match, or None if the form has no readable pages
+            or only continuation sheets matched.
+        """
+        if self.barcode_fast_path and self.template_has_barcodes(form_metastore):
+            barcode_scan = self.get_cached_barcode_scan(form_path)
+            if barcode_scan:
+                matched_items = self.find_matches_from_barcodes(
+                    barcode_scan, form_metastore, form_path
+                )
+                if matched_items is None or len(matched_items.image_page_map) > 0:
+                    logger.debug(
+                        f"Matched {form_path} on barcodes after rendering "
+                        f"{barcode_scan.rendered_count} of {len(barcode_scan)} pages in full"
+                    )
+                    return matched_items
+                logger.debug(
+                    f"No barcode matches on low resolution pages of {form_path}"
+                )
+
+        processed_images = self.get_cached_preprocessed_images(form_path, form_operator)
+        if not processed_images:
+            logger.debug(f"No processed images in {form_path}.")
+            return None
+
+        return self.find_matches_from_barcodes(
+            processed_images, form_metastore, form_path
+        )
+
+    @staticmethod
+    def template_has_barcodes(form_metastore: FilteredMetastore) -> bool:
+        """
+        Returns True if any page of the templates, or their continuation sheets, has a barcode.
+        """
+        metas = list(form_metastore.filtered_metastore.values()) + list(
+            form_metastore.filtered_continuation_metastore.values()
+        )
+        return any(barcode for meta in metas for barcode in meta.barcodes.values())
+
+    def get_cached_barcode_scan(self, form_path: str) -> BarcodeScan:
+        """
+        Returns the form opened for barcode matching, only opening it the first time it's
+        requested.
+        """
+        if form_path not in self.barcode_scans:
+            logger.debug(f"Reading form for barcodes from path: {form_path}")
+            try:
+                self.barcode_scans[form_path] = ImageReader.open_barcode_scan(
+                    form_path,
+                    chunk_size=get_page_scheduler().max_workers,
+                    preview_dpi=self.barcode_preview_dpi,
+                )
+            except UnidentifiedImageError:
+                logger.debug(f"Unable to read {form_path} for barcodes")
+                self.barcode_scans[form_path] = None
+        return self.barcode_scans[form_path]
+
+    def get_cached_preprocessed_images(
+        self, form_path: str, form_operator: FormOperator
+    ) -> PageSequence:
+        """
+        Returns the preprocessed pages of a form, only reading and preprocessing
+        the form the first time it's requested.
+        """
+        if form_path not in self.processed_images:
+            self.processed_images[form_path] = self.get_preprocessed_images(
+                form_path, form_operator
+            )
+        return self.processed_images[form_path]
+
     def get_preprocessed_images(
         self, form_path: str, form_operator: FormOperator
-    ) -> list:
+    ) -> PageSequence:
         """
-        Preprocesses the images of a form at the specified file path using the
-        provided FormOperator object.
+        Opens the form at the specified file path for lazy reading. Pages are
+        rendered and preprocessed in chunks as they're accessed.
 
         Args:
             form_path (str): A string containing the file path of the form to be processed.
@@ -543,107 +636,114 @@ class ExtractionService:
             metastore (dict): store of meta templates
 
         Returns:
-            list: A list of preprocessed form images after being auto-rotated based on text direction.
+            PageSequence: The in-memory page images, auto-rotated based on text direction.
         """
         logger.debug(f"Reading form from path: {form_path}")
         try:
-            with tempfile.TemporaryDirectory() as path:
-                _, img_locations = ImageReader.read(
-                    form_path,
-                    conversion_parameters={"output_folder": path, "fmt": "jpeg"},
-                )
+            pages = ImageReader.open_pages(
+                form_path,
+                chunk_size=get_page_scheduler().max_workers,
+                preprocess=self.preprocess_pages,
+            )
+
+            # Render the first chunk now so unreadable documents are caught here
+            if len(pages) > 0:
+                _ = pages[0]
 
-                # Go through each image and rotate them if necessary and we are relatively certain they need rotating.
-                for img_file in img_locations:
-                    image = cv2.imread(img_file)
-                    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                    try:
-                        results = pytesseract.image_to_osd(rgb, output_type=Output.DICT)
-                        if (
-                            results["orientation"]
-                            and results["script"] == "Latin"
-                            and results["orientation_conf"] > 10
-                        ):
-                            logger.debug(
-                                f"Rotated image. Pytesseract results: {results}"
-                            )
-                            rotated_image = imutils.rotate_bound(
-                                image, angle=results["rotate"]
-                            )
-                            Image.fromarray(rotated_image).save(img_file, "JPEG")
-                    except pytesseract.pytesseract.TesseractError:
-                        pass
-
-                logger.debug(f"Total images found: {len(img_locations)}")
-                return img_locations
+            logger.debug(f"Total images found: {len(pages)}")
+            return pages
         except UnidentifiedImageError:
             logger.debug(f"Unable to match {form_path}")
             pass
 
-    @staticmethod
-    def smart_threshold_images(image_locations):
-        # Create an empty list to store the new images
-        thresholded_image_locations = []
-
-        # Loop through each image in the input list
-        for image_location in image_locations:
-            image = cv2.imread(image_location)
-            # Get the current size of the image
-            # Convert the image to grayscale
-            grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            average_intensity = np.mean(grayscale)
-            # Apply the threshold using the average intensity
-            _, thresholded = cv2.threshold(
-                grayscale, average_intensity - 50, 255, cv2.THRESH_BINARY
-            )
+    def preprocess_pages(self, pages: List[PageImage]) -> None:
+        """
+        Preprocesses a chunk of newly rendered pages in place.
+        """
+        # Go through each image and rotate them if necessary and we are relatively certain they need rotating.
+        get_page_scheduler().map(self.auto_rotate_image, pages)
 
-            file_name = f"/tmp/thresholded-{str(uuid.uuid4())}.jpg"
-            cv2.imwrite(file_name, thresholded)
-            thresholded_image_locations.append(file_name)
+        if self.debug_page_image_dir:
+            for page in pages:
+                page.save(os.path.join(self.debug_page_image_dir, self.folder_name))
 
-        # Return the list of doubled-size images
-        return thresholded_image_locations
+    @staticmethod
+    def auto_rotate_image(page: PageImage) -> None:
+        """
+        Rotates the page in place if tesseract is relatively certain
+        from the text direction that it needs rotating.
+        """
+        results = detect_orientation(page.rgb)
+        if (
+            results
+            and results["orientation"]
+            and results["script"] == "Latin"
+            and results["orientation_conf"] > 10
+        ):
+            logger.debug(f"Rotated image. Tesseract OSD results: {results}")
+            page.rotate(results["rotate"])
 
     @staticmethod
-    def mask_images(metastore, image_locations):
-        updated_images_locations = []
-        for image_location in image_locations:
-            image = cv2.imread(image_location)
-            file_name = f"/tmp/masked-{str(uuid.uuid4())}.jpg"
-            for _, meta in metastore.items():
-                form_meta_loc = meta.form_template
-                template_files = os.listdir(form_meta_loc)
-                template = cv2.imread(os.path.join(form_meta_loc, template_files[0]))
-
-                # Get the height and width of the template image
-                template_height, template_width, _ = template.shape
-
-                # Resize the input image to match the template size
-                resized_image = cv2.resize(image, (template_width, template_height))
-
-                form_fields = meta.form_fields
-                average_color = np.mean(image, axis=(0, 1))
-                for field in form_fields:
-                    field_bb = field.bounding_box
-                    top_left = (field_bb.left, field_bb.top)
-                    bottom_right = (field_bb.right, field_bb.bottom)
-
-                    cv2.rectangle(
-                        resized_image,
-                        top_left,
-                        bottom_right,
-                        average_color,
-                        thickness=cv2.FILLED,
-                    )
+    def smart_threshold_image(image: np.ndarray) -> np.ndarray:
+        # Convert the image to grayscale
+        grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        average_intensity = np.mean(grayscale)
+        # Apply the threshold using the average intensity
+        _, thresholded = cv2.threshold(
+            grayscale, average_intensity - 50, 255, cv2.THRESH_BINARY
+        )
+        return thresholded
+
+    @classmethod
+    def smart_threshold_images(cls, images):
+        # Threshold each image, keeping the same order as the input list
+        return get_page_scheduler().map(cls.smart_threshold_image, images)
 
-            cv2.imwrite(file_name, resized_image)
-            updated_images_locations.append(file_name)
+    @staticmethod
+    def mask_image(metastore, template_shapes: dict, page) -> np.ndarray:
+        image = load_page_image(page)
+        for meta_id, meta in metastore.items():
+            # Get the height and width of the template image
+            template_height, template_width = template_shapes[meta_id]
+
+            # Resize the input image to match the template size
+            resized_image = cv2.resize(image, (template_width, template_height))
+
+            form_fields = meta.form_fields
+            average_color = np.mean(image, axis=(0, 1))
+            for field in form_fields:
+                field_bb = field.bounding_box
+                top_left = (field_bb.left, field_bb.top)
+                bottom_right = (field_bb.right, field_bb.bottom)
+
+                cv2.rectangle(
+                    resized_image,
+                    top_left,
+                    bottom_right,
+                    average_color,
+                    thickness=cv2.FILLED,
+                )
 
-        return updated_images_locations
+        return resized_image
+
+    @classmethod
+    def mask_images(cls, metastore, images):
+        # The templates are the same for every image so only read them once
+        template_shapes = {}
+        for meta_id, meta in metastore.items():
+            form_meta_loc = meta.form_template
+            template_files = os.listdir(form_meta_loc)
+            template = cv2.imread(os.path.join(form_meta_loc, template_files[0]))
+            template_shapes[meta_id] = template.shape[:2]
+
+        return get_page_scheduler().map(
+            lambda page: cls.mask_image(metastore, template_shapes, page),
+            images,
+        )
 
     def get_ocr_matches(
         self,
-        processed_image_locations: list,
+        processed_images: list,
         form_operator: FormOperator,
         metastore: FilteredMetastore,
         scan_location: str,
@@ -653,7 +753,7 @@ class ExtractionService:
         and attempts to identify matches based on text identification.
 
         Args:
-            - processed_image_locations (List[Any]): A list of files containing images.
+            - processed_images (List[PageImage]): The preprocessed pages of the document.
             - form_operator (Any): A form operator object with `form_images_to_text` method.
             - metastore (dict): A directory containing form metadata documents.
 
@@ -670,23 +770,21 @@ class ExtractionService:
         # ====== Process scan documents ======
         if len(metastore.filtered_metastore) == 1:
             logger.debug("Further image processing based on scan template...")
-            masked_image_locations = self.mask_images(
-                metastore.filtered_metastore, processed_image_locations
-            )
-            ocr_refined_image_locations = self.smart_threshold_images(
-                masked_image_locations
+            masked_images = self.mask_images(
+                metastore.filtered_metastore, processed_images
             )
+            ocr_refined_images = self.smart_threshold_images(masked_images)
         else:
-            ocr_refined_image_locations = processed_image_locations
+            ocr_refined_images = processed_images
 
         logger.debug("Applying OCR to extract text from images...")
-        form_images_text = get_text_from_image_file(ocr_refined_image_locations)
+        form_images_text = get_text_from_images(ocr_refined_images)
 
         logger.debug("Attempting to identify matches based on text identification")
         matched_items = self.mixed_mode_page_identifier(
             form_images_as_strings=form_images_text,
             form_metastore=metastore.filtered_metastore,
-            form_image_locations=processed_image_locations,
+            form_image_locations=processed_images,
             inline_continuation=False,
         )
         # We are only interested in first element for this one
@@ -717,25 +815,23 @@ class ExtractionService:
 
         if len(metastore.filtered_continuation_metastore) == 1:
             logger.debug("Further image processing based on continuation template...")
-            masked_image_locations = self.mask_images(
-                metastore.filtered_continuation_metastore, processed_image_locations
-            )
-            ocr_refined_images_locations = self.smart_threshold_images(
-                masked_image_locations
+            masked_images = self.mask_images(
+                metastore.filtered_continuation_metastore, processed_images
             )
+            ocr_refined_images = self.smart_threshold_images(masked_images)
         else:
-            ocr_refined_images_locations = processed_image_locations
+            ocr_refined_images = processed_images
 
         logger.debug(
             "Applying OCR to extract continuation text from images where it exists..."
         )
-        form_images_text = get_text_from_image_file(ocr_refined_images_locations)
+        form_images_text = get_text_from_images(ocr_refined_images)
 
         logger.debug("Attempting to identify matches based on text identification")
         matched_items = self.mixed_mode_page_identifier(
             form_images_as_strings=form_images_text,
             form_metastore=metastore.filtered_continuation_metastore,
-            form_image_locations=processed_image_locations,
+            form_image_locations=processed_images,
             inline_continuation=True,
         )
         logger.debug(f"Total continuation matched based on OCR: {len(matched_items)}")
@@ -789,29 +885,109 @@ class ExtractionService:
         return matched_scan
 
     @staticmethod
-    def get_barcodes_scan_number_mapping(image_locations):
+    def get_barcodes_scan_number_mapping(image_locations, is_complete=None):
         """
         Attempt to find barcodes in top right of each image
         and add them to a dict containing scan number and the decoded barcode in utf8.
+
+        Pages are read a chunk at a time. If is_complete is given it's called with the
+        barcodes found so far after each chunk, and no further pages are read once it
+        returns True.
         """
+        page_scheduler = get_page_scheduler()
+        chunk_size = page_scheduler.max_workers
         image_barcode_dict = {}
-        # Iterate over each image and find its barcode
-        for image_count, image_location in enumerate(image_locations):
-            image = cv2.imread(image_location)
-            height, width = image.shape[:2]
-            roi = image[0 : height // 3, 2 * width // 3 : width]
-            roi_resized = cv2.resize(roi, (height, 4 * width))
-            barcodes = decode(roi_resized)
-            barcodes_decoded = []
-            for barcode in barcodes:
-                barcodes_decoded.append(barcode.data.decode("utf-8"))
-
-            if len(barcodes_decoded) > 0:
-                logger.debug(f"Found and decoded barcode on page {image_count + 1}")
-                image_barcode_dict[image_count] = barcodes_decoded[0]
+        for start in range(0, len(image_locations), chunk_size):
+            # Find the barcode on each image, results are kept in page order
+            if isinstance(image_locations, BarcodeScan):
+                page_barcodes = image_locations.read_barcodes(
+                    range(start, min(start + chunk_size, len(image_locations)))
+                )
+            else:
+                page_barcodes = page_scheduler.map(
+                    ExtractionService.get_barcode_from_image,
+                    image_locations[start : start + chunk_size],
+                )
+            for image_count, barcode in enumerate(page_barcodes, start=start):
+                if barcode is not None:
+                    logger.debug(f"Found and decoded barcode on page {image_count + 1}")
+                    image_barcode_dict[image_count] = barcode
+
+            pages_read = start + len(page_barcodes)
+            if (
+                is_complete is not None
+                and pages_read < len(image_locations)
+                and is_complete(image_barcode_dict)
+            ):
+                logger.debug(
+                    f"Found all required barcodes after {pages_read} of {len(image_locations)} pages"
+                )
+                break
 
         return image_barcode_dict
 
+    def barcode_search_is_complete(
+        self, form_metastore: FilteredMetastore, image_barcode_dict: dict
+    ) -> bool:
+        """
+        Returns True once reading more pages can't change the barcode match. That's when
+        a single template has matched, every one of its pages has been found, and it has
+        no continuation sheets that could appear later in the scan.
+        """
+
+        images_by_barcode = self.images_by_barcode(image_barcode_dict)
+
+        def count_matched_pages(meta) -> int:
+            # Same assignment as the matcher: each page takes the first unused image with its barcode
+            images_used = set()
+            for form_page in meta.form_pages:
+                template_barcode = meta.barcodes[form_page.page_number]
+                for img_count in images_by_barcode.get(template_barcode, ()):
+                    if img_count not in images_used:
+                        images_used.add(img_count)
+                        break
+            return len(images_used)
+
+        matched_pages = {
+            meta_id: count_matched_pages(meta)
+            for meta_id, meta in form_metastore.filtered_metastore.items()
+        }
+        matched_meta_ids = [
+            meta_id for meta_id, count in matched_pages.items() if count > 0
+        ]
+        if len(matched_meta_ids) != 1:
+            return False
+
+        meta_id = matched_meta_ids[0]
+        meta = form_metastore.filtered_metastore[meta_id]
+        if matched_pages[meta_id] < len(meta.form_pages):
+            return False
+
+        continuation_metastore = self.filter_metastore_based_on_meta_id(
+            self.complete_meta_store, meta_id
+        ).filtered_continuation_metastore
+        return len(continuation_metastore) == 0
+
+    @staticmethod
+    def images_by_barcode(image_barcode_dict: dict) -> dict:
+        """
+        Returns the scan page numbers with each barcode, in the order they were read, so
+        template pages look up the scan pages with their barcode rather than checking every
+        scan page.
+        """
+        images_by_barcode = defaultdict(list)
+        for img_count, image_barcode in image_barcode_dict.items():
+            images_by_barcode[image_barcode].append(img_count)
+        return images_by_barcode
+
+    @staticmethod
+    def get_barcode_from_image(page):
+        """
+        Returns the first barcode found in the top right of the image, decoded as utf8,
+        or None if there isn't one.
+        """
+        return BarcodeReader().read(page)
+
     @staticmethod
     def get_meta_matched_meta_ids(
         matching_meta_to_images_list: List[MatchingMetaToImages],
@@ -832,7 +1008,7 @@ class ExtractionService:
         form metastore.
 
         Args:
-            images (List[str]): A list of image file locations to be matched with templates.
+            images (List[PageImage]): The preprocessed pages to be matched with templates.
             form_metastore (Dict[str, Any]): A dictionary containing form template metadata.
             scan_location (str): used for updating the location of continuation sheets that are part of the main scan
 
@@ -845,7 +1021,14 @@ class ExtractionService:
             returned.
         """
         matching_meta_images = MatchingMetaToImages()
-        image_barcode_dict = self.get_barcodes_scan_number_mapping(image_locations)
+        image_barcode_dict = self.get_barcodes_scan_number_mapping(
+            image_locations,
+            is_complete=lambda barcodes: self.barcode_search_is_complete(
+                form_metastore, barcodes
+            ),
+        )
+
+        images_by_barcode = self.images_by_barcode(image_barcode_dict)
 
         # Iterate over each form in the form_metastore and try to match it to an image by its barcode
         # ======= Pull out the scan matches  ======
@@ -856,27 +1039,26 @@ class ExtractionService:
             form_pages_used = []
 
             for form_page in meta.form_pages:
-                template_barcode = form_page.additional_args["extra"]["barcode"]
-
-                for img_count, image_barcode in image_barcode_dict.items():
-                    if template_barcode == image_barcode:
-                        # Check that we haven't already matched this image or form page
-                        if (
-                            img_count not in images_used
-                            and form_page.page_number not in form_pages_used
-                        ):
-                            logger.debug(
-                                f"Barcode match on {template_barcode} for image {img_count} from page: {form_page.page_number}"
-                            )
-                            matching_image_page[form_page.page_number] = [
-                                cv2.imread(image_locations[img_count])
-                            ]
-                            images_used.append(img_count)
-                            form_pages_used.append(form_page.page_number)
-                            self.info_msg.matched_templates.append(
-                                f"Match on {meta_id} with barcode {template_barcode} "
-                                f"for scan page number {img_count} from template page {form_page.page_number}"
-                            )
+                template_barcode = meta.barcodes[form_page.page_number]
+
+                for img_count in images_by_barcode.get(template_barcode, ()):
+                    # Check that we haven't already matched this image or form page
+                    if (
+                        img_count not in images_used
+                        and form_page.page_number not in form_pages_used
+                    ):
+                        logger.debug(
+                            f"Barcode match on {template_barcode} for image {img_count} from page: {form_page.page_number}"
+                        )
+                        matching_image_page[form_page.page_number] = [
+                            load_page_image(image_locations[img_count])
+                        ]
+                        images_used.append(img_count)
+                        form_pages_used.append(form_page.page_number)
+                        self.info_msg.matched_templates.append(
+                            f"Match on {meta_id} with barcode {template_barcode} "
+                            f"for scan page number {img_count} from template page {form_page.page_number}"
+                        )
 
             matching_meta_images.meta_id = meta_id
             matching_meta_images.image_page_map = matching_image_page
@@ -913,30 +1095,29 @@ class ExtractionService:
             form_pages_used = []
 
             for form_page in continuation_meta.form_pages:
-                template_barcode = form_page.additional_args["extra"]["barcode"]
-
-                for img_count, image_barcode in image_barcode_dict.items():
-                    if template_barcode == image_barcode:
-                        # Check that we haven't already matched this image or form page
-                        if img_count not in images_used:
-                            logger.debug(
-                                f"Barcode match on {template_barcode} for image {img_count} from page: {form_page.page_number}"
-                            )
-                            matching_image_page[form_page.page_number] = [
-                                cv2.imread(image_locations[img_count])
-                            ]
-                            images_used.append(img_count)
-
-                            form_pages_used.append(form_page.page_number)
-                            self.info_msg.matched_templates.append(
-                                f"Match on {continuation_meta_id} with barcode {template_barcode} "
-                                f"for scan page number {img_count} from template page {form_page.page_number}"
-                            )
-                            matching_meta_images.meta_id = continuation_meta_id
-                            matching_meta_images.image_page_map = matching_image_page
-                            if len(matching_meta_images.image_page_map) > 0:
-                                matched_meta_deep = copy.deepcopy(matching_meta_images)
-                                matching_images.append(matched_meta_deep)
+                template_barcode = continuation_meta.barcodes[form_page.page_number]
+
+                for img_count in images_by_barcode.get(template_barcode, ()):
+                    # Check that we haven't already matched this image or form page
+                    if img_count not in images_used:
+                        logger.debug(
+                            f"Barcode match on {template_barcode} for image {img_count} from page: {form_page.page_number}"
+                        )
+                        matching_image_page[form_page.page_number] = [
+                            load_page_image(image_locations[img_count])
+                        ]
+                        images_used.append(img_count)
+
+                        form_pages_used.append(form_page.page_number)
+                        self.info_msg.matched_templates.append(
+                            f"Match on {continuation_meta_id} with barcode {template_barcode} "
+                            f"for scan page number {img_count} from template page {form_page.page_number}"
+                        )
+                        matching_meta_images.meta_id = continuation_meta_id
+                        matching_meta_images.image_page_map = matching_image_page
+                        if len(matching_meta_images.image_page_map) > 0:
+                            matched_meta_deep = copy.deepcopy(matching_meta_images)
+                            matching_images.append(matched_meta_deep)
 
         # Handle the cases where we have too many or too few matches
         if len(matching_images) > 1:
@@ -1037,62 +1218,53 @@ class ExtractionService:
         return matching_image_results_list
 
     def create_scan_to_template_distances(self, form_images_as_strings, form_metastore):
+        template_pages = [
+            (meta_id, form_page, self.get_meta_page_text(form_page))
+            for meta_id, meta in form_metastore.items()
+            for form_page in meta.form_pages
+        ]
+        # Scan pages are scored against the shortlisted templates in one go
+        distances = self.get_template_texts().similarity_matrix(
+            [form_page for _, form_page, _ in template_pages],
+            [
+                form_metastore[meta_id].identifiers[form_page.page_number]
+                for meta_id, form_page, _ in template_pages
+            ],
+            [meta_page_text for _, _, meta_page_text in template_pages],
+            form_images_as_strings,
+            groups=[meta_id for meta_id, _, _ in template_pages],
+            shortlist_size=self.template_shortlist_size,
+        )
+
         scan_to_template_similarities = []
-        for meta_id, meta in form_metastore.items():
-            for form_page in meta.form_pages:
-                meta_page_text = self.get_meta_page_text(form_page)
-                for scan_page_no, form_image_as_string in enumerate(
-                    form_images_as_strings, start=1
-                ):
-                    # if meta_id == "lpa_pw":
-                    distance = self.calculate_similarity_ratio(
-                        form_page, form_image_as_string, meta_page_text
-                    )
-                    scan_info = {
-                        "meta": meta_id,
-                        "distance": distance,
-                        "scan_page_no": scan_page_no,
-                        "template_page_no": form_page.page_number,
-                        "form_image_as_string": form_image_as_string,
-                        "meta_page_text": meta_page_text,
-                    }
-                    scan_to_template_similarities.append(scan_info)
+        for row, (meta_id, form_page, meta_page_text) in enumerate(template_pages):
+            for scan_page_no, form_image_as_string in enumerate(
+                form_images_as_strings, start=1
+            ):
+                scan_info = {
+                    "meta": meta_id,
+                    "distance": int(distances[row, scan_page_no - 1]),
+                    "scan_page_no": scan_page_no,
+                    "template_page_no": form_page.page_number,
+                    "form_image_as_string": form_image_as_string,
+                    "meta_page_text": meta_page_text,
+                }
+                scan_to_template_similarities.append(scan_info)
         return scan_to_template_similarities
 
-    def get_meta_page_text(self, form_page):
-        template_page_text_file = f"{self.extraction_folder_path}/target_texts/{form_page.additional_args['extra']['page_text']}"
-        with open(template_page_text_file, "r") as file:
-            meta_page_text = file.read()
-        return meta_page_text
-
-    @staticmethod
-    def calculate_similarity_ratio(
-        form_page: FormPage, form_image_as_string: str, meta_page_text: str
-    ) -> float:
+    def get_template_texts(self) -> TemplateTexts:
         """
-        Calculates the similarity between the given `form_image_as_string`
-        and `meta_page_text`, based on the `form_page.identifier` regex match.
-
-        Args:
-        - form_page (FormPage): An object representing the form page.
-        - form_image_as_string (str): A string representation of the form image.
-        - meta_page_text (str): A string representation of the meta page text.
-
-        Returns:
-        - ratio (float): The similarity ratio using Levenstein distance between `form_image_as_string` and
-          `meta_page_text` if a regex match is found. Otherwise, returns 0.
+        Returns the template target texts, reusing those held by the runtime context
+        if they've already been loaded.
         """
-        page_regex = form_page.identifier
-        regex_match = (
-            True if re.search(page_regex, form_image_as_string, re.DOTALL) else False
+        target_texts_directory = f"{self.extraction_folder_path}/target_texts"
+        return self.runtime_context.get_or_create(
+            ("template_texts", target_texts_directory),
+            lambda: TemplateTexts(target_texts_directory),
         )
 
-        if regex_match:
-            ratio = fuzz.ratio(form_image_as_string, meta_page_text)
-        else:
-            ratio = 0
-
-        return ratio
+    def get_meta_page_text(self, form_page):
+        return self.get_template_texts().page_text(form_page)
 
     def get_similarity_score(self, sorted_scan_template_entities):
         similarity_score = self.similarity_score(
@@ -1139,7 +1311,7 @@ class ExtractionService:
             template_page_no = template_to_keep["template_page_no"]
             scan_page_no = template_to_keep["scan_page_no"]
             matching_meta_images.image_page_map.setdefault(template_page_no, []).append(
-                cv2.imread(form_image_locations[scan_page_no - 1])
+                load_page_image(form_image_locations[scan_page_no - 1])
             )
             msg = (
                 f"Match on {meta_id_to_use} with OCR match for scan page number {scan_page_no} "
@@ -1186,7 +1358,7 @@ class ExtractionService:
             matching_meta_images = MatchingMetaToImages()
             matching_meta_images.meta_id = meta_id_to_use
             matching_meta_images.image_page_map.setdefault(template_page_no, []).append(
-                cv2.imread(form_image_locations[scan_page_no - 1])
+                load_page_image(form_image_locations[scan_page_no - 1])
             )
             matching_meta_images_deep = copy.deepcopy(matching_meta_images)
             matching_meta_images_list.append(matching_meta_images_deep)
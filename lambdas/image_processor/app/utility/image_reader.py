@@ -1,11 +1,11 @@
 import cv2
 import numpy as np
 
-from PIL import Image
-from pdf2image import convert_from_bytes
-from typing import List, Optional, ByteString, Dict, Any, Tuple
-import uuid
-from PIL import Image as im
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from typing import List, Optional, ByteString, Dict, Any, Callable
+
+from app.utility.barcode_reader import BarcodeScan
+from app.utility.page_image import PageImage, PageSequence
 
 
 class ImageReader:
@@ -16,130 +16,174 @@ class ImageReader:
     """
 
     @classmethod
-    def read(cls, file_name, conversion_parameters):
-        if file_name.lower().endswith(".pdf"):
-            return cls._read_pdf(file_name, conversion_parameters)
-        elif file_name.lower().endswith((".tiff", ".tif")):
-            return cls._read_tif(file_name)
-        else:
-            raise Exception("Unable to read file type")
-
-    @staticmethod
-    def _convert_PIL_to_cv2(image: Image) -> np.ndarray:
-        """Convert Pillow image to a opencv image
+    def read_pages(
+        cls,
+        file_name: str,
+        conversion_parameters: Optional[Dict[str, Any]] = None,
+        first_page: Optional[int] = None,
+        last_page: Optional[int] = None,
+        raw_img: Optional[ByteString] = None,
+    ) -> List[PageImage]:
+        """Reads a document into in-memory pages
 
-        Takes a Pillow image and returns an numpy
-        ndarray corresponding to an opencv image.
+        Decodes each page of a pdf or tif straight to a BGR
+        ndarray without writing anything to disk.
 
         Params:
-            image (Image): A Pillow image
+            file_name (str): Local filepath to the document
+            conversion_parameters (Optional[Dict[str, Any]]):
+                Options to pass to `pdf2image.convert_from_bytes`
+            first_page (Optional[int]): First page to read (1-based)
+            last_page (Optional[int]): Last page to read (inclusive)
+            raw_img (Optional[ByteString]): The pdf bytes if they've
+                already been read
 
         Returns:
-            (str): file path to file containing the ndarray
+            List[PageImage]: The pages of the document in order
         """
-        file_name = f"/tmp/{str(uuid.uuid4())}.npy"
-
-        image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-        np.save(file_name, image)
+        first_page = first_page or 1
+        if file_name.lower().endswith(".pdf"):
+            if raw_img is None:
+                raw_img = cls._read_bytes(file_name)
+            converted_imgs = convert_from_bytes(
+                raw_img,
+                first_page=first_page,
+                last_page=last_page,
+                **(conversion_parameters or {}),
+            )
+            if not isinstance(converted_imgs, list):
+                converted_imgs = [converted_imgs]
+            images = [
+                cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+                for image in converted_imgs
+            ]
+        elif file_name.lower().endswith((".tiff", ".tif")):
+            if last_page is None:
+                last_page = cv2.imcount(file_name)
+            _, imgs = cv2.imreadmulti(
+                file_name, start=first_page - 1, count=last_page - first_page + 1
+            )
+            if not isinstance(imgs, (tuple, list)):
+                raise TypeError("Expecting tuple to be returned by\n" "imreadmulti.")
+            images = [
+                cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img
+                for img in imgs
+            ]
+        else:
+            raise Exception("Unable to read file type")
 
-        return file_name
+        return [
+            PageImage(image, page_number=page_number, source=file_name)
+            for page_number, image in enumerate(images, start=first_page)
+        ]
 
-    @staticmethod
-    def _read_bytes(file_path: str) -> ByteString:
-        """Reads raw bytes from image file
+    @classmethod
+    def open_pages(
+        cls,
+        file_name: str,
+        chunk_size: int = 4,
+        preprocess: Optional[Callable[[List[PageImage]], None]] = None,
+        conversion_parameters: Optional[Dict[str, Any]] = None,
+        raw_img: Optional[ByteString] = None,
+    ) -> PageSequence:
+        """Opens a document for lazy page by page reading
 
-        Reads an image as raw bytes from a local filepath
+        Only the page count is read up front. Pages are rendered
+        in chunks of `chunk_size` as they're accessed.
 
         Params:
-            file_path (str): Local filepath to image
+            file_name (str): Local filepath to the document
+            chunk_size (int): Number of pages to render at a time
+            preprocess (Optional[Callable]): Applied in place to each
+                chunk of pages once rendered, e.g. auto-rotation
+            conversion_parameters (Optional[Dict[str, Any]]):
+                Options to pass to `pdf2image.convert_from_bytes`
+            raw_img (Optional[ByteString]): The pdf bytes if they've
+                already been read
 
         Returns:
-            (ByteString): Byte string for image
+            PageSequence: The pages of the document
         """
-        with open(file_path, "rb") as img_file:
-            raw_img = img_file.read()
-
-        return raw_img
+        if file_name.lower().endswith(".pdf"):
+            if raw_img is None:
+                raw_img = cls._read_bytes(file_name)
+            page_count = pdfinfo_from_bytes(raw_img)["Pages"]
+        elif file_name.lower().endswith((".tiff", ".tif")):
+            page_count = cv2.imcount(file_name)
+        else:
+            raise Exception("Unable to read file type")
 
-    @staticmethod
-    def _read_tif(file_path: str) -> Tuple[bool, List[np.ndarray]]:
-        """tif image reader method
+        def render_pages(first_page: int, last_page: int) -> List[PageImage]:
+            pages = cls.read_pages(
+                file_name,
+                conversion_parameters={
+                    "thread_count": min(chunk_size, last_page - first_page + 1),
+                    **(conversion_parameters or {}),
+                },
+                first_page=first_page,
+                last_page=last_page,
+                raw_img=raw_img,
+            )
+            if preprocess is not None:
+                preprocess(pages)
+            return pages
+
+        return PageSequence(page_count, render_pages, chunk_size=chunk_size)
 
-        The reader method for tif image files.
+    @classmethod
+    def open_barcode_scan(
+        cls,
+        file_name: str,
+        chunk_size: int = 4,
+        preview_dpi: int = 150,
+    ) -> BarcodeScan:
+        """Opens a document for matching on barcodes
+
+        Pages are previewed at `preview_dpi` to read their
+        barcodes, and only rendered at full resolution when
+        accessed. A pdf is only read from disk once, for both.
 
         Params:
-            file_path (str): Local  to image
-            **bytes_kwargs: Optional keyword arguments to pass onto
-                `_read_bytes` method.
+            file_name (str): Local filepath to the document
+            chunk_size (int): Number of preview pages to render at a time
+            preview_dpi (int): Resolution to render previews at
 
         Returns:
-            Tuple[bool, List[ndarray]]: Tuple where
-                first entry specifies whether the result
-                is a multipage image, and the second the
-                list of images returned
+            BarcodeScan: The pages of the document
         """
-        imgs = []
-        _, imgs = cv2.imreadmulti(file_path, mats=imgs)
-
-        multipage = True
-        img_locations = []
-        if isinstance(imgs, tuple):
-            if len(imgs) == 1:
-                multipage = False
-            for img in imgs:
-                new_img = im.fromarray(img)
-                file_name = f"/tmp/{str(uuid.uuid4())}.jpg"
-                new_img.save(f"{file_name}", "JPEG")
-                img_locations.append(file_name)
-        else:
-            raise TypeError("Expecting tuple to be returned by\n" "imreadmulti.")
-
-        return multipage, img_locations
+        raw_img = None
+        if file_name.lower().endswith(".pdf"):
+            raw_img = cls._read_bytes(file_name)
+        preview_pages = cls.open_pages(
+            file_name,
+            chunk_size=chunk_size,
+            conversion_parameters={"dpi": preview_dpi},
+            raw_img=raw_img,
+        )
+
+        def render_page(page_number: int) -> PageImage:
+            return cls.read_pages(
+                file_name,
+                first_page=page_number,
+                last_page=page_number,
+                raw_img=raw_img,
+            )[0]
+
+        return BarcodeScan(preview_pages, render_page)
 
     @staticmethod
-    def _read_pdf(
-        file_path: str,
-        conversion_parameters: Optional[Dict[str, Any]] = None,
-    ) -> List[np.ndarray]:
-        """reader method
+    def _read_bytes(file_path: str) -> ByteString:
+        """Reads raw bytes from image file
 
-        The reader method for pdf image files. Uses `pdf2image`
-        `convert_from_bytes` to convert a pdf byte string to
-        a list of opencv images saved as .npy files.
+        Reads an image as raw bytes from a local filepath
 
         Params:
             file_path (str): Local filepath to image
-            conversion_parameters (Optional[Dict[str, Any]]):
-                Options to pass to `pdf2image.convert_from_bytes`
-            **bytes_kwargs: Optional keyword arguments to pass onto
-                `_read_bytes` method.
 
         Returns:
-            Tuple[bool, List[str]]: Tuple where
-                first entry specifies whether the result
-                is a multipage image, and the second the
-                list of file paths containing the ndarrays of the images
+            (ByteString): Byte string for image
         """
+        with open(file_path, "rb") as img_file:
+            raw_img = img_file.read()
 
-        raw_img = ImageReader._read_bytes(file_path)
-        if conversion_parameters is None:
-            conversion_parameters = {}
-
-        converted_imgs = convert_from_bytes(raw_img, **conversion_parameters)
-
-        img_locations = []
-
-        if isinstance(converted_imgs, list):
-            for image in converted_imgs:
-                file_name = f"/tmp/{str(uuid.uuid4())}.jpg"
-                image.save(f"{file_name}", "JPEG")
-                img_locations.append(file_name)
-            multipage = True if len(converted_imgs) > 1 else False
-        else:
-            file_name = f"/tmp/{str(uuid.uuid4())}.jpg"
-            converted_imgs.save(f"{file_name}", "JPEG")
-            img_locations.append(file_name)
-            multipage = False
-
-        return multipage, img_locations
+        return raw_img
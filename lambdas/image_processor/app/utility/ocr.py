@@ -1,7 +1,18 @@
+import atexit
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
 import numpy as np
-import cv2
 from tesserocr import PyTessBaseAPI, PSM
 
+from app.utility.custom_logging import custom_logger
+from app.utility.page_image import load_page_image
+from app.utility.page_scheduler import get_page_scheduler
+
+logger = custom_logger("ocr")
+
 
 def _convert_cv2_to_bytes(image: np.ndarray):
     image_bytes = image.tobytes()
@@ -11,18 +22,148 @@ def _convert_cv2_to_bytes(image: np.ndarray):
     return image_bytes, w, h, bpp, bpl
 
 
-def get_text_from_image_file(image_locations: list[str]) -> list:
-    api_kwargs = {"psm": PSM.AUTO_OSD, "lang": "eng"}
-    api = PyTessBaseAPI(**api_kwargs)
+class TesseractPool:
+    """
+    Thread safe pool of long lived tesserocr API handles sharing a fixed configuration.
+
+    Handles are created on demand up to the pool size and are reused for the life of the
+    pool, so the tesseract models are only loaded once per handle rather than per page.
+    """
+
+    def __init__(self, psm: int = PSM.AUTO_OSD, lang: str = "eng", size: int = None):
+        self.psm = psm
+        self.lang = lang
+        self.size = size or int(
+            os.getenv(
+                "TESSERACT_POOL_SIZE",
+                os.getenv("PAGE_WORKERS", str(os.cpu_count() or 1)),
+            )
+        )
+        self._handles = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self) -> PyTessBaseAPI:
+        try:
+            return self._handles.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Tesseract pool has been closed")
+            create = self._created < self.size
+            if create:
+                self._created += 1
+
+        if create:
+            try:
+                logger.debug(
+                    f"Creating tesseract handle (psm: {self.psm}, lang: {self.lang})"
+                )
+                return PyTessBaseAPI(psm=self.psm, lang=self.lang)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool is at capacity so wait for another thread to release a handle
+        return self._handles.get()
+
+    @contextmanager
+    def handle(self):
+        """
+        Borrows a handle from the pool for the duration of the with block.
+        """
+        api = self._acquire()
+        try:
+            yield api
+        finally:
+            api.Clear()
+            if self._closed:
+                api.End()
+            else:
+                self._handles.put(api)
+
+    def close(self) -> None:
+        """
+        Ends all idle handles in the pool. Handles still in use are ended when released.
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                api = self._handles.get_nowait()
+            except queue.Empty:
+                break
+            api.End()
+
 
-    list_of_text = []
-    for image_location in image_locations:
-        image = cv2.imread(image_location)
-        image_bytes = _convert_cv2_to_bytes(image)
-        api.SetImageBytes(*image_bytes)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_tesseract_pool(psm: int = PSM.AUTO_OSD, lang: str = "eng") -> TesseractPool:
+    """
+    Returns the process level pool for the given page segmentation mode and language.
+    """
+    with _pools_lock:
+        key = (psm, lang)
+        if key not in _pools:
+            _pools[key] = TesseractPool(psm=psm, lang=lang)
+        return _pools[key]
+
+
+@atexit.register
+def close_tesseract_pools() -> None:
+    """
+    Closes and discards all process level tesseract pools.
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def get_text_from_image(image: np.ndarray) -> str:
+    with get_tesseract_pool(psm=PSM.AUTO_OSD).handle() as api:
+        api.SetImageBytes(*_convert_cv2_to_bytes(image))
         api.Recognize()
-        text = api.GetUTF8Text()
+        return api.GetUTF8Text()
+
+
+def get_text_from_images(images: list) -> list:
+    """
+    Runs OCR on each image, given as ndarrays or PageImages, returning the text in the same order.
+    """
+    # Pages are recognised concurrently, each worker borrowing its own handle
+    return get_page_scheduler().map(
+        lambda image: get_text_from_image(load_page_image(image)), images
+    )
+
+
+def detect_orientation(image: np.ndarray) -> dict:
+    """
+    Runs tesseract orientation and script detection on an RGB image.
+
+    Returns:
+    - dict with the same keys as pytesseract's image_to_osd DICT output
+      (orientation, rotate, orientation_conf, script, script_conf),
+      or None if tesseract couldn't detect an orientation.
+    """
+    with get_tesseract_pool(psm=PSM.OSD_ONLY).handle() as api:
+        api.SetImageBytes(*_convert_cv2_to_bytes(image))
+        results = api.DetectOrientationScript()
 
-        list_of_text.append(text)
+    if not results:
+        return None
 
-    return list_of_text
+    return {
+        "orientation": results["orient_deg"],
+        # Clockwise rotation needed to make the page upright
+        "rotate": (360 - results["orient_deg"]) % 360,
+        "orientation_conf": results["orient_conf"],
+        "script": results["script_name"],
+        "script_conf": results["script_conf"],
+    }
@@ -0,0 +1,169 @@
+import os
+import threading
+import uuid
+from collections.abc import Sequence
+from typing import Callable, List, Union
+
+import cv2
+import imutils
+import numpy as np
+
+
+class PageImage:
+    """
+    A single decoded page of a scanned document, held in memory.
+
+    The page is decoded once and flows through each stage of the pipeline as an ndarray.
+    Derived views (grayscale, RGB and downscaled copies) are built on first use and kept
+    until the page itself changes, e.g. when it's rotated.
+
+    Nothing is written to disk unless save is called, which is for debugging only.
+    """
+
+    def __init__(self, image: np.ndarray, page_number: int = None, source: str = ""):
+        self.page_number = page_number
+        self.source = source
+        self._image = image
+        self._views = {}
+
+    def __repr__(self):
+        return (
+            f"PageImage(source={self.source!r}, page_number={self.page_number}, "
+            f"shape={self._image.shape})"
+        )
+
+    @property
+    def image(self) -> np.ndarray:
+        """The page as a BGR ndarray, the same as cv2.imread would return."""
+        return self._image
+
+    @property
+    def shape(self) -> tuple:
+        return self._image.shape
+
+    @property
+    def gray(self) -> np.ndarray:
+        if "gray" not in self._views:
+            if self._image.ndim == 2:
+                self._views["gray"] = self._image
+            else:
+                self._views["gray"] = cv2.cvtColor(self._image, cv2.COLOR_BGR2GRAY)
+        return self._views["gray"]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        if "rgb" not in self._views:
+            if self._image.ndim == 2:
+                self._views["rgb"] = cv2.cvtColor(self._image, cv2.COLOR_GRAY2RGB)
+            else:
+                self._views["rgb"] = cv2.cvtColor(self._image, cv2.COLOR_BGR2RGB)
+        return self._views["rgb"]
+
+    def downscaled(self, max_dimension: int) -> np.ndarray:
+        """
+        Returns the page scaled down so that its longest side is at most max_dimension.
+        The page is returned unchanged if it's already small enough.
+        """
+        key = ("downscaled", max_dimension)
+        if key not in self._views:
+            height, width = self._image.shape[:2]
+            scale = max_dimension / max(height, width)
+            if scale >= 1:
+                self._views[key] = self._image
+            else:
+                self._views[key] = cv2.resize(
+                    self._image,
+                    (int(width * scale), int(height * scale)),
+                    interpolation=cv2.INTER_AREA,
+                )
+        return self._views[key]
+
+    def rotate(self, angle: float) -> None:
+        """
+        Rotates the page clockwise by angle degrees, expanding it so nothing is cropped.
+        """
+        self._image = imutils.rotate_bound(self._image, angle=angle)
+        self._views = {}
+
+    def save(self, directory: str, extension: str = ".png") -> str:
+        """
+        Writes the page to directory for debugging and returns the file path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        page = "" if self.page_number is None else f"page_{self.page_number:03d}-"
+        file_name = os.path.join(directory, f"{page}{str(uuid.uuid4())}{extension}")
+        cv2.imwrite(file_name, self._image)
+        return file_name
+
+
+class PageSequence(Sequence):
+    """
+    The pages of a document, rendered on demand.
+
+    Pages are rendered in chunks the first time an index in the chunk is accessed, then
+    kept for the life of the sequence. Consumers that stop early (e.g. once every barcode
+    they need has been found) never pay to render the rest of the document.
+
+    Rendering happens in the thread that accesses the page, so stages that fan out over
+    worker threads should take a list of the pages they need first.
+    """
+
+    def __init__(
+        self,
+        page_count: int,
+        render_pages: Callable[[int, int], List[PageImage]],
+        chunk_size: int = 4,
+    ):
+        """
+        Args:
+        - page_count (int): Total number of pages in the document.
+        - render_pages (Callable): Renders pages first to last (1-based, inclusive).
+        - chunk_size (int): Number of pages to render at a time.
+        """
+        self.page_count = page_count
+        self.chunk_size = max(1, chunk_size)
+        self._render_pages = render_pages
+        self._pages = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.page_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.page_count))]
+
+        if index < 0:
+            index += self.page_count
+        if not 0 <= index < self.page_count:
+            raise IndexError("page index out of range")
+
+        self._render_until(index)
+        return self._pages[index]
+
+    @property
+    def rendered_count(self) -> int:
+        return len(self._pages)
+
+    def _render_until(self, index: int) -> None:
+        with self._lock:
+            while len(self._pages) <= index:
+                first_page = len(self._pages) + 1
+                last_page = min(first_page + self.chunk_size - 1, self.page_count)
+                pages = self._render_pages(first_page, last_page)
+                if len(pages) != last_page - first_page + 1:
+                    raise RuntimeError(
+                        f"Expected pages {first_page}-{last_page} but got {len(pages)} pages"
+                    )
+                self._pages.extend(pages)
+
+
+def load_page_image(page: Union[PageImage, np.ndarray, str]) -> np.ndarray:
+    """
+    Returns the ndarray for a page, reading it from disk if given a file path.
+    """
+    if isinstance(page, PageImage):
+        return page.image
+    if isinstance(page, np.ndarray):
+        return page
+    return cv2.imread(page)
@@ -0,0 +1,82 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, TypeVar
+
+from app.utility.custom_logging import custom_logger
+
+logger = custom_logger("page_scheduler")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class PageScheduler:
+    """
+    Runs a per-page stage of the pipeline across a pool of worker threads.
+
+    Results are always returned in the same order as the pages that were passed in,
+    so callers see exactly the same inputs as they would from a serial loop.
+
+    Threads are used rather than processes as the heavy lifting (opencv, tesseract,
+    zbar) happens in native code that releases the GIL, and lambda doesn't provide
+    the shared memory that multiprocessing pools need.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(
+            os.getenv("PAGE_WORKERS", str(os.cpu_count() or 1))
+        )
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="page"
+                )
+            return self._executor
+
+    def map(self, func: Callable[[T], R], pages: Iterable[T]) -> List[R]:
+        """
+        Applies func to every page and returns the results in page order.
+
+        Stages must not call map from inside func, as nested work could wait on
+        workers that are themselves waiting.
+
+        Args:
+        - func (Callable): Function applied to each page.
+        - pages (Iterable): The pages, e.g. image locations.
+
+        Returns:
+        - list of results in the same order as pages.
+        """
+        pages = list(pages)
+        if self.max_workers <= 1 or len(pages) <= 1:
+            return [func(page) for page in pages]
+
+        logger.debug(f"Scheduling {len(pages)} pages across {self.max_workers} workers")
+        return list(self.executor.map(func, pages))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_page_scheduler = None
+_page_scheduler_lock = threading.Lock()
+
+
+def get_page_scheduler() -> PageScheduler:
+    """
+    Returns the process level page scheduler, creating it on first use.
+    """
+    global _page_scheduler
+    with _page_scheduler_lock:
+        if _page_scheduler is None:
+            _page_scheduler = PageScheduler()
+        return _page_scheduler
@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+from app.utility.custom_logging import custom_logger
+
+logger = custom_logger("runtime_context")
+
+
+class RuntimeContext:
+    """
+    Holds objects that are expensive to build but never change between requests,
+    e.g. the FormOperator, the form metadata store and boto3 clients.
+
+    A single context is kept for the life of the lambda container (see get_runtime_context)
+    so that warm invocations reuse the objects built on the cold start.
+    """
+
+    def __init__(self):
+        self.created_at = time.time()
+        self.invocations = 0
+        self._objects = {}
+        self._lock = threading.RLock()
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Returns the object stored against key, building it with factory if it doesn't exist yet.
+
+        Args:
+        - key (Hashable): Key identifying the object, e.g. ("form_operator", config_path).
+        - factory (Callable): Zero argument callable used to build the object.
+
+        Returns:
+        - The cached object.
+        """
+        with self._lock:
+            if key not in self._objects:
+                start = time.perf_counter()
+                self._objects[key] = factory()
+                logger.debug(
+                    f"Built runtime object {key} in {time.perf_counter() - start:.3f}s"
+                )
+            return self._objects[key]
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Removes a cached object so that it is rebuilt on next use.
+        If no key is given, all cached objects are removed.
+
+        Args:
+        - key (Hashable): Key of the object to remove.
+        """
+        with self._lock:
+            if key is None:
+                self._objects.clear()
+            else:
+                self._objects.pop(key, None)
+
+    def start_invocation(self) -> None:
+        """
+        Records the start of a lambda invocation using this context.
+        """
+        with self._lock:
+            self.invocations += 1
+            invocations = self.invocations
+        logger.debug(
+            f"Runtime context invocation {invocations} "
+            f"({'cold' if invocations == 1 else 'warm'} start)"
+        )
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._objects
+
+
+_runtime_context = None
+_runtime_context_lock = threading.Lock()
+
+
+def get_runtime_context() -> RuntimeContext:
+    """
+    Returns the process level runtime context, creating it on first use.
+    """
+    global _runtime_context
+    with _runtime_context_lock:
+        if _runtime_context is None:
+            _runtime_context = RuntimeContext()
+        return _runtime_context
+
+
+def reset_runtime_context() -> None:
+    """
+    Discards the process level runtime context so that everything is rebuilt on next use.
+    """
+    global _runtime_context
+    with _runtime_context_lock:
+        _runtime_context = None
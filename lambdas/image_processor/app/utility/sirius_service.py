@@ -1,5 +1,8 @@
 import datetime
 import json
+import random
+import threading
+import time
 
 import boto3
 import jwt
@@ -7,39 +10,105 @@ import os
 
 import requests
 from app.utility.custom_logging import custom_logger
+from app.utility.aws_clients import client_config
+from app.utility.runtime_context import RuntimeContext
 from botocore.exceptions import ClientError
 
 logger = custom_logger("sirius_service")
 
 
+class SiriusAuthCache:
+    """
+    Holds the JWT secret and the last signed token so that they can be reused by warm
+    invocations instead of calling Secrets Manager and signing a new token for every request.
+    """
+
+    def __init__(self):
+        self.secret = None
+        self.secret_expires_at = 0.0
+        self.token = None
+        self.token_session_data = None
+        self.token_refresh_at = 0.0
+        self.lock = threading.RLock()
+
+    def invalidate(self) -> None:
+        """
+        Discards the cached secret and token, e.g. after the secret has been rotated.
+        """
+        with self.lock:
+            self.secret = None
+            self.secret_expires_at = 0.0
+            self.token = None
+            self.token_session_data = None
+            self.token_refresh_at = 0.0
+
+
 class SiriusService:
-    def __init__(self, environment):
+    def __init__(self, environment, runtime_context: RuntimeContext = None):
         self.environment = environment
         self.target_environment = os.getenv("TARGET_ENVIRONMENT")
         self.sirius_url = os.getenv("SIRIUS_URL")
         self.sirius_url_part = os.getenv("SIRIUS_URL_PART")
         self.secret_key_prefix = os.getenv("SECRET_PREFIX")
-        self.secret_manager = self.setup_secret_manager_connection()
+        self.runtime_context = runtime_context or RuntimeContext()
+        self.secret_manager = self.runtime_context.get_or_create(
+            ("secretsmanager", self.environment), self.setup_secret_manager_connection
+        )
+        self.auth_cache = self.runtime_context.get_or_create(
+            ("sirius_auth", self.environment), SiriusAuthCache
+        )
+        self.secret_ttl = int(os.getenv("SIRIUS_SECRET_TTL_SECONDS", "900"))
+        self.token_lifetime = 3600
+        self.token_refresh_margin = int(
+            os.getenv("SIRIUS_TOKEN_REFRESH_MARGIN_SECONDS", "300")
+        )
+        self.session = self.runtime_context.get_or_create(
+            "sirius_session", self.setup_sirius_session
+        )
+        self.timeout = (
+            float(os.getenv("SIRIUS_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("SIRIUS_READ_TIMEOUT", "30")),
+        )
+        self.max_attempts = int(os.getenv("SIRIUS_MAX_ATTEMPTS", "3"))
+        self.backoff_seconds = float(os.getenv("SIRIUS_BACKOFF_SECONDS", "0.5"))
 
     def build_sirius_headers(self):
         """
-        Builds headers for Sirius request, including JWT auth
+        Builds headers for Sirius request, including JWT auth.
+        The signed token is reused until shortly before it expires.
         Returns:
             Header dictionary with content type and auth token
         """
         content_type = "application/json"
         session_data = os.environ["SESSION_DATA"]
-        secret = self.get_secret()
-
-        encoded_jwt = jwt.encode(
-            {
-                "session-data": session_data,
-                "iat": datetime.datetime.now(datetime.UTC),
-                "exp": datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=3600),
-            },
-            secret,
-            algorithm="HS256",
-        )
+
+        with self.auth_cache.lock:
+            if (
+                self.auth_cache.token is not None
+                and self.auth_cache.token_session_data == session_data
+                and time.time() < self.auth_cache.token_refresh_at
+            ):
+                encoded_jwt = self.auth_cache.token
+            else:
+                secret = self.get_cached_secret()
+                issued_at = datetime.datetime.now(datetime.UTC)
+                encoded_jwt = jwt.encode(
+                    {
+                        "session-data": session_data,
+                        "iat": issued_at,
+                        "exp": issued_at
+                        + datetime.timedelta(seconds=self.token_lifetime),
+                    },
+                    secret,
+                    algorithm="HS256",
+                )
+                self.auth_cache.token = encoded_jwt
+                self.auth_cache.token_session_data = session_data
+                self.auth_cache.token_refresh_at = (
+                    issued_at.timestamp()
+                    + self.token_lifetime
+                    - self.token_refresh_margin
+                )
 
         return {
             "Content-Type": content_type,
@@ -62,7 +131,15 @@ class SiriusService:
         logger.debug(f"Sending request to Sirius on url: {url}")
 
         try:
-            response = requests.get(url=url, headers=headers)
+            response = self.get_from_sirius(url=url, headers=headers)
+            # The cached secret may be stale if it has been rotated, so refresh it and retry once
+            if response.status_code in [401, 403]:
+                logger.warning(
+                    f"Sirius responded with {response.status_code}, refreshing JWT secret"
+                )
+                self.auth_cache.invalidate()
+                headers = self.build_sirius_headers()
+                response = self.get_from_sirius(url=url, headers=headers)
         except requests.exceptions.RequestException as e:
             raise Exception(f"Error getting response from Sirius: {e}")
 
@@ -73,6 +150,65 @@ class SiriusService:
 
         return response_dict
 
+    def get_from_sirius(self, url: str, headers: dict) -> requests.Response:
+        """
+        Sends a GET request to Sirius, retrying connection errors, timeouts and 5xx responses
+        up to max_attempts times with jittered exponential backoff.
+
+        Args:
+        - url (str): The Sirius URL to request.
+        - headers (dict): The headers to send, including JWT auth.
+
+        Returns:
+        - The response from the last attempt.
+
+        Raises:
+        - requests.exceptions.RequestException: If the last attempt fails to get a response.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.get(
+                    url=url, headers=headers, timeout=self.timeout
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                logger.debug(
+                    f"Sirius request attempt {attempt} failed "
+                    f"in {time.perf_counter() - start:.3f}s: {e}"
+                )
+                if attempt == self.max_attempts:
+                    raise
+            else:
+                logger.debug(
+                    f"Sirius request attempt {attempt} returned {response.status_code} "
+                    f"in {time.perf_counter() - start:.3f}s"
+                )
+                if response.status_code < 500 or attempt == self.max_attempts:
+                    return response
+
+            time.sleep(random.uniform(0, self.backoff_seconds * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def setup_sirius_session() -> requests.Session:
+        """
+        Sets up an HTTP session for Sirius requests. The session is kept in the runtime
+        context so warm invocations reuse its open connections.
+
+        Returns:
+        - A requests session.
+        """
+        session = requests.Session()
+        # Retries are handled by get_from_sirius so that each attempt can be timed
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=4, max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
     def setup_secret_manager_connection(self) -> boto3.client:
         """
         Sets up a connection to AWS Secrets Manager based on instance variable "environment".
@@ -88,11 +224,32 @@ class SiriusService:
                 endpoint_url="http://localstack-processor:4566",
                 aws_access_key_id="fake",
                 aws_secret_access_key="fake",  # pragma: allowlist secret
+                config=client_config(),
             )
         else:
-            sm = boto3.client(service_name="secretsmanager", region_name="eu-west-1")
+            sm = boto3.client(
+                service_name="secretsmanager",
+                region_name="eu-west-1",
+                config=client_config(),
+            )
         return sm
 
+    def get_cached_secret(self):
+        """
+        Returns the JWT secret, only fetching it from Secrets Manager when the cached copy
+        is older than secret_ttl seconds.
+        Returns:
+            JWT secret
+        """
+        with self.auth_cache.lock:
+            if (
+                self.auth_cache.secret is None
+                or time.time() >= self.auth_cache.secret_expires_at
+            ):
+                self.auth_cache.secret = self.get_secret()
+                self.auth_cache.secret_expires_at = time.time() + self.secret_ttl
+            return self.auth_cache.secret
+
     def get_secret(self):
         """
         Gets and decrypts the JWT secret from AWS Secrets Manager for the chosen environment
@@ -0,0 +1,218 @@
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from form_tools.form_meta.form_meta import FormPage
+
+
+class TemplateTokenIndex:
+    """
+    An inverted index from distinctive words to the template pages whose target text
+    contains them, used to shortlist the template pages a scan page is most likely to be
+    before any of them are scored in full.
+
+    Words are weighted by how rare they are across the template pages, and a page's score
+    is the weight of the words it shares with the scan page over the weight of all its
+    words, so that long pages aren't favoured. Words that appear on more than half of the
+    pages don't help tell them apart, so aren't indexed.
+    """
+
+    def __init__(self, page_texts: Dict[str, str]):
+        """
+        Args:
+        - page_texts (dict): The target text of each template page, keyed by file name.
+        """
+        page_tokens = {
+            file_name: self.tokens(text) for file_name, text in page_texts.items()
+        }
+        document_frequency = defaultdict(int)
+        for tokens in page_tokens.values():
+            for token in tokens:
+                document_frequency[token] += 1
+
+        page_count = len(page_tokens)
+        self._postings = defaultdict(list)
+        self._weights = {}
+        for token, frequency in document_frequency.items():
+            if frequency > max(1, page_count // 2):
+                continue
+            self._weights[token] = math.log(page_count / frequency)
+            for file_name, tokens in page_tokens.items():
+                if token in tokens:
+                    self._postings[token].append(file_name)
+        self._page_weights = {
+            file_name: sum(self._weights.get(token, 0) for token in tokens) or 1
+            for file_name, tokens in page_tokens.items()
+        }
+
+    @staticmethod
+    def tokens(text: str) -> set:
+        """
+        Returns the distinct lower case words in the text, ignoring very short words and
+        numbers which OCR often gets wrong.
+        """
+        words = re.findall(r"[a-z]+", text.lower())
+        return {word for word in words if len(word) > 2}
+
+    def shortlist(
+        self, text: str, candidates: Iterable[str], shortlist_size: int
+    ) -> List[str]:
+        """
+        Returns up to shortlist_size of the candidate template pages that share the most
+        distinctive words with the text, best first.
+
+        Args:
+        - text (str): The OCR text of a scan page.
+        - candidates (Iterable[str]): File names of the template pages to choose from.
+        - shortlist_size (int): The most template pages to return.
+        """
+        candidates = set(candidates)
+        scores = defaultdict(float)
+        for token in self.tokens(text):
+            for file_name in self._postings.get(token, []):
+                if file_name in candidates:
+                    scores[file_name] += self._weights[token]
+        for file_name in scores:
+            scores[file_name] /= self._page_weights[file_name]
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [file_name for file_name, _ in ranked[:shortlist_size]]
+
+
+class TemplateTexts:
+    """
+    Scores the OCR text of scanned pages against the target text of template pages.
+
+    Target texts are read from disk the first time they're used, then kept for the life of
+    the lambda container (see RuntimeContext). Page identifiers come precompiled from the
+    CompiledFormMetadata. Scores for every scan page against every template page are
+    computed in a single batched call.
+
+    Scores are the same as fuzzywuzzy's fuzz.ratio with python-Levenshtein, i.e. the
+    normalised indel similarity rounded to a whole percentage.
+    """
+
+    def __init__(self, target_texts_directory: str):
+        self.target_texts_directory = target_texts_directory
+        self._texts = {}
+        self._token_index = None
+        self._lock = threading.Lock()
+
+    def page_text(self, form_page: FormPage) -> str:
+        """
+        Returns the target text for a template page, reading it from disk on first use.
+        """
+        file_name = form_page.additional_args["extra"]["page_text"]
+        with self._lock:
+            if file_name not in self._texts:
+                with open(
+                    os.path.join(self.target_texts_directory, file_name), "r"
+                ) as file:
+                    self._texts[file_name] = file.read()
+            return self._texts[file_name]
+
+    @property
+    def token_index(self) -> TemplateTokenIndex:
+        """
+        The token index of every target text in the directory, built on first use.
+        """
+        with self._lock:
+            if self._token_index is None:
+                for file_name in sorted(os.listdir(self.target_texts_directory)):
+                    if file_name not in self._texts:
+                        with open(
+                            os.path.join(self.target_texts_directory, file_name), "r"
+                        ) as file:
+                            self._texts[file_name] = file.read()
+                self._token_index = TemplateTokenIndex(self._texts)
+            return self._token_index
+
+    def similarity_matrix(
+        self,
+        form_pages: List[FormPage],
+        identifiers: List[re.Pattern],
+        meta_page_texts: List[str],
+        scan_texts: List[str],
+        groups: List[Hashable] = None,
+        shortlist_size: int = 0,
+    ) -> np.ndarray:
+        """
+        Scores each scan page against each template page.
+
+        If there are more than shortlist_size template pages, only those shortlisted for
+        at least one scan page by the token index are scored, along with the other pages
+        in their group, so that a shortlisted template is always scored in full.
+
+        Args:
+        - form_pages (List[FormPage]): The template pages.
+        - identifiers (List[re.Pattern]): The compiled identifier of each template page.
+        - meta_page_texts (List[str]): The target text of each template page.
+        - scan_texts (List[str]): The OCR text of each scan page.
+        - groups (List[Hashable]): The template each template page belongs to.
+        - shortlist_size (int): How many template pages to shortlist per scan page,
+          or 0 to score every template page.
+
+        Returns:
+        - ndarray: A template pages x scan pages matrix of whole number scores from 0 to 100.
+          The score is 0 wherever the template page's identifier isn't found in the scan text.
+        """
+        if len(form_pages) == 0 or len(scan_texts) == 0:
+            return np.zeros((len(form_pages), len(scan_texts)), dtype=int)
+
+        identified = np.array(
+            [
+                [identifier.search(text) is not None for text in scan_texts]
+                for identifier in identifiers
+            ]
+        )
+        scores = np.zeros(identified.shape, dtype=int)
+        # Only template pages identified in at least one scan page need scoring
+        candidates = identified.any(axis=1)
+        if 0 < shortlist_size < len(form_pages):
+            candidates &= self.shortlisted(
+                form_pages, scan_texts, groups, shortlist_size
+            )
+        rows = np.flatnonzero(candidates)
+        if len(rows) > 0:
+            ratios = process.cdist(
+                [meta_page_texts[row] for row in rows],
+                scan_texts,
+                scorer=fuzz.ratio,
+                dtype=np.float64,
+                workers=-1,
+            )
+            scores[rows] = np.rint(ratios).astype(int)
+        return np.where(identified, scores, 0)
+
+    def shortlisted(
+        self,
+        form_pages: List[FormPage],
+        scan_texts: List[str],
+        groups: List[Hashable],
+        shortlist_size: int,
+    ) -> np.ndarray:
+        """
+        Returns a mask of the template pages in a group with a page shortlisted for any
+        of the scan pages.
+        """
+        if groups is None:
+            groups = list(range(len(form_pages)))
+        file_names = [
+            form_page.additional_args["extra"]["page_text"] for form_page in form_pages
+        ]
+        shortlisted_files = set()
+        for text in scan_texts:
+            shortlisted_files.update(
+                self.token_index.shortlist(text, file_names, shortlist_size)
+            )
+        shortlisted_groups = {
+            group
+            for group, file_name in zip(groups, file_names)
+            if file_name in shortlisted_files
+        }
+        return np.array([group in shortlisted_groups for group in groups])
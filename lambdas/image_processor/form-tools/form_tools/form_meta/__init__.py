@@ -1 +1,2 @@
 from .form_meta import FormMetadata  # noqa: F401
+from .compiled_form_meta import CompiledFormMetadata  # noqa: F401
@@ -0,0 +1,148 @@
+import re
+
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
+
+from .form_field import FormField
+from .form_meta import FormMetadata, FormPage
+
+
+class CompiledFormMetadata:
+    """Read only snapshot of a `FormMetadata`
+
+    `FormMetadata` rebuilds its `FormPage` and `FormField`
+    objects from the underlying metadata every time they're
+    accessed. A `CompiledFormMetadata` builds them once,
+    indexes them by page number and compiles the page
+    identifiers so they can be looked up repeatedly (e.g.
+    for every scanned page of every request) at no cost.
+
+    It has the same `form_pages`, `form_fields`,
+    `fields_by_page`, `form_page` and `form_field` interface
+    as `FormMetadata` so it can be used in its place. Attributes can't be reassigned;
+    use `FormMetadata.compile` again if the metadata changes.
+
+    Attributes:
+        name (str): Name of the form metadata
+        form_template (str): Directory where the form template
+            images can be found
+        form_pages (Tuple[FormPage, ...]): Form pages in metadata
+            order
+        form_fields (Tuple[FormField, ...]): Form fields in
+            column order
+        form_page_numbers (Tuple[int, ...]): Form page numbers
+        pages (Mapping[int, FormPage]): Form pages by page number
+        fields (Mapping[str, FormField]): Form fields by name
+        fields_by_page (Mapping[int, Tuple[FormField, ...]]): Form
+            fields grouped by the page number they appear on
+        identifiers (Mapping[int, re.Pattern]): Compiled page
+            identifiers by page number
+        barcodes (Mapping[int, str]): Page barcodes, from the
+            page's `extra` additional args, by page number
+        form_meta (FormMetadata): The metadata the snapshot
+            was compiled from
+    """
+
+    def __init__(self, form_meta: FormMetadata):
+        form_pages = tuple(form_meta.form_pages)
+        form_fields = tuple(form_meta.form_fields)
+
+        fields_by_page = {page.page_number: [] for page in form_pages}
+        for field in form_fields:
+            fields_by_page.setdefault(field.page_number, []).append(field)
+
+        attributes = {
+            "name": form_meta.name,
+            "form_template": form_meta.form_template,
+            "form_pages": form_pages,
+            "form_fields": form_fields,
+            "form_page_numbers": tuple(page.page_number for page in form_pages),
+            "pages": MappingProxyType({page.page_number: page for page in form_pages}),
+            "fields": MappingProxyType({field.name: field for field in form_fields}),
+            "fields_by_page": MappingProxyType(
+                {pn: tuple(fields) for pn, fields in fields_by_page.items()}
+            ),
+            "identifiers": MappingProxyType(
+                {
+                    page.page_number: re.compile(page.identifier, re.DOTALL)
+                    for page in form_pages
+                }
+            ),
+            "barcodes": MappingProxyType(
+                {
+                    page.page_number: self._page_extra(page).get("barcode")
+                    for page in form_pages
+                }
+            ),
+            "form_meta": form_meta,
+        }
+        for attribute, value in attributes.items():
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is read only")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{type(self).__name__} is read only")
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(name={self.name!r}, "
+            f"form_page_numbers={self.form_page_numbers!r})"
+        )
+
+    @staticmethod
+    def _page_extra(page: FormPage) -> Dict[str, Any]:
+        additional_args = page.additional_args or {}
+        return additional_args.get("extra") or {}
+
+    def form_page(self, page_number: int) -> FormPage:
+        """Returns the specified form page
+
+        Params:
+            page_number (int): The page number
+                of the form page to return
+
+        Returns:
+            (FormPage): FormPage object
+        """
+        try:
+            return self.pages[page_number]
+        except KeyError:
+            raise ValueError("Page doesn't exist in Form Metadata.")
+
+    def form_field(self, field_name: str) -> FormField:
+        """Returns the specified form field
+
+        Params:
+            field_name (str): The name of the form
+                field to return
+
+        Returns:
+            (FormField): FormField object
+        """
+        try:
+            return self.fields[field_name]
+        except KeyError:
+            raise ValueError(f"Field {field_name} doesn't exist in Form Metadata.")
+
+
+def compile_meta_store(
+    form_meta_store: Mapping[str, FormMetadata],
+) -> Mapping[str, CompiledFormMetadata]:
+    """Compiles every `FormMetadata` in a metadata store
+
+    Params:
+        form_meta_store (Mapping[str, FormMetadata]):
+            A dictionary of `FormMetadata` objects by id
+
+    Returns:
+        (Mapping[str, CompiledFormMetadata]): A read only
+            dictionary of compiled metadata in the same order
+    """
+    return MappingProxyType(
+        {
+            meta_id: meta if isinstance(meta, CompiledFormMetadata) else meta.compile()
+            for meta_id, meta in form_meta_store.items()
+        }
+    )
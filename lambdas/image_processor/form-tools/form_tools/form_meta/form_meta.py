@@ -197,6 +197,8 @@ class FormMetadata(Metadata):
             form pages included in the form
         form_page_numbers (List[int]): List of form page numbers
             included in the form
+        fields_by_page (Dict[int, List[FormField]]): Form fields
+            grouped by the page number they appear on
         excluded_sections (List[str]): List of regular expressions
             representing pages that should not be considered part of
             the form
@@ -270,6 +272,13 @@ class FormMetadata(Metadata):
         fpns = [fp.page_number for fp in fps]
         return fpns
 
+    @property
+    def fields_by_page(self) -> Dict[int, List[FormField]]:
+        fbp = {pn: [] for pn in self.form_page_numbers}
+        for ff in self.form_fields:
+            fbp.setdefault(ff.page_number, []).append(ff)
+        return fbp
+
     def validate(self):
         super().validate()
 
@@ -349,6 +358,20 @@ class FormMetadata(Metadata):
         column = deepcopy(self.get_column(field_name))
         return FormField.from_dict(column)
 
+    def compile(self):
+        """Returns a read only snapshot of the form metadata
+
+        The snapshot has its form pages and fields built
+        once and indexed for repeated lookups. See
+        `CompiledFormMetadata`.
+
+        Returns:
+            (CompiledFormMetadata): CompiledFormMetadata object
+        """
+        from .compiled_form_meta import CompiledFormMetadata
+
+        return CompiledFormMetadata(self)
+
     def form_page(self, page_number: int) -> FormPage:
         """Returns the specified form page
 
@@ -2,6 +2,7 @@ import re
 import os
 import cv2
 import importlib
+import threading
 import numpy as np
 import pandas as pd
 import awswrangler as wr
@@ -10,16 +11,16 @@ from shutil import copy
 from pathlib import Path
 from logging import getLogger
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from arrow_pd_parser import writer
 from tempfile import NamedTemporaryFile
 from typing import Union, List, Dict, Tuple, Optional
 
 from ..form_meta import FormMetadata
-from ..utils.image_reader import ImageReader
-from .form_page_operator import FormPageOperator
+from .form_page_operator import AlignedPageImage, FormPageOperator
 from .operator_configs import FormOperatorConfig
 from .bounding_box_operator import BoundingBoxOperator
+from .template_features import TemplateFeatureStore
 
 logger = getLogger(__name__)
 
@@ -38,14 +39,72 @@ class FormOperator(BaseModel):
         form_page_operator (FormPageOperator): A
             `FormPageOperator` populated from the given
             `FormOperatorConfig` for processing individual
-            form pages
+            form pages, created once and reused
+        template_feature_store (TemplateFeatureStore): A
+            store of template page keypoints and descriptors
+            which are computed once and reused for every
+            alignment
     """
 
     config: FormOperatorConfig
+    _template_feature_store: TemplateFeatureStore = PrivateAttr(default=None)
+    _form_page_operator: FormPageOperator = PrivateAttr(default=None)
+    _page_operators: Dict[Tuple[str, bool], FormPageOperator] = PrivateAttr(
+        default_factory=dict
+    )
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def template_feature_store(self) -> TemplateFeatureStore:
+        if self._template_feature_store is None:
+            self._template_feature_store = TemplateFeatureStore(
+                cache_directory=self.config.template_features_directory
+            )
+        return self._template_feature_store
 
     @property
     def form_page_operator(self) -> FormPageOperator:
-        return FormPageOperator.create_from_config(self.config)
+        if self._form_page_operator is None:
+            with self._lock:
+                if self._form_page_operator is None:
+                    self._form_page_operator = FormPageOperator.create_from_config(
+                        self.config
+                    )
+        return self._form_page_operator
+
+    def page_operator_for(
+        self, form_template: str, fallback: Optional[bool] = False
+    ) -> Union[FormPageOperator, None]:
+        """Returns the `FormPageOperator` for a form template
+
+        Uses any config values given for the template in
+        the config's `templates`. Operators are created once
+        per template and reused.
+
+        Params:
+            form_template (str): Directory containing the
+                form template page images
+            fallback (Optional[bool]): Whether to return the
+                operator to align with when alignment fails
+
+        Returns:
+            (Union[FormPageOperator, None]): The operator, or
+                None if a fallback is asked for and the config
+                doesn't have one
+        """
+        key = (form_template, fallback)
+        if key not in self._page_operators:
+            with self._lock:
+                if key not in self._page_operators:
+                    config = self.config.for_template(form_template)
+                    if fallback:
+                        config = config.for_fallback()
+                    self._page_operators[key] = (
+                        None
+                        if config is None
+                        else FormPageOperator.create_from_config(config)
+                    )
+        return self._page_operators[key]
 
     @classmethod
     def create_from_config(
@@ -117,7 +176,18 @@ class FormOperator(BaseModel):
         `FormOperator.form_page_operator` to align the
         given set of images to the form template images
         found in the specified directory in the given
-        form metadata.
+        form metadata. If the config's alignment mode is
+        pyramid, alignments are refined around the form
+        fields on each page. Images that can't be aligned
+        are aligned again with the config's `fallback`
+        values, if it has any. If the config's extraction
+        mode is regions, images aren't warped onto the
+        template and `AlignedPageImage` objects are
+        returned instead, for `extract_fields` to warp
+        only the form fields from. If the config's
+        alignment `reuse` is set, each image is first
+        checked against the alignment of the last image
+        of the same size, which is used if it fits.
 
         Params:
             image_page_mapping (Dict[int, List[np.ndarray]]):
@@ -132,36 +202,69 @@ class FormOperator(BaseModel):
                 to continue
 
         Return:
-            Dict[int, List[np.ndarray]]:
+            Dict[int, List[Union[np.ndarray, AlignedPageImage]]]:
                 A dictionary where keys are page numbers and
                 values are lists of aligned form page images
         """
-        fp_op = self.form_page_operator
         form_meta_loc = form_meta.form_template
-        template_files = os.listdir(form_meta_loc)
-
-        aligned_image_mapping = {}
-        for pn, imgs in image_page_mapping.items():
-            tpt_file = [tpg for tpg in template_files if f"_{pn}" in tpg]
-
-            _, template_image = ImageReader.read(
-                os.path.join(form_meta_loc, tpt_file[0])
+        warp = self.config.extraction_mode == "page"
+        fp_op = self.page_operator_for(form_meta_loc)
+        fallback_op = self.page_operator_for(form_meta_loc, fallback=True)
+        feature_store = self.template_feature_store
+
+        def template_features_for(operator, pn):
+            return feature_store.get(
+                feature_store.template_page_path(form_meta_loc, pn),
+                detector=operator.detector,
+                detector_key=feature_store.detector_key(operator.config.detector),
             )
 
-            if len(template_image) != 1:
-                raise ValueError(
-                    "Template directory should contain\n"
-                    "a single image file for each page in\n"
-                    "the template."
-                )
+        # Homographies of the scan's last aligned page image by
+        # page image shape and template shape
+        seed_homographies = {}
 
-            aligned_images = [
-                fp_op.align_image_to_template(
+        def align(scanned_image, pn, regions):
+            page_template_features = template_features_for(fp_op, pn)
+            seed_key = (scanned_image.shape, page_template_features.shape[:2])
+            try:
+                aligned = fp_op.align_image_to_template(
                     page_image=scanned_image,
-                    page_template_image=template_image[0],
+                    page_template_features=page_template_features,
                     debug=debug,
+                    regions=regions,
+                    warp=False,
+                    seed_homography=(
+                        seed_homographies.get(seed_key)
+                        if fp_op.alignment.reuse
+                        else None
+                    ),
                 )
-                for scanned_image in imgs
+            except RuntimeError as e:
+                if fallback_op is None:
+                    raise
+                logger.debug(f"Aligning page {pn} with fallback config: {e}")
+                aligned = fallback_op.align_image_to_template(
+                    page_image=scanned_image,
+                    page_template_features=template_features_for(fallback_op, pn),
+                    debug=debug,
+                    regions=regions,
+                    warp=False,
+                )
+
+            seed_homographies[seed_key] = aligned.homography
+            return aligned.warp() if warp else aligned
+
+        fields_by_page = form_meta.fields_by_page
+        aligned_image_mapping = {}
+        for pn, imgs in image_page_mapping.items():
+            # Pyramid alignments are refined around the fields on the page
+            field_regions = [
+                field.bounding_box.to_tuple("ltrb")
+                for field in fields_by_page.get(pn, ())
+            ]
+
+            aligned_images = [
+                align(scanned_image, pn, field_regions) for scanned_image in imgs
             ]
 
             aligned_image_mapping[pn] = aligned_images
@@ -170,7 +273,7 @@ class FormOperator(BaseModel):
 
     def extract_fields(
         self,
-        image_page_mapping: Dict[str, List[np.ndarray]],
+        image_page_mapping: Dict[int, List[Union[np.ndarray, AlignedPageImage]]],
         form_meta: FormMetadata,
         as_bytes: Optional[bool] = False,
         encode_type: Optional[str] = ".jpg",
@@ -180,13 +283,13 @@ class FormOperator(BaseModel):
 
         Takes a form page to form images mapping dictionary
         and extracts fields from the images using the bounding
-        boxes given in the form metadata
+        boxes given in the form metadata. Fields are warped
+        on their own from `AlignedPageImage` images.
 
         Params:
-            image_page_mapping (Dict[int, List[np.ndarray]]):
+            image_page_mapping (Dict[int, List[Union[np.ndarray, AlignedPageImage]]]):
                 A dictionary where keys are page numbers and
-                values are lists of form page images which
-                have been identified as matching that page
+                values are lists of aligned form page images
             form_meta (FormMetadata): A `FormMetadata`
                 object for comparison
             as_bytes (Optional[bool]):
@@ -204,7 +307,7 @@ class FormOperator(BaseModel):
                 A dictionary where keys are field names and
                 values are image(s) corresponding to the form
                 field
-        """
+        """  # noqa: E501
         form_fields = form_meta.form_fields
         bb_op = BoundingBoxOperator()
 
@@ -217,7 +320,11 @@ class FormOperator(BaseModel):
             field_bb = field.bounding_box
 
             field_img = [
-                bb_op.crop_image_to_bb(img, bounding_box=field_bb)
+                (
+                    img.crop(*field_bb.to_tuple("ltwh"))
+                    if isinstance(img, AlignedPageImage)
+                    else bb_op.crop_image_to_bb(img, bounding_box=field_bb)
+                )
                 for img in aligned_images
             ]
 
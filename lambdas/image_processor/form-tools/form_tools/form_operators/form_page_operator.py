@@ -3,19 +3,154 @@ import re
 import cv2
 import yaml
 import importlib
+import threading
 import numpy as np
 
 from pathlib import Path
-from pydantic import BaseModel
+from logging import getLogger
+from weakref import WeakKeyDictionary
+from pydantic import BaseModel, PrivateAttr
 from typing import Union, List, Tuple, Optional
 
 from .operator_configs import (
+    AlignmentConfig,
     FormOperatorConfig,
     HomographyConfig,
 )
 from . import __name__ as module_name
 from ..form_meta.form_meta import FormPage
 from .preprocessors import convert_img_to_grayscale
+from .template_features import TemplateFeatures
+
+logger = getLogger(__name__)
+
+
+class AlignmentResult:
+    """The alignment of a form page image to a template
+
+    Attributes:
+        homography (np.ndarray): Homography matrix mapping
+            the full resolution page image onto the template
+        error (float): Root mean square reprojection error,
+            in template pixels, of the keypoint matches
+            consistent with the homography
+        matches (int): Number of keypoint matches used to
+            find the homography, or of image tiles used to
+            check a reused homography
+        inliers (int): Number of keypoint matches, or image
+            tiles, consistent with the homography
+        scale (float): Scale of the images the keypoints
+            were detected on
+        refined (bool): Whether a pyramid alignment was
+            refined at full resolution
+        page_keypoints (Tuple[cv2.KeyPoint, ...]): Keypoints
+            detected on the page image
+        template_keypoints (Tuple[cv2.KeyPoint, ...]):
+            Keypoints of the template page image
+        keypoint_matches (List[cv2.DMatch]): Keypoint matches
+            used to find the homography
+        reused (bool): Whether the homography was reused from
+            another page image's alignment
+    """
+
+    def __init__(
+        self,
+        homography: np.ndarray,
+        error: float,
+        matches: int,
+        inliers: int,
+        scale: float = 1.0,
+        refined: bool = False,
+        page_keypoints: Tuple[cv2.KeyPoint, ...] = (),
+        template_keypoints: Tuple[cv2.KeyPoint, ...] = (),
+        keypoint_matches: Optional[List[cv2.DMatch]] = None,
+        reused: bool = False,
+    ):
+        self.homography = homography
+        self.error = error
+        self.matches = matches
+        self.inliers = inliers
+        self.scale = scale
+        self.refined = refined
+        self.page_keypoints = page_keypoints
+        self.template_keypoints = template_keypoints
+        self.keypoint_matches = keypoint_matches if keypoint_matches else []
+        self.reused = reused
+
+    def __repr__(self):
+        return (
+            f"AlignmentResult(error={self.error:.2f}, matches={self.matches}, "
+            f"inliers={self.inliers}, scale={self.scale}, refined={self.refined}, "
+            f"reused={self.reused})"
+        )
+
+
+class AlignedPageImage:
+    """A form page image aligned to a template without being warped
+
+    Keeps the page image and the homography aligning it to the
+    template so that regions of the aligned image can be warped
+    on their own, rather than warping the whole page and then
+    cropping it.
+
+    Attributes:
+        page_image (np.ndarray): The unaligned form page image
+        homography (np.ndarray): Homography matrix mapping the
+            page image onto the template
+        shape (Tuple[int, ...]): Shape of the aligned image,
+            i.e. the template's height and width and the page
+            image's channels
+    """
+
+    def __init__(
+        self,
+        page_image: np.ndarray,
+        homography: np.ndarray,
+        template_shape: Tuple[int, ...],
+    ):
+        self.page_image = page_image
+        self.homography = homography
+        self.shape = tuple(template_shape[:2]) + page_image.shape[2:]
+
+    def __repr__(self):
+        return f"AlignedPageImage(shape={self.shape})"
+
+    def crop(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """Warps a region of the aligned image
+
+        Gives the same image as cropping the whole aligned
+        image to the region, clipping it to the template.
+
+        Params:
+            left (int): Left of the region in template pixels
+            top (int): Top of the region in template pixels
+            width (int): Width of the region
+            height (int): Height of the region
+
+        Returns:
+            (np.ndarray): The aligned image region
+        """
+        h, w = self.shape[:2]
+        left, top = min(max(left, 0), w), min(max(top, 0), h)
+        width = max(min(left + width, w) - left, 0)
+        height = max(min(top + height, h) - top, 0)
+        if width == 0 or height == 0:
+            return np.zeros((height, width) + self.shape[2:], self.page_image.dtype)
+
+        # Translate the region to the origin after warping
+        translation = np.array([[1, 0, -left], [0, 1, -top], [0, 0, 1]], dtype=float)
+        return cv2.warpPerspective(
+            self.page_image, translation @ self.homography, (width, height)
+        )
+
+    def warp(self) -> np.ndarray:
+        """Warps the whole page image onto the template
+
+        Returns:
+            (np.ndarray): The aligned form page image
+        """
+        h, w = self.shape[:2]
+        return cv2.warpPerspective(self.page_image, self.homography, (w, h))
 
 
 class FormPageOperator(BaseModel):
@@ -28,27 +163,69 @@ class FormPageOperator(BaseModel):
     Attributes:
         config (FormOperatorConfig): A form operator config
             for setting up image transformations
-        detector (Union[cv2.ORB, cv2.SIFT]): A opencv
-            detector object
-        matcher (cv2 Matcher): An opencv matcher object
+        detector (Union[cv2.ORB, cv2.SIFT, cv2.AKAZE]): A opencv
+            detector object, created once per thread
+        matcher (cv2 Matcher): An opencv matcher object,
+            created once per thread
         proportion (float): Proportion of keypoint matches
             to keep or to use in KNN ratio test
         minimum_matches (int): The minimum number of
             good keypoint matches to allow homography
             matrix to be computed
+        alignment (AlignmentConfig): How to align
+            form page images to templates
     """
 
     config: FormOperatorConfig
+    # opencv detectors and matchers aren't safe to share between threads
+    _local: threading.local = PrivateAttr(default_factory=threading.local)
+    _coarse_features: WeakKeyDictionary = PrivateAttr(default_factory=WeakKeyDictionary)
+    _coarse_images: WeakKeyDictionary = PrivateAttr(default_factory=WeakKeyDictionary)
+    _coarse_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
 
     @property
     def detector(self) -> Union[cv2.ORB, cv2.SIFT]:
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self.create_detector()
+            self._local.detector = detector
+        return detector
+
+    @property
+    def coarse_detector(self) -> Union[cv2.ORB, cv2.SIFT]:
+        detector = getattr(self._local, "coarse_detector", None)
+        if detector is None:
+            detector = self.create_detector(nfeatures=self.alignment.max_keypoints)
+            self._local.coarse_detector = detector
+        return detector
+
+    @property
+    def matcher(self):
+        matcher = getattr(self._local, "matcher", None)
+        if matcher is None:
+            matcher = self.create_matcher()
+            self._local.matcher = matcher
+        return matcher
+
+    def create_detector(
+        self, nfeatures: Optional[Union[int, None]] = None
+    ) -> Union[cv2.ORB, cv2.SIFT]:
+        """Creates a new opencv detector from the config
+
+        Params:
+            nfeatures (Optional[Union[int, None]]): The most
+                keypoints to detect, overriding the config
+        """
         detector_config = self.config.detector
 
         detector_name = detector_config.name
         detector_args = detector_config.args if detector_config.args is not None else []
         detector_kwargs = (
-            detector_config.kwargs if detector_config.kwargs is not None else {}
+            dict(detector_config.kwargs) if detector_config.kwargs is not None else {}
         )
+        # AKAZE has no limit on the number of keypoints
+        if nfeatures is not None and detector_name != "AKAZE":
+            detector_kwargs["nfeatures"] = nfeatures
 
         try:
             method_name = f"{detector_name}_create"
@@ -63,8 +240,8 @@ class FormPageOperator(BaseModel):
 
         return detector
 
-    @property
-    def matcher(self):
+    def create_matcher(self):
+        """Creates a new opencv matcher from the config"""
         matcher_config = self.config.matcher
 
         matcher_id = matcher_config.id
@@ -94,6 +271,37 @@ class FormPageOperator(BaseModel):
 
         return matcher
 
+    def template_matcher(self, page_template_features: TemplateFeatures):
+        """Returns a matcher trained on a template page's descriptors
+
+        The matcher is created and trained (e.g. the FLANN index
+        is built) the first time a template page is matched in
+        each thread and then reused for every image aligned to
+        that template page.
+
+        Params:
+            page_template_features (TemplateFeatures):
+                Precomputed keypoints and descriptors for the
+                form page template
+
+        Returns:
+            (cv2 Matcher): An opencv matcher object trained on
+                the template page descriptors
+        """
+        template_matchers = getattr(self._local, "template_matchers", None)
+        if template_matchers is None:
+            template_matchers = WeakKeyDictionary()
+            self._local.template_matchers = template_matchers
+
+        matcher = template_matchers.get(page_template_features)
+        if matcher is None:
+            matcher = self.create_matcher()
+            matcher.add([page_template_features.descriptors])
+            matcher.train()
+            template_matchers[page_template_features] = matcher
+
+        return matcher
+
     @property
     def knn(self) -> Union[int, None]:
         return self.config.knn
@@ -110,6 +318,14 @@ class FormPageOperator(BaseModel):
     def homography_options(self) -> Union[HomographyConfig, None]:
         return self.config.homography_options
 
+    @property
+    def alignment(self) -> AlignmentConfig:
+        return (
+            self.config.alignment
+            if self.config.alignment is not None
+            else AlignmentConfig()
+        )
+
     @classmethod
     def create_from_config(
         cls,
@@ -206,6 +422,7 @@ class FormPageOperator(BaseModel):
         self,
         page_image_descriptions: np.ndarray,
         page_template_image_descriptions: np.ndarray,
+        page_template_features: Optional[Union[TemplateFeatures, None]] = None,
     ) -> List[cv2.DMatch]:
         """Helper method that returns keypoint matches
 
@@ -219,20 +436,49 @@ class FormPageOperator(BaseModel):
                 keypoint descriptions for a form page image
             page_template_image_descriptions (np.ndarray):
                 keypoint descriptions for a form page template image
+            page_template_features (Optional[Union[TemplateFeatures, None]]):
+                Precomputed template features the descriptions
+                came from, if given the matcher trained on them
+                is reused
 
         Returns:
             (List[cv2.DMatch]): List of opencv match objects
         """
-        matcher = self.matcher
         k = self.knn
         p = self.proportion
 
+        if (
+            page_template_features is not None
+            and page_template_image_descriptions is not None
+        ):
+            matcher = self.template_matcher(page_template_features)
+
+            def knn_match(k):
+                return matcher.knnMatch(page_image_descriptions, k=k)
+
+            def match_all():
+                return matcher.match(page_image_descriptions)
+
+        else:
+            matcher = self.matcher
+
+            def knn_match(k):
+                return matcher.knnMatch(
+                    page_image_descriptions, page_template_image_descriptions, k=k
+                )
+
+            def match_all():
+                return matcher.match(
+                    page_image_descriptions, page_template_image_descriptions, None
+                )
+
         if k is not None and k > 1:
-            matches = matcher.knnMatch(
-                page_image_descriptions, page_template_image_descriptions, k=k
-            )
+            matches = knn_match(k)
             good = []
             for match in matches:
+                # LSH indexes can return fewer than k neighbours
+                if len(match) < 2:
+                    continue
                 m = match[0]
                 n = match[1]
                 if m.distance < p * n.distance:
@@ -242,16 +488,7 @@ class FormPageOperator(BaseModel):
 
         else:
             matches = (
-                matcher.match(
-                    page_image_descriptions, page_template_image_descriptions, None
-                )
-                if k is None or k < 1
-                else [
-                    m[0]
-                    for m in matcher.knnMatch(
-                        page_image_descriptions, page_template_image_descriptions, k
-                    )
-                ]
+                match_all() if k is None or k < 1 else [m[0] for m in knn_match(k) if m]
             )
 
             matches = sorted(matches, key=lambda x: x.distance)
@@ -266,7 +503,8 @@ class FormPageOperator(BaseModel):
         keypoint_matches: List[cv2.DMatch],
         page_image_keypoints: Tuple[cv2.KeyPoint, ...],
         page_template_image_keypoints: Tuple[cv2.KeyPoint, ...],
-    ) -> np.ndarray:
+        return_error: Optional[bool] = False,
+    ) -> Union[np.ndarray, Tuple[np.ndarray, float, int]]:
         """Helper method to find the homography matrix between two images
 
         Takes keypoints for a form page image and it's template, as well
@@ -281,9 +519,16 @@ class FormPageOperator(BaseModel):
                 keypoints for a form page image
             page_template_image_keypoints (np.ndarray):
                 keypoints for a form page template image
+            return_error (Optional[bool]): Whether to also
+                return the reprojection error and number of
+                inliers
 
         Returns:
-            (np.ndarray): A homography matrix
+            (Union[np.ndarray, Tuple[np.ndarray, float, int]]):
+                A homography matrix, along with the root mean
+                square reprojection error of the inlying
+                matches and the number of them if
+                `return_error` is set
         """
         src_pts = np.float32(
             [page_image_keypoints[m.queryIdx].pt for m in keypoint_matches]
@@ -305,9 +550,20 @@ class FormPageOperator(BaseModel):
         else:
             homography_kwargs = {"method": cv2.RANSAC}
 
-        H, _ = cv2.findHomography(src_pts, dst_pts, **homography_kwargs)
+        H, mask = cv2.findHomography(src_pts, dst_pts, **homography_kwargs)
+
+        if not return_error:
+            return H
+
+        if H is None:
+            return H, float("inf"), 0
 
-        return H
+        inliers = mask.ravel().astype(bool) if mask is not None else slice(None)
+        projected = cv2.perspectiveTransform(src_pts[inliers], H)
+        residuals = np.linalg.norm(projected - dst_pts[inliers], axis=2)
+        error = float(np.sqrt(np.mean(residuals**2))) if residuals.size else 0.0
+
+        return H, error, int(residuals.size)
 
     def _check_homography_singular(
         self,
@@ -400,14 +656,500 @@ class FormPageOperator(BaseModel):
             cv2.imshow("Image Alignment Overlay", output)
             cv2.waitKey(0)
 
+    def coarse_template_image(
+        self,
+        page_template_features: TemplateFeatures,
+        page_template_image: Optional[Union[np.ndarray, None]] = None,
+    ) -> np.ndarray:
+        """Returns the template page image scaled down by the alignment scale
+
+        Images are kept for as long as the full resolution
+        features they're for.
+
+        Params:
+            page_template_features (TemplateFeatures):
+                Full resolution features for the form page
+                template
+            page_template_image (Optional[Union[ndarray, None]]):
+                An opencv image of the form page template, read
+                from the template features path if not given
+
+        Returns:
+            (ndarray): The downscaled grayscale form page template
+        """
+        with self._coarse_lock:
+            template_image = self._coarse_images.get(page_template_features)
+            if template_image is None:
+                if page_template_image is None:
+                    page_template_image = page_template_features.image
+                scale = self.alignment.scale
+                template_image = cv2.resize(
+                    convert_img_to_grayscale(page_template_image),
+                    None,
+                    fx=scale,
+                    fy=scale,
+                    interpolation=cv2.INTER_AREA,
+                )
+                self._coarse_images[page_template_features] = template_image
+
+        return template_image
+
+    def coarse_template_features(
+        self,
+        page_template_features: TemplateFeatures,
+        page_template_image: Optional[Union[np.ndarray, None]] = None,
+    ) -> TemplateFeatures:
+        """Returns template features for pyramid alignment
+
+        Detects keypoints on the template page image scaled
+        down by the alignment scale. Features are kept for as
+        long as the full resolution features they're for.
+
+        Params:
+            page_template_features (TemplateFeatures):
+                Full resolution features for the form page
+                template
+            page_template_image (Optional[Union[ndarray, None]]):
+                An opencv image of the form page template, read
+                from the template features path if not given
+
+        Returns:
+            (TemplateFeatures): Features for the downscaled
+                form page template
+        """
+        template_image = self.coarse_template_image(
+            page_template_features, page_template_image
+        )
+        with self._coarse_lock:
+            features = self._coarse_features.get(page_template_features)
+            if features is None:
+                keypoints, descriptors = self.coarse_detector.detectAndCompute(
+                    template_image, None
+                )
+                features = TemplateFeatures(
+                    path=page_template_features.path,
+                    shape=template_image.shape,
+                    keypoints=keypoints,
+                    descriptors=descriptors,
+                )
+                self._coarse_features[page_template_features] = features
+
+        return features
+
+    def _alignment_from_keypoints(
+        self,
+        page_image_keypoints: Tuple[cv2.KeyPoint, ...],
+        page_image_descriptions: np.ndarray,
+        page_template_features: TemplateFeatures,
+        scale: Optional[float] = 1.0,
+        refined: Optional[bool] = False,
+    ) -> AlignmentResult:
+        """Helper method that aligns matched keypoints
+
+        Matches page image keypoints to template keypoints
+        detected at the same scale and finds the homography
+        between them, in full resolution coordinates.
+
+        Raises:
+            RuntimeError: If there aren't enough keypoint
+                matches or the homography is degenerate
+        """
+        good = self._return_matches(
+            page_image_descriptions,
+            page_template_features.descriptors,
+            page_template_features,
+        )
+
+        if len(good) <= self.minimum_matches:
+            raise RuntimeError(
+                "There were not enough keypoints matched\n"
+                "between the image and the template."
+            )
+
+        H, error, inliers = self._find_homography(
+            good,
+            page_image_keypoints,
+            page_template_features.keypoints,
+            return_error=True,
+        )
+
+        if H is None or self._check_homography_singular(H):
+            raise RuntimeError("Failed to generate a valid homography matrix")
+
+        minimum_inlier_ratio = (
+            None
+            if self.homography_options is None
+            else self.homography_options.minimum_inlier_ratio
+        )
+        if minimum_inlier_ratio is not None and inliers < minimum_inlier_ratio * len(
+            good
+        ):
+            raise RuntimeError(
+                "Too few keypoint matches agree with the homography matrix\n"
+                f"({inliers} of {len(good)})."
+            )
+
+        if scale != 1:
+            # Homography between the downscaled images to full resolution
+            S = np.diag([scale, scale, 1.0])
+            H = np.linalg.inv(S) @ H @ S
+            error = error / scale
+
+        return AlignmentResult(
+            homography=H,
+            error=error,
+            matches=len(good),
+            inliers=inliers,
+            scale=scale,
+            refined=refined,
+            page_keypoints=page_image_keypoints,
+            template_keypoints=page_template_features.keypoints,
+            keypoint_matches=good,
+        )
+
+    @staticmethod
+    def _merge_regions(
+        regions: List[Tuple[int, int, int, int]],
+    ) -> List[Tuple[int, int, int, int]]:
+        """Helper method that merges overlapping (left, top, right, bottom) regions"""
+        merged = []
+        for region in sorted(regions):
+            left, top, right, bottom = region
+            overlapping = True
+            while overlapping:
+                overlapping = False
+                for other in merged:
+                    if (
+                        left <= other[2]
+                        and other[0] <= right
+                        and top <= other[3]
+                        and other[1] <= bottom
+                    ):
+                        merged.remove(other)
+                        left, top = min(left, other[0]), min(top, other[1])
+                        right, bottom = max(right, other[2]), max(bottom, other[3])
+                        overlapping = True
+                        break
+            merged.append((left, top, right, bottom))
+        return merged
+
+    def _refine_alignment(
+        self,
+        page_image: np.ndarray,
+        coarse_alignment: AlignmentResult,
+        page_template_features: TemplateFeatures,
+        regions: List[Tuple[int, int, int, int]],
+    ) -> AlignmentResult:
+        """Helper method that refines an alignment around form fields
+
+        Detects keypoints at full resolution only in the parts
+        of the page image that the coarse alignment maps onto
+        the given template regions, and aligns using those.
+        """
+        margin = self.alignment.refine_margin
+        inverse = np.linalg.inv(coarse_alignment.homography)
+        height, width = page_image.shape[:2]
+
+        expanded = [
+            (left - margin, top - margin, right + margin, bottom + margin)
+            for left, top, right, bottom in regions
+        ]
+
+        keypoints = []
+        descriptions = []
+        for left, top, right, bottom in self._merge_regions(expanded):
+            corners = np.float32(
+                [[left, top], [right, top], [right, bottom], [left, bottom]]
+            ).reshape(-1, 1, 2)
+            page_corners = cv2.perspectiveTransform(corners, inverse).reshape(-1, 2)
+            x0, y0 = np.maximum(np.floor(page_corners.min(axis=0)), 0).astype(int)
+            x1, y1 = np.ceil(page_corners.max(axis=0)).astype(int)
+            x1, y1 = min(x1, width), min(y1, height)
+            if x1 <= x0 or y1 <= y0:
+                continue
+
+            region_keypoints, region_descriptions = self.detector.detectAndCompute(
+                page_image[y0:y1, x0:x1], None
+            )
+            if region_descriptions is None:
+                continue
+
+            keypoints.extend(
+                cv2.KeyPoint(
+                    kp.pt[0] + x0,
+                    kp.pt[1] + y0,
+                    kp.size,
+                    kp.angle,
+                    kp.response,
+                    kp.octave,
+                    kp.class_id,
+                )
+                for kp in region_keypoints
+            )
+            descriptions.append(region_descriptions)
+
+        if not descriptions:
+            raise RuntimeError("No keypoints found around the form fields.")
+
+        return self._alignment_from_keypoints(
+            tuple(keypoints),
+            np.vstack(descriptions),
+            page_template_features,
+            refined=True,
+        )
+
+    def _correct_homography(
+        self,
+        coarse_page_image: np.ndarray,
+        homography: np.ndarray,
+        coarse_template_image: np.ndarray,
+        grid: int,
+    ) -> Tuple[np.ndarray, float, int, int]:
+        """Helper method that corrects a homography using image tiles
+
+        Warps the downscaled page image with the homography,
+        measures how far each tile of it is shifted from the
+        template by phase correlation and fits a similarity
+        transform to the shifts.
+
+        Raises:
+            RuntimeError: If too few tiles agree on a correction
+        """
+        alignment = self.alignment
+        scale = alignment.scale
+        S = np.diag([scale, scale, 1.0])
+        h, w = coarse_template_image.shape[:2]
+        warped = cv2.warpPerspective(
+            coarse_page_image,
+            S @ homography @ np.linalg.inv(S),
+            (w, h),
+            borderValue=255,
+        )
+
+        shifted_centres, centres = [], []
+        for row in range(grid):
+            for col in range(grid):
+                top, bottom = row * h // grid, (row + 1) * h // grid
+                left, right = col * w // grid, (col + 1) * w // grid
+                (dx, dy), response = cv2.phaseCorrelate(
+                    np.float32(coarse_template_image[top:bottom, left:right]),
+                    np.float32(warped[top:bottom, left:right]),
+                    cv2.createHanningWindow((right - left, bottom - top), cv2.CV_32F),
+                )
+                if response >= alignment.reuse_min_response:
+                    centre = np.array([(left + right) / 2, (top + bottom) / 2])
+                    shifted_centres.append((centre + (dx, dy)) / scale)
+                    centres.append(centre / scale)
+
+        minimum_tiles = max(4, grid * grid // 2)
+        if len(centres) < minimum_tiles:
+            raise RuntimeError("Too few image tiles match the template.")
+
+        shifted_centres = np.float32(shifted_centres)
+        centres = np.float32(centres)
+        A, inliers = cv2.estimateAffinePartial2D(
+            shifted_centres,
+            centres,
+            method=cv2.RANSAC,
+            ransacReprojThreshold=2 * alignment.max_error,
+        )
+        if A is None or inliers.sum() < minimum_tiles:
+            raise RuntimeError("Too few image tiles agree on the alignment.")
+
+        inliers = inliers.ravel().astype(bool)
+        projected = shifted_centres[inliers] @ A[:, :2].T + A[:, 2]
+        error = float(
+            np.sqrt(np.mean(np.sum((projected - centres[inliers]) ** 2, axis=1)))
+        )
+        homography = np.vstack([A, [0, 0, 1]]) @ homography
+        return homography, error, len(centres), int(inliers.sum())
+
+    def reuse_alignment(
+        self,
+        page_image: np.ndarray,
+        homography: np.ndarray,
+        page_template_features: TemplateFeatures,
+        page_template_image: Optional[Union[np.ndarray, None]] = None,
+        grid: Optional[int] = 3,
+    ) -> AlignmentResult:
+        """Checks whether another alignment fits a form page image
+
+        Pages scanned together tend to be skewed and scaled
+        alike, so the alignment of one page is often close to
+        the next. The page image is warped with the given
+        homography at the alignment scale and split into a
+        grid of tiles, each of which is compared with the
+        template by phase correlation. Small differences in
+        position, rotation and scale are corrected, then
+        checked again, and the alignment is only used if the
+        tiles then agree to within the configured `max_error`.
+
+        Params:
+            page_image (ndarray): An opencv image
+                of the form page
+            homography (ndarray): Homography matrix aligning
+                another page image to its template
+            page_template_features (TemplateFeatures):
+                Keypoints and descriptors for the form page
+                template
+            page_template_image (Optional[Union[ndarray, None]]):
+                An opencv image of the form page template, read
+                from the template features path if not given
+            grid (Optional[int]): The number of rows and
+                columns of tiles to compare
+
+        Returns:
+            (AlignmentResult): The corrected homography and
+                alignment error
+
+        Raises:
+            RuntimeError: If the alignment doesn't fit the page
+        """
+        scale = self.alignment.scale
+        coarse_template_image = self.coarse_template_image(
+            page_template_features, page_template_image
+        )
+        coarse_page_image = cv2.resize(
+            convert_img_to_grayscale(page_image),
+            None,
+            fx=scale,
+            fy=scale,
+            interpolation=cv2.INTER_AREA,
+        )
+
+        # The first pass corrects the homography and the second checks it
+        for _ in range(2):
+            homography, error, tiles, inliers = self._correct_homography(
+                coarse_page_image, homography, coarse_template_image, grid
+            )
+
+        if error > self.alignment.max_error or self._check_homography_singular(
+            homography
+        ):
+            raise RuntimeError(
+                f"Reused alignment doesn't fit the page (error {error:.2f})."
+            )
+
+        return AlignmentResult(
+            homography=homography,
+            error=error,
+            matches=tiles,
+            inliers=inliers,
+            scale=scale,
+            reused=True,
+        )
+
+    def find_alignment(
+        self,
+        page_image: np.ndarray,
+        page_template_features: TemplateFeatures,
+        regions: Optional[Union[List[Tuple[int, int, int, int]], None]] = None,
+        page_template_image: Optional[Union[np.ndarray, None]] = None,
+        seed_homography: Optional[Union[np.ndarray, None]] = None,
+    ) -> AlignmentResult:
+        """Finds the alignment of a form page image to a template
+
+        In full alignment mode keypoints are detected on the
+        whole page image at full resolution. In pyramid mode
+        the alignment is estimated from downscaled images, then
+        refined at full resolution around the given template
+        regions (e.g. the form fields on the page) if its error
+        is above the configured `max_error`. Pyramid alignments
+        fall back to full alignment if they fail. If a seed
+        homography is given, it's reused if it fits the page
+        image (see `reuse_alignment`) without detecting any
+        keypoints.
+
+        Params:
+            page_image (ndarray): An opencv image
+                of the form page
+            page_template_features (TemplateFeatures):
+                Keypoints and descriptors for the form page
+                template
+            regions (Optional[Union[List[Tuple[int, int, int, int]], None]]):
+                (left, top, right, bottom) regions of the
+                template to refine pyramid alignments in
+            page_template_image (Optional[Union[ndarray, None]]):
+                An opencv image of the form page template, used
+                instead of reading it from disk for pyramid
+                alignment
+            seed_homography (Optional[Union[ndarray, None]]):
+                Homography matrix aligning another page image,
+                e.g. the previous page of the same scan, to try
+                first
+
+        Returns:
+            (AlignmentResult): The homography and alignment error
+
+        Raises:
+            RuntimeError: If the page image can't be aligned
+        """
+        alignment = self.alignment
+
+        if seed_homography is not None:
+            try:
+                return self.reuse_alignment(
+                    page_image,
+                    seed_homography,
+                    page_template_features,
+                    page_template_image,
+                )
+            except RuntimeError as e:
+                logger.debug(f"Unable to reuse alignment: {e}")
+
+        if alignment.mode == "pyramid":
+            coarse_template_features = self.coarse_template_features(
+                page_template_features, page_template_image
+            )
+            coarse_page_image = cv2.resize(
+                page_image,
+                None,
+                fx=alignment.scale,
+                fy=alignment.scale,
+                interpolation=cv2.INTER_AREA,
+            )
+            kps_img, descs_img = self.coarse_detector.detectAndCompute(
+                coarse_page_image, None
+            )
+            try:
+                coarse = self._alignment_from_keypoints(
+                    kps_img, descs_img, coarse_template_features, scale=alignment.scale
+                )
+            except RuntimeError as e:
+                logger.debug(f"Pyramid alignment failed, using full alignment: {e}")
+            else:
+                if not alignment.refine or not regions:
+                    return coarse
+                if coarse.error <= alignment.max_error:
+                    return coarse
+
+                try:
+                    refined = self._refine_alignment(
+                        page_image, coarse, page_template_features, regions
+                    )
+                except RuntimeError as e:
+                    logger.debug(f"Unable to refine pyramid alignment: {e}")
+                    return coarse
+
+                return refined if refined.error < coarse.error else coarse
+
+        kps_img, descs_img = self.detector.detectAndCompute(page_image, None)
+        return self._alignment_from_keypoints(
+            kps_img, descs_img, page_template_features
+        )
+
     def align_image_to_template(
         self,
         page_image: np.ndarray,
-        page_template_image: np.ndarray,
+        page_template_image: Optional[Union[np.ndarray, None]] = None,
         form_page: Optional[Union[FormPage, None]] = None,
         page_image_str: Optional[Union[str, None]] = None,
         debug: Optional[bool] = False,
-    ) -> np.ndarray:
+        page_template_features: Optional[Union[TemplateFeatures, None]] = None,
+        regions: Optional[Union[List[Tuple[int, int, int, int]], None]] = None,
+        warp: Optional[bool] = True,
+        seed_homography: Optional[Union[np.ndarray, None]] = None,
+    ) -> Union[np.ndarray, AlignedPageImage]:
         """Alignes a form page image to a template image
 
         Takes a form page image along with it's OCR text and
@@ -418,8 +1160,9 @@ class FormPageOperator(BaseModel):
 
             page_image (ndarray): An opencv image
                 of the form page
-            page_template_image (ndarray): An opencv image
-                of the form page template
+            page_template_image (Optional[Union[ndarray, None]]): An
+                opencv image of the form page template. Only required
+                if `page_template_features` isn't given
             form_page (Optional[Union[FormPage, None]]):
                 A `FormPage` object representing
                 the metadata for a form page
@@ -427,9 +1170,23 @@ class FormPageOperator(BaseModel):
                 of an image provided by an OCR engine
             debug (Optional[bool]): Whether to show aligned
                 images as the method is run
+            page_template_features (Optional[Union[TemplateFeatures, None]]):
+                Precomputed keypoints and descriptors for the form page
+                template, used instead of detecting them on
+                `page_template_image`
+            regions (Optional[Union[List[Tuple[int, int, int, int]], None]]):
+                (left, top, right, bottom) regions of the template
+                to refine pyramid alignments in, see `find_alignment`
+            warp (Optional[bool]): Whether to warp the whole
+                page image, or to return an `AlignedPageImage`
+                that regions can be warped from on their own
+            seed_homography (Optional[Union[ndarray, None]]):
+                Homography matrix aligning another page image
+                to try first, see `find_alignment`
 
         Returns:
-            (ndarray): The aligned form page image
+            (Union[ndarray, AlignedPageImage]): The aligned
+                form page image
         """
         if form_page is not None and page_image_str is not None:
             if not self.check_image_text_against_form_page(form_page, page_image_str):
@@ -438,34 +1195,52 @@ class FormPageOperator(BaseModel):
                     "doesn't correspond to expected template"
                 )
 
-        page_template_image = convert_img_to_grayscale(page_template_image)
-
-        detector = self.detector
-        kps_img, descs_img = detector.detectAndCompute(page_image, None)
-        kps_tmpt, descs_tmpt = detector.detectAndCompute(page_template_image, None)
-
-        good = self._return_matches(descs_img, descs_tmpt)
-
-        if len(good) > self.minimum_matches:
-            H = self._find_homography(good, kps_img, kps_tmpt)
-            singular = self._check_homography_singular(H)
-
-            if singular:
-                raise RuntimeError("Failed to generate a valid homography matrix")
-
-            h, w = page_template_image.shape[:2]
-
-            aligned = cv2.warpPerspective(page_image, H, (w, h))
-
-            if debug:
-                self._show_debug_images(
-                    page_image, kps_img, page_template_image, kps_tmpt, good, aligned
+        if page_template_features is None:
+            if page_template_image is None:
+                raise ValueError(
+                    "Either a page template image or\n"
+                    "page template features must be given."
                 )
+            page_template_image = convert_img_to_grayscale(page_template_image)
+            kps_tmpt, descs_tmpt = self.detector.detectAndCompute(
+                page_template_image, None
+            )
+            page_template_features = TemplateFeatures(
+                path=None,
+                shape=page_template_image.shape,
+                keypoints=kps_tmpt,
+                descriptors=descs_tmpt,
+            )
+        elif page_template_image is not None:
+            page_template_image = convert_img_to_grayscale(page_template_image)
 
-            return aligned
+        result = self.find_alignment(
+            page_image,
+            page_template_features,
+            regions=regions,
+            page_template_image=page_template_image,
+            seed_homography=seed_homography,
+        )
+        logger.debug(f"Aligned image to template: {result}")
 
-        else:
-            raise RuntimeError(
-                "There were not enough keypoints matched\n"
-                "between the image and the template."
+        aligned = AlignedPageImage(
+            page_image, result.homography, page_template_features.shape
+        )
+        if warp:
+            aligned = aligned.warp()
+
+        if debug:
+            if page_template_image is None:
+                page_template_image = page_template_features.image
+            # Keypoints from downscaled images can't be drawn on the originals
+            full_scale = result.scale == 1
+            self._show_debug_images(
+                page_image,
+                result.page_keypoints if full_scale else (),
+                page_template_image,
+                result.template_keypoints if full_scale else (),
+                result.keypoint_matches if full_scale else [],
+                aligned if warp else aligned.warp(),
             )
+
+        return aligned
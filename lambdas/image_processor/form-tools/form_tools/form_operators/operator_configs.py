@@ -1,6 +1,7 @@
+import os
 import cv2
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, root_validator, validator
 from typing import Dict, List, Optional, Any, Union
 
 
@@ -9,7 +10,7 @@ class DetectorConfig(BaseModel):
 
     Attributes:
         name (str): Name of the detector,
-            either SIFT or ORB
+            either SIFT, ORB or AKAZE
         args (Optional[List[Any]]):
             Agruments to pass to the
             opencv detector at creation
@@ -24,9 +25,9 @@ class DetectorConfig(BaseModel):
 
     @validator("name", allow_reuse=True)
     def _validate_name(cls, v):
-        assert v in ["SIFT", "ORB"], (
+        assert v in ["SIFT", "ORB", "AKAZE"], (
             "Detector config must include a name key\n"
-            "with either SIFT or ORB specified."
+            "with either SIFT, ORB or AKAZE specified."
         )
         return v
 
@@ -73,11 +74,105 @@ class HomographyConfig(BaseModel):
             homography matrix is degenerate - the threshold
             is compared against the absolute value of the
             determinant of the matrix
+        minimum_inlier_ratio (Optional[Union[float, None]]):
+            The smallest proportion of keypoint matches that
+            must agree with a homography matrix for it to be
+            used
     """
 
     method: Optional[int] = cv2.RANSAC
     threshold: Optional[Union[float, None]] = None
     singular_matrix_threshold: Optional[Union[float, None]] = None
+    minimum_inlier_ratio: Optional[Union[float, None]] = None
+
+
+class AlignmentConfig(BaseModel):
+    """Config for aligning form page images to templates
+
+    Attributes:
+        mode (str): Either full, to match keypoints
+            detected on the whole image at full resolution,
+            or pyramid, to estimate the alignment from a
+            downscaled image first
+        scale (float): How much to scale images down by
+            in pyramid mode
+        max_keypoints (Optional[Union[int, None]]):
+            The most keypoints to detect on downscaled
+            images in pyramid mode
+        refine (bool): Whether to refine pyramid
+            alignments at full resolution around the form
+            fields
+        max_error (float): The alignment error, in
+            template pixels, a pyramid alignment can have
+            without being refined
+        refine_margin (int): Margin in template pixels
+            around each form field to detect keypoints in
+            when refining
+        reuse (bool): Whether to try the alignment of the
+            previous page image of a scan with the same size
+            first, only detecting keypoints if it doesn't fit
+        reuse_min_response (float): The smallest phase
+            correlation response for an image tile to be used
+            to check a reused alignment
+    """
+
+    mode: Optional[str] = "full"
+    scale: Optional[float] = 0.25
+    max_keypoints: Optional[Union[int, None]] = 2000
+    refine: Optional[bool] = True
+    max_error: Optional[float] = 1.5
+    refine_margin: Optional[int] = 50
+    reuse: Optional[bool] = False
+    reuse_min_response: Optional[float] = 0.3
+
+    @validator("mode", allow_reuse=True)
+    def _validate_mode(cls, v):
+        assert v in ["full", "pyramid"], "Alignment mode must be full or pyramid."
+        return v
+
+    @validator("scale", allow_reuse=True)
+    def _validate_scale(cls, v):
+        assert 0 < v <= 1, "Alignment scale must be greater than 0 and at most 1."
+        return v
+
+
+# Named sets of config values that can be selected with `profile`.
+# The fast profile matches binary ORB descriptors with an LSH index,
+# falling back to SIFT for scans it can't align.
+ALIGNMENT_PROFILES = {
+    "fast": {
+        "detector": {
+            "name": "ORB",
+            "kwargs": {"nfeatures": 5000, "fastThreshold": 10},
+        },
+        "matcher": {
+            "id": "FLANN",
+            "args": [
+                {
+                    "algorithm": 6,
+                    "table_number": 6,
+                    "key_size": 12,
+                    "multi_probe_level": 1,
+                },
+                {"checks": 50},
+            ],
+        },
+        "knn": 2,
+        "proportion": 0.75,
+        "minimum_matches": 25,
+        "homography_options": {"threshold": 5.0, "minimum_inlier_ratio": 0.3},
+        "fallback": {
+            "detector": {"name": "SIFT"},
+            "matcher": {
+                "id": "FLANN",
+                "args": [{"algorithm": 1, "trees": 5}, {"checks": 50}],
+            },
+            "proportion": 0.7,
+            "minimum_matches": 10,
+            "homography_options": None,
+        },
+    },
+}
 
 
 class FormOperatorConfig(BaseModel):
@@ -102,6 +197,28 @@ class FormOperatorConfig(BaseModel):
             test
         knn (int): The number of nearest neighbours to
             return as part of a KNN match procedure
+        template_features_directory (Optional[str]):
+            A directory to load precomputed template
+            keypoints and descriptors from
+        alignment (Optional[AlignmentConfig]):
+            An `AlignmentConfig` object for deciding
+            how to align form page images, aligning at
+            full resolution if not given
+        profile (Optional[str]): The name of a set of
+            config values in `ALIGNMENT_PROFILES` to use
+            for any values not given
+        fallback (Optional[Dict[str, Any]]): Config
+            values to align with instead when a form
+            page image can't be aligned, e.g. because
+            fewer than `minimum_matches` keypoints matched
+        templates (Optional[Dict[str, Dict[str, Any]]]):
+            Config values to use for particular form
+            templates, keyed by the name of the form
+            template image directory
+        extraction_mode (Optional[str]): Either page, to
+            warp whole form page images onto the template
+            when aligning them, or regions, to warp only
+            the form fields when they're extracted
     """
 
     detector: DetectorConfig
@@ -110,3 +227,81 @@ class FormOperatorConfig(BaseModel):
     homography_options: Optional[Union[HomographyConfig, None]] = None
     proportion: Optional[float] = 1.0
     knn: Optional[int] = 2
+    template_features_directory: Optional[Union[str, None]] = None
+    alignment: Optional[Union[AlignmentConfig, None]] = None
+    profile: Optional[Union[str, None]] = None
+    fallback: Optional[Union[Dict[str, Any], None]] = None
+    templates: Optional[Union[Dict[str, Dict[str, Any]], None]] = None
+    extraction_mode: Optional[str] = "page"
+
+    @validator("extraction_mode", allow_reuse=True)
+    def _validate_extraction_mode(cls, v):
+        assert v in ["page", "regions"], "Extraction mode must be page or regions."
+        return v
+
+    @root_validator(pre=True, allow_reuse=True)
+    def _apply_profile(cls, values):
+        profile = values.get("profile")
+        if profile is None:
+            return values
+        assert profile in ALIGNMENT_PROFILES, (
+            "Config profile must be one of\n" f"{', '.join(ALIGNMENT_PROFILES)}"
+        )
+        return {**ALIGNMENT_PROFILES[profile], **values}
+
+    @root_validator(skip_on_failure=True, allow_reuse=True)
+    def _validate_overrides(cls, values):
+        # Overrides are only merged when they're used, so check them now
+        base = {k: v for k, v in values.items() if k not in ["profile", "templates"]}
+        overrides = list((values.get("templates") or {}).values())
+        if values.get("fallback") is not None:
+            overrides.append({**values["fallback"], "fallback": None})
+        for override in overrides:
+            profile = ALIGNMENT_PROFILES.get(override.get("profile"), {})
+            cls(**{**base, **profile, **override})
+        return values
+
+    def merge(self, overrides: Dict[str, Any]) -> "FormOperatorConfig":
+        """Returns the config with some values replaced
+
+        If the overrides name a `profile`, its values replace
+        those in the config before the other overrides do.
+
+        Params:
+            overrides (Dict[str, Any]): Config values
+                to replace
+
+        Returns:
+            (FormOperatorConfig): A new config
+        """
+        config = self.dict(exclude={"profile", "templates"})
+        config.update(ALIGNMENT_PROFILES.get(overrides.get("profile"), {}))
+        config.update(overrides)
+        return FormOperatorConfig(**config)
+
+    def for_template(self, form_template: str) -> "FormOperatorConfig":
+        """Returns the config to align pages of a form template with
+
+        Params:
+            form_template (str): Directory containing the
+                form template page images
+
+        Returns:
+            (FormOperatorConfig): The config with any values
+                given for the template in `templates` replaced
+        """
+        template_name = os.path.basename(os.path.normpath(form_template))
+        overrides = (self.templates or {}).get(template_name)
+        return self if overrides is None else self.merge(overrides)
+
+    def for_fallback(self) -> Union["FormOperatorConfig", None]:
+        """Returns the config to align with when alignment fails
+
+        Returns:
+            (Union[FormOperatorConfig, None]): The config with
+                the `fallback` values replaced, or None if there
+                is no fallback
+        """
+        if self.fallback is None:
+            return None
+        return self.merge({**self.fallback, "fallback": None})
@@ -0,0 +1,293 @@
+import os
+import cv2
+import json
+import hashlib
+import threading
+import numpy as np
+
+from pathlib import Path
+from logging import getLogger
+from typing import Dict, Optional, Tuple, Union
+
+from ..utils.image_reader import ImageReader
+from .operator_configs import DetectorConfig
+from .preprocessors import convert_img_to_grayscale
+
+logger = getLogger(__name__)
+
+
+class TemplateFeatures:
+    """Keypoints and descriptors for a form page template image
+
+    Holds the detector output for a single template page so
+    that it only has to be computed once. The template image
+    itself is only read back from disk if it's asked for
+    (e.g. for debug output).
+
+    Attributes:
+        path (str): Local path to the template page image
+        shape (Tuple[int, ...]): Shape of the grayscale
+            template page image
+        keypoints (Tuple[cv2.KeyPoint, ...]): Keypoints
+            detected on the template page image
+        descriptors (np.ndarray): Descriptors for the
+            template page keypoints
+    """
+
+    def __init__(
+        self,
+        path: str,
+        shape: Tuple[int, ...],
+        keypoints: Tuple[cv2.KeyPoint, ...],
+        descriptors: np.ndarray,
+    ):
+        self.path = path
+        self.shape = tuple(shape)
+        self.keypoints = keypoints
+        self.descriptors = descriptors
+
+    @property
+    def image(self) -> np.ndarray:
+        _, template_image = ImageReader.read(self.path)
+        return convert_img_to_grayscale(template_image[0])
+
+
+class TemplateFeatureStore:
+    """Process level store of template page features
+
+    Computes keypoints and descriptors for form template
+    pages the first time they are requested and keeps them
+    for the life of the store. If a `cache_directory` is
+    given, features are also loaded from (and, where the
+    directory is writeable, saved to) `.npz` files in that
+    directory so they can be built ahead of time.
+
+    Attributes:
+        cache_directory (Optional[str]): Local directory
+            containing serialised template features
+    """
+
+    def __init__(self, cache_directory: Optional[str] = None):
+        self.cache_directory = cache_directory
+        self._features: Dict[Tuple[str, str], TemplateFeatures] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._features)
+
+    @staticmethod
+    def detector_key(detector_config: DetectorConfig) -> str:
+        """Returns a short key identifying a detector config
+
+        Features computed by different detectors (or the same
+        detector with different arguments) are not
+        interchangeable, so they are stored separately.
+
+        Params:
+            detector_config (DetectorConfig): The detector
+                config used to compute the features
+
+        Returns:
+            (str): A hash of the detector config
+        """
+        config_str = json.dumps(detector_config.dict(), sort_keys=True, default=str)
+        return hashlib.sha1(config_str.encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def template_page_path(form_template: str, page_number: int) -> str:
+        """Returns the template image path for a page number
+
+        Params:
+            form_template (str): Directory containing the
+                form template page images
+            page_number (int): The template page number
+
+        Returns:
+            (str): Local path to the template page image
+        """
+        template_files = os.listdir(form_template)
+        tpt_file = [tpg for tpg in template_files if f"_{page_number}" in tpg]
+        return os.path.join(form_template, tpt_file[0])
+
+    def get(
+        self,
+        template_path: str,
+        detector: Union[cv2.ORB, cv2.SIFT],
+        detector_key: str,
+    ) -> TemplateFeatures:
+        """Returns features for a template page image
+
+        Returns cached features if they exist, otherwise loads
+        them from the cache directory or computes them with the
+        given detector.
+
+        Params:
+            template_path (str): Local path to the template
+                page image
+            detector (Union[cv2.ORB, cv2.SIFT]): An opencv
+                detector used if the features need computing
+            detector_key (str): Key for the detector config,
+                see `TemplateFeatureStore.detector_key`
+
+        Returns:
+            (TemplateFeatures): Features for the template page
+        """
+        key = (os.path.normpath(template_path), detector_key)
+
+        features = self._features.get(key)
+        if features is not None:
+            return features
+
+        with self._lock:
+            features = self._features.get(key)
+            if features is None:
+                features = self._load(template_path, detector_key)
+                if features is None:
+                    features = self._compute(template_path, detector)
+                    self._save(features, detector_key)
+                self._features[key] = features
+
+        return features
+
+    def clear(self):
+        """Removes all features held in memory"""
+        with self._lock:
+            self._features = {}
+
+    @staticmethod
+    def _compute(
+        template_path: str, detector: Union[cv2.ORB, cv2.SIFT]
+    ) -> TemplateFeatures:
+        _, template_image = ImageReader.read(template_path)
+
+        if len(template_image) != 1:
+            raise ValueError(
+                "Template directory should contain\n"
+                "a single image file for each page in\n"
+                "the template."
+            )
+
+        template_gray = convert_img_to_grayscale(template_image[0])
+        keypoints, descriptors = detector.detectAndCompute(template_gray, None)
+
+        logger.debug(f"Computed {len(keypoints)} keypoints for {template_path}")
+
+        return TemplateFeatures(
+            path=template_path,
+            shape=template_gray.shape,
+            keypoints=keypoints,
+            descriptors=descriptors,
+        )
+
+    def _cache_path(self, template_path: str, detector_key: str) -> Union[Path, None]:
+        if self.cache_directory is None:
+            return None
+
+        template_path = Path(template_path)
+        file_name = (
+            f"{template_path.parent.name}_{template_path.stem}_{detector_key}.npz"
+        )
+        return Path(self.cache_directory) / file_name
+
+    @staticmethod
+    def _source_signature(template_path: str) -> np.ndarray:
+        stat = os.stat(template_path)
+        return np.array([stat.st_size, int(stat.st_mtime)], dtype=np.int64)
+
+    def _load(
+        self, template_path: str, detector_key: str
+    ) -> Union[TemplateFeatures, None]:
+        cache_path = self._cache_path(template_path, detector_key)
+        if cache_path is None or not cache_path.exists():
+            return None
+
+        try:
+            with np.load(cache_path) as cached:
+                signature = cached["source_signature"]
+                if not np.array_equal(signature, self._source_signature(template_path)):
+                    logger.debug(f"Stale template features in {cache_path}")
+                    return None
+
+                features = TemplateFeatures(
+                    path=template_path,
+                    shape=tuple(cached["shape"]),
+                    keypoints=self.deserialise_keypoints(cached["keypoints"]),
+                    descriptors=cached["descriptors"],
+                )
+        except (OSError, KeyError, ValueError) as e:
+            logger.debug(f"Unable to load template features from {cache_path}: {e}")
+            return None
+
+        return features
+
+    def _save(self, features: TemplateFeatures, detector_key: str):
+        cache_path = self._cache_path(features.path, detector_key)
+        if cache_path is None:
+            return
+
+        descriptors = features.descriptors
+        if descriptors is None:
+            descriptors = np.empty((0, 0), dtype=np.float32)
+
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(
+                cache_path,
+                source_signature=self._source_signature(features.path),
+                shape=np.array(features.shape, dtype=np.int64),
+                keypoints=self.serialise_keypoints(features.keypoints),
+                descriptors=descriptors,
+            )
+        except OSError as e:
+            # The template directory will be read only in a deployed lambda
+            logger.debug(f"Unable to save template features to {cache_path}: {e}")
+
+    @staticmethod
+    def serialise_keypoints(keypoints: Tuple[cv2.KeyPoint, ...]) -> np.ndarray:
+        """Converts opencv keypoints to an ndarray
+
+        Params:
+            keypoints (Tuple[cv2.KeyPoint, ...]): opencv keypoints
+
+        Returns:
+            (np.ndarray): An (N, 7) array of keypoint attributes
+        """
+        return np.array(
+            [
+                (
+                    kp.pt[0],
+                    kp.pt[1],
+                    kp.size,
+                    kp.angle,
+                    kp.response,
+                    kp.octave,
+                    kp.class_id,
+                )
+                for kp in keypoints
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 7)
+
+    @staticmethod
+    def deserialise_keypoints(keypoints: np.ndarray) -> Tuple[cv2.KeyPoint, ...]:
+        """Converts an ndarray back to opencv keypoints
+
+        Params:
+            keypoints (np.ndarray): An (N, 7) array of keypoint
+                attributes, see `serialise_keypoints`
+
+        Returns:
+            (Tuple[cv2.KeyPoint, ...]): opencv keypoints
+        """
+        return tuple(
+            cv2.KeyPoint(
+                x=float(x),
+                y=float(y),
+                size=float(size),
+                angle=float(angle),
+                response=float(response),
+                octave=int(octave),
+                class_id=int(class_id),
+            )
+            for x, y, size, angle, response, octave, class_id in keypoints
+        )
@@ -0,0 +1,91 @@
+import pytest
+
+
+class TestCompiledFormMetadata:
+    test_meta_location = "tests/tests_meta/data/form_metadata/test.json"
+
+    def setup_test(self):
+        from form_tools.form_meta.form_meta import FormMetadata
+
+        form_meta = FormMetadata.from_json(self.test_meta_location)
+        return form_meta, form_meta.compile()
+
+    @staticmethod
+    def convert_field_to_dict(field):
+        field_dict = field.dict()
+        field_dict["bounding_box"] = field_dict["bounding_box"].to_dict()
+        return field_dict
+
+    def test_matches_form_metadata(self):
+        form_meta, compiled = self.setup_test()
+
+        assert compiled.name == form_meta.name
+        assert compiled.form_template == form_meta.form_template
+        assert list(compiled.form_page_numbers) == form_meta.form_page_numbers
+        assert [p.to_dict() for p in compiled.form_pages] == [
+            p.to_dict() for p in form_meta.form_pages
+        ]
+        assert [self.convert_field_to_dict(f) for f in compiled.form_fields] == [
+            self.convert_field_to_dict(f) for f in form_meta.form_fields
+        ]
+
+    @pytest.mark.parametrize(
+        "page_number, field_names",
+        [
+            (1, ("my_string_field", "my_other_string_field")),
+            (2, ("my_int_field", "my_bool_field")),
+        ],
+    )
+    def test_lookups(self, page_number, field_names):
+        form_meta, compiled = self.setup_test()
+
+        assert compiled.form_page(page_number) is compiled.form_page(page_number)
+        assert (
+            compiled.form_page(page_number).to_dict()
+            == form_meta.form_page(page_number).to_dict()
+        )
+        assert (
+            tuple(f.name for f in compiled.fields_by_page[page_number]) == field_names
+        )
+        assert [f.name for f in form_meta.fields_by_page[page_number]] == list(
+            field_names
+        )
+        for field_name in field_names:
+            assert self.convert_field_to_dict(
+                compiled.form_field(field_name)
+            ) == self.convert_field_to_dict(form_meta.form_field(field_name))
+
+    def test_identifiers(self):
+        _, compiled = self.setup_test()
+
+        assert compiled.identifiers[1].search("the\nfirst page")
+        assert not compiled.identifiers[2].search("the first page")
+
+    def test_missing_lookups(self):
+        _, compiled = self.setup_test()
+
+        with pytest.raises(ValueError):
+            compiled.form_page(3)
+        with pytest.raises(ValueError):
+            compiled.form_field("not_a_field")
+
+    def test_read_only(self):
+        _, compiled = self.setup_test()
+
+        with pytest.raises(AttributeError):
+            compiled.form_template = "templates/other"
+        with pytest.raises(TypeError):
+            compiled.pages[3] = compiled.pages[1]
+
+    def test_compile_meta_store(self):
+        from form_tools.form_meta.compiled_form_meta import (
+            CompiledFormMetadata,
+            compile_meta_store,
+        )
+
+        form_meta, compiled = self.setup_test()
+        meta_store = compile_meta_store({"test": form_meta, "compiled": compiled})
+
+        assert list(meta_store) == ["test", "compiled"]
+        assert isinstance(meta_store["test"], CompiledFormMetadata)
+        assert meta_store["compiled"] is compiled
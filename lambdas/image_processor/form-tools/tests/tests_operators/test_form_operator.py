@@ -24,6 +24,7 @@ class TestFormOperator:
             page_operator = FormPageOperator.create_from_config(config)
 
             assert operator.form_page_operator.dict() == page_operator.dict()
+            assert operator.form_page_operator is operator.form_page_operator
             assert operator.config.dict() == page_operator.config.dict()
 
         else:
@@ -42,3 +43,215 @@ class TestFormOperator:
 
         meta_store = FormOperator.form_meta_store(form_meta_directory)
         assert sorted(expected) == sorted([k for k in meta_store])
+
+    def test_profile(self):
+        from form_tools.form_operators.operator_configs import FormOperatorConfig
+
+        config = FormOperatorConfig(profile="fast", proportion=0.9)
+
+        assert config.detector.name == "ORB"
+        assert config.matcher.args[0]["algorithm"] == 6
+        # Values given in the config take precedence over the profile
+        assert config.proportion == 0.9
+        assert config.for_fallback().detector.name == "SIFT"
+        assert config.for_fallback().fallback is None
+
+        with pytest.raises(Exception):
+            FormOperatorConfig(profile="not_a_profile")
+
+    def test_template_overrides(self):
+        from form_tools.form_operators.form_operator import FormOperator
+
+        operator = FormOperator.create_from_config(
+            {
+                "detector": {"name": "SIFT"},
+                "matcher": {"id": "BF"},
+                "fallback": {"knn": 0, "proportion": 0.5},
+                "templates": {
+                    "fast_images": {"profile": "fast"},
+                    "lenient_images": {"minimum_matches": 4},
+                },
+            }
+        )
+
+        fast = operator.page_operator_for("templates/fast_images/")
+        lenient = operator.page_operator_for("templates/lenient_images")
+        default = operator.page_operator_for("templates/other_images")
+
+        assert fast.config.detector.name == "ORB"
+        assert lenient.config.detector.name == "SIFT"
+        assert lenient.minimum_matches == 4
+        assert default.config.dict() == operator.form_page_operator.config.dict()
+        assert operator.page_operator_for("templates/fast_images/") is fast
+        # The profile's fallback replaces the config's
+        fast_fallback = operator.page_operator_for("templates/fast_images/", True)
+        lenient_fallback = operator.page_operator_for("templates/lenient_images", True)
+        assert fast_fallback.config.detector.name == "SIFT"
+        assert fast_fallback.knn == 2
+        assert lenient_fallback.knn == 0
+        assert lenient_fallback.minimum_matches == 4
+
+        with pytest.raises(Exception):
+            FormOperator.create_from_config(
+                {
+                    "detector": {"name": "SIFT"},
+                    "matcher": {"id": "BF"},
+                    "templates": {"bad_images": {"detector": {"name": "SURF"}}},
+                }
+            )
+
+    @pytest.mark.parametrize("fallback", [True, False])
+    def test_align_images_with_fallback(self, tmp_path, fallback):
+        import cv2
+        from types import SimpleNamespace
+        from form_tools.form_operators.form_operator import FormOperator
+
+        template_image = cv2.imread("tests/tests_operators/data/images/original.png")
+        page_image = cv2.cvtColor(
+            cv2.imread("tests/tests_operators/data/images/rotated15.png"),
+            cv2.COLOR_BGR2GRAY,
+        )
+        cv2.imwrite(str(tmp_path / "page_1.png"), template_image)
+        form_meta = SimpleNamespace(
+            form_template=str(tmp_path), form_fields=[], fields_by_page={}
+        )
+
+        config = {
+            "detector": {"name": "ORB"},
+            "matcher": {"id": "BF", "args": [6], "kwargs": {"crossCheck": True}},
+            "knn": 0,
+            "proportion": 1,
+            # More matches than there can be keypoints, so alignment always fails
+            "minimum_matches": 100000,
+        }
+        if fallback:
+            config["fallback"] = {
+                "detector": {"name": "SIFT"},
+                "matcher": {"id": "BF"},
+                "knn": 2,
+                "proportion": 0.7,
+                "minimum_matches": 10,
+            }
+        operator = FormOperator.create_from_config(config)
+
+        if fallback:
+            aligned = operator.align_images_to_template({1: [page_image]}, form_meta)
+            assert aligned[1][0].shape == template_image.shape[:2]
+        else:
+            with pytest.raises(RuntimeError, match="not enough keypoints"):
+                operator.align_images_to_template({1: [page_image]}, form_meta)
+
+    def test_extract_fields_from_regions(self, tmp_path):
+        import cv2
+        from types import SimpleNamespace
+        from form_tools.form_meta.bounding_box import BoundingBox
+        from form_tools.form_operators.form_operator import FormOperator
+        from form_tools.form_operators.form_page_operator import AlignedPageImage
+
+        template_image = cv2.imread("tests/tests_operators/data/images/original.png")
+        page_image = cv2.imread("tests/tests_operators/data/images/rotated15.png")
+        cv2.imwrite(str(tmp_path / "page_1.png"), template_image)
+        form_fields = [
+            SimpleNamespace(name=name, page_number=1, bounding_box=BoundingBox(*ltwh))
+            for name, ltwh in [
+                ("inside", (50, 40, 120, 60)),
+                ("checkbox", (200, 150, 15, 15)),
+                # Fields are clipped to the template
+                ("overlapping", (400, 300, 100, 100)),
+            ]
+        ]
+        form_meta = SimpleNamespace(
+            form_template=str(tmp_path),
+            form_fields=form_fields,
+            fields_by_page={1: form_fields},
+            form_page=lambda pn: SimpleNamespace(duplicates=False),
+        )
+
+        config = {
+            "detector": {"name": "SIFT"},
+            "matcher": {"id": "BF"},
+            "knn": 2,
+            "proportion": 0.7,
+        }
+        page_operator = FormOperator.create_from_config(config)
+        regions_operator = FormOperator.create_from_config(
+            {**config, "extraction_mode": "regions"}
+        )
+
+        aligned_pages = page_operator.align_images_to_template(
+            {1: [page_image]}, form_meta
+        )
+        aligned_regions = regions_operator.align_images_to_template(
+            {1: [page_image]}, form_meta
+        )
+        assert isinstance(aligned_regions[1][0], AlignedPageImage)
+        assert aligned_regions[1][0].shape == template_image.shape
+
+        page_fields = page_operator.extract_fields(aligned_pages, form_meta)
+        region_fields = regions_operator.extract_fields(aligned_regions, form_meta)
+        for field in form_fields:
+            assert region_fields[field.name].shape == page_fields[field.name].shape
+            difference = cv2.absdiff(region_fields[field.name], page_fields[field.name])
+            assert difference.max() <= 1
+
+        with pytest.raises(Exception):
+            FormOperator.create_from_config({**config, "extraction_mode": "cells"})
+
+    @pytest.mark.parametrize("reuse", [True, False])
+    def test_align_images_reusing_alignments(self, tmp_path, monkeypatch, reuse):
+        import cv2
+        from types import SimpleNamespace
+        from form_tools.form_operators.form_operator import FormOperator
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+
+        template_image = cv2.resize(
+            cv2.imread("tests/tests_operators/data/images/original.png"),
+            None,
+            fx=3,
+            fy=3,
+        )
+        h, w = template_image.shape[:2]
+        cv2.imwrite(str(tmp_path / "page_1.png"), template_image)
+        cv2.imwrite(str(tmp_path / "page_2.png"), cv2.flip(template_image, 1))
+
+        def scan(image, angle, dx, dy):
+            M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1)
+            M[:, 2] += (dx, dy)
+            return cv2.warpAffine(
+                image, M, (w + 60, h + 60), borderValue=(255, 255, 255)
+            )
+
+        # Pages from the same scan are skewed alike
+        image_page_mapping = {
+            1: [scan(template_image, 1.0, 20, 10)],
+            2: [scan(cv2.flip(template_image, 1), 1.3, 25, 5)],
+        }
+        form_meta = SimpleNamespace(
+            form_template=str(tmp_path), form_fields=[], fields_by_page={}
+        )
+
+        results = []
+        reuse_alignment = FormPageOperator.reuse_alignment
+
+        def spy_reuse_alignment(self, *args, **kwargs):
+            results.append(reuse_alignment(self, *args, **kwargs))
+            return results[-1]
+
+        monkeypatch.setattr(FormPageOperator, "reuse_alignment", spy_reuse_alignment)
+
+        operator = FormOperator.create_from_config(
+            {
+                "detector": {"name": "SIFT"},
+                "matcher": {"id": "BF"},
+                "knn": 2,
+                "proportion": 0.7,
+                "alignment": {"reuse": reuse},
+            }
+        )
+        aligned = operator.align_images_to_template(image_page_mapping, form_meta)
+
+        assert len(results) == (1 if reuse else 0)
+        for pn, template in [(1, template_image), (2, cv2.flip(template_image, 1))]:
+            assert aligned[pn][0].shape == template.shape
+            difference = cv2.absdiff(aligned[pn][0], template)
+            assert np.median(difference) < 5
@@ -190,3 +190,177 @@ class TestFormPageOperator:
 
         os.environ.clear()
         os.environ.update(old_environ)
+
+    def test_detector_and_matcher_reused_per_thread(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+
+        operator = FormPageOperator.create_from_config(
+            "tests/tests_operators/data/configs/valid_config3.yml"
+        )
+
+        assert operator.detector is operator.detector
+        assert operator.matcher is operator.matcher
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            detector, matcher = executor.submit(
+                lambda: (operator.detector, operator.matcher)
+            ).result()
+
+        assert detector is not operator.detector
+        assert matcher is not operator.matcher
+
+    def test_template_matcher_matches(self):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+        from form_tools.form_operators.template_features import TemplateFeatureStore
+        from form_tools.form_operators.preprocessors import convert_img_to_grayscale
+
+        # Brute force matching is exact, unlike FLANN, so the matches can be compared
+        operator = FormPageOperator.create_from_config(
+            "tests/tests_operators/data/configs/valid_config.yml"
+        )
+        store = TemplateFeatureStore()
+        features = store.get(
+            "tests/tests_operators/data/images/original.png",
+            operator.detector,
+            store.detector_key(operator.config.detector),
+        )
+        page_image = convert_img_to_grayscale(
+            cv2.imread("tests/tests_operators/data/images/rotated15.png")
+        )
+        _, descs_img = operator.detector.detectAndCompute(page_image, None)
+
+        expected = operator._return_matches(descs_img, features.descriptors)
+        matches = operator._return_matches(descs_img, features.descriptors, features)
+
+        assert operator.template_matcher(features) is operator.template_matcher(
+            features
+        )
+        assert [(m.queryIdx, m.trainIdx) for m in matches] == [
+            (m.queryIdx, m.trainIdx) for m in expected
+        ]
+
+    @pytest.mark.parametrize(
+        "alignment, expected_scale",
+        [
+            ({"mode": "full"}, 1.0),
+            ({"mode": "pyramid", "scale": 0.5, "refine": False}, 0.5),
+            ({"mode": "pyramid", "scale": 0.5, "max_error": 0.0}, None),
+        ],
+    )
+    def test_find_alignment(self, alignment, expected_scale):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+        from form_tools.form_operators.template_features import TemplateFeatureStore
+        from form_tools.form_operators.preprocessors import convert_img_to_grayscale
+
+        config = {
+            "detector": {"name": "SIFT"},
+            "matcher": {
+                "id": "FLANN",
+                "args": [{"algorithm": 1, "trees": 5}, {"check": 50}],
+            },
+            "knn": 2,
+            "proportion": 0.7,
+            "alignment": alignment,
+        }
+        template_path = "tests/tests_operators/data/images/original.png"
+        operator = FormPageOperator.create_from_config(config)
+        store = TemplateFeatureStore()
+        features = store.get(
+            template_path,
+            operator.detector,
+            store.detector_key(operator.config.detector),
+        )
+        page_image = convert_img_to_grayscale(
+            cv2.imread("tests/tests_operators/data/images/rotated15.png")
+        )
+        template_image = convert_img_to_grayscale(cv2.imread(template_path))
+
+        result = operator.find_alignment(
+            page_image, features, regions=[(50, 50, 200, 150)]
+        )
+        aligned_image = operator.align_image_to_template(
+            page_image=page_image,
+            page_template_features=features,
+            regions=[(50, 50, 200, 150)],
+        )
+
+        if expected_scale is not None:
+            assert result.scale == expected_scale
+        assert result.inliers > operator.minimum_matches
+        assert result.error < 3
+        assert (
+            round(structural_similarity(aligned_image, template_image), 2)
+            >= self.STRUCTURAL_SIMILARITY_THRESHOLD
+        )
+
+    @pytest.mark.parametrize(
+        "seed_rotation, expected",
+        [(0.0, True), (0.5, True), (10.0, False)],
+    )
+    def test_reuse_alignment(self, seed_rotation, expected):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+        from form_tools.form_operators.template_features import TemplateFeatures
+
+        template_image = cv2.resize(
+            cv2.imread("tests/tests_operators/data/images/original.png", 0),
+            None,
+            fx=3,
+            fy=3,
+        )
+        h, w = template_image.shape
+
+        def rotation(angle, dx, dy):
+            M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1)
+            M[:, 2] += (dx, dy)
+            return np.vstack([M, [0, 0, 1]])
+
+        page_to_template = np.linalg.inv(rotation(1.0, 20, 10))
+        page_image = cv2.warpPerspective(
+            template_image,
+            np.linalg.inv(page_to_template),
+            (w + 60, h + 60),
+            borderValue=255,
+        )
+        # The alignment of a page skewed and shifted a little differently
+        seed = np.linalg.inv(rotation(1.0 + seed_rotation, 12, 16))
+
+        operator = FormPageOperator.create_from_config(
+            {"detector": {"name": "SIFT"}, "matcher": {"id": "BF"}}
+        )
+        features = TemplateFeatures(
+            path=None, shape=template_image.shape, keypoints=(), descriptors=None
+        )
+
+        if expected:
+            result = operator.reuse_alignment(
+                page_image, seed, features, page_template_image=template_image
+            )
+            corners = np.array([[0, 0, 1], [w, 0, 1], [0, h, 1], [w, h, 1]]).T
+            projected = result.homography @ np.linalg.inv(page_to_template) @ corners
+            projected = projected[:2] / projected[2]
+
+            assert result.reused
+            assert result.error <= operator.alignment.max_error
+            assert np.abs(projected - corners[:2]).max() < 2
+        else:
+            with pytest.raises(RuntimeError):
+                operator.reuse_alignment(
+                    page_image, seed, features, page_template_image=template_image
+                )
+
+    @pytest.mark.parametrize(
+        "alignment",
+        [{"mode": "quick"}, {"mode": "pyramid", "scale": 0}],
+    )
+    def test_invalid_alignment_config(self, alignment):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+
+        with pytest.raises(ValidationError):
+            _ = FormPageOperator.create_from_config(
+                {
+                    "detector": {"name": "SIFT"},
+                    "matcher": {"id": "BF"},
+                    "alignment": alignment,
+                }
+            )
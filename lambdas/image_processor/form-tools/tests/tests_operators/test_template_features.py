@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+from skimage.metrics import structural_similarity
+
+
+class TestTemplateFeatureStore:
+    CONFIG = "tests/tests_operators/data/configs/valid_config2.yml"
+    TEMPLATE_IMAGE_PATH = "tests/tests_operators/data/images/original.png"
+    PAGE_IMAGE_PATH = "tests/tests_operators/data/images/rotated15.png"
+
+    def test_get_caches_features(self):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+        from form_tools.form_operators.template_features import TemplateFeatureStore
+
+        operator = FormPageOperator.create_from_config(self.CONFIG)
+        store = TemplateFeatureStore()
+        detector_key = store.detector_key(operator.config.detector)
+
+        features = store.get(self.TEMPLATE_IMAGE_PATH, operator.detector, detector_key)
+
+        assert len(features.keypoints) == features.descriptors.shape[0]
+        assert (
+            store.get(self.TEMPLATE_IMAGE_PATH, operator.detector, detector_key)
+            is features
+        )
+        assert len(store) == 1
+
+    def test_cache_directory_round_trip(self, tmp_path):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+        from form_tools.form_operators.template_features import TemplateFeatureStore
+
+        operator = FormPageOperator.create_from_config(self.CONFIG)
+        detector_key = TemplateFeatureStore.detector_key(operator.config.detector)
+
+        computed = TemplateFeatureStore(cache_directory=str(tmp_path)).get(
+            self.TEMPLATE_IMAGE_PATH, operator.detector, detector_key
+        )
+        assert len(list(tmp_path.glob("*.npz"))) == 1
+
+        loaded = TemplateFeatureStore(cache_directory=str(tmp_path))._load(
+            self.TEMPLATE_IMAGE_PATH, detector_key
+        )
+
+        assert loaded is not None
+        assert loaded.shape == computed.shape
+        assert np.array_equal(loaded.descriptors, computed.descriptors)
+        assert [kp.pt for kp in loaded.keypoints] == [
+            kp.pt for kp in computed.keypoints
+        ]
+
+    def test_alignment_with_features(self):
+        from form_tools.form_operators.form_page_operator import FormPageOperator
+        from form_tools.form_operators.template_features import TemplateFeatureStore
+        from form_tools.form_operators.preprocessors import convert_img_to_grayscale
+        from form_tools.utils.image_reader import ImageReader
+
+        operator = FormPageOperator.create_from_config(self.CONFIG)
+        store = TemplateFeatureStore()
+        features = store.get(
+            self.TEMPLATE_IMAGE_PATH,
+            operator.detector,
+            store.detector_key(operator.config.detector),
+        )
+
+        _, page_images = ImageReader.read(self.PAGE_IMAGE_PATH)
+        page_image = convert_img_to_grayscale(page_images[0])
+        template_image = convert_img_to_grayscale(cv2.imread(self.TEMPLATE_IMAGE_PATH))
+
+        aligned_image = operator.align_image_to_template(
+            page_image=page_image, page_template_features=features
+        )
+
+        assert aligned_image.shape == template_image.shape
+        assert round(structural_similarity(aligned_image, template_image), 2) >= 0.95
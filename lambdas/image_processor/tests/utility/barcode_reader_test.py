@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+
+from app.utility.barcode_reader import BarcodeReader, BarcodeScan
+from app.utility.page_image import PageImage
+
+
+def decoded(data):
+    return [MagicMock(data=data.encode("utf-8"))]
+
+
+def blank_page(height=1200, width=900):
+    return PageImage(np.full((height, width, 3), 255, dtype=np.uint8))
+
+
+@patch("app.utility.barcode_reader.decode")
+def test_read_decodes_native_resolution_first(mock_decode):
+    mock_decode.return_value = decoded("1H7")
+    page = blank_page()
+
+    assert BarcodeReader().read(page) == "1H7"
+
+    mock_decode.assert_called_once()
+    roi = mock_decode.call_args.args[0]
+    assert roi.shape == (400, 300)
+
+
+@patch("app.utility.barcode_reader.decode")
+def test_read_falls_back_to_upscaled_region(mock_decode):
+    mock_decode.side_effect = lambda image: (
+        decoded("1C2") if image.shape[:2] == (4 * 900, 1200) else []
+    )
+
+    assert BarcodeReader(use_locator=False).read(blank_page()) == "1C2"
+    assert mock_decode.call_count == 2
+
+
+@patch("app.utility.barcode_reader.decode")
+def test_read_falls_back_to_upscaled_region_for_undecoded_candidate(mock_decode):
+    mock_decode.side_effect = lambda image: (
+        decoded("1C2") if image.shape[:2] == (4 * 900, 1200) else []
+    )
+    reader = BarcodeReader()
+
+    with patch.object(reader, "locate_candidates", return_value=[(0, 0, 50, 20)]):
+        assert reader.read(blank_page()) == "1C2"
+    assert mock_decode.call_count == 3
+
+
+@patch("app.utility.barcode_reader.decode", return_value=[])
+def test_read_returns_none_without_barcode(mock_decode):
+    assert BarcodeReader().read(blank_page()) is None
+
+    # The blank page has no barcode-like regions, so isn't stretched
+    mock_decode.assert_called_once()
+
+
+@patch("app.utility.barcode_reader.decode", return_value=[])
+def test_read_without_slow_fallback(mock_decode):
+    reader = BarcodeReader(slow_fallback=False)
+
+    with patch.object(reader, "locate_candidates", return_value=[(0, 0, 50, 20)]):
+        assert reader.read(blank_page()) is None
+    assert mock_decode.call_count == 2
+
+
+def test_locate_candidates_finds_barcode_like_region():
+    gray = np.full((400, 300), 255, dtype=np.uint8)
+    # Vertical bars of varying width in the middle of the region
+    x = 60
+    for bar_width in [2, 4, 2, 6, 2, 4, 4, 2, 6, 2, 2, 4, 6, 2, 4, 2]:
+        cv2.rectangle(gray, (x, 150), (x + bar_width - 1, 230), 0, -1)
+        x += bar_width * 2
+
+    boxes = BarcodeReader().locate_candidates(gray)
+
+    assert len(boxes) > 0
+    bx, by, bw, bh = boxes[0]
+    assert bx <= 60 and by <= 150
+    assert bx + bw >= x - 10 and by + bh >= 230
+
+
+def test_locate_candidates_ignores_blank_region():
+    gray = np.full((400, 300), 255, dtype=np.uint8)
+
+    assert BarcodeReader().locate_candidates(gray) == []
+
+
+def test_barcode_scan_reads_barcode_in_any_orientation():
+    previews = [
+        PageImage(np.zeros((30, 20, 3), dtype=np.uint8), page_number=1),
+        PageImage(np.zeros((30, 20, 3), dtype=np.uint8), page_number=2),
+    ]
+    reader = MagicMock()
+    # Only the first page has a barcode, and only once it has been turned on its side
+    reader.read.side_effect = lambda page: (
+        "1H7" if page.page_number == 1 and page.shape[:2] == (20, 30) else None
+    )
+    render_page = MagicMock(
+        side_effect=lambda page_number: PageImage(
+            np.zeros((300, 200, 3), dtype=np.uint8), page_number=page_number
+        )
+    )
+    barcode_scan = BarcodeScan(previews, render_page, reader=reader)
+
+    assert barcode_scan.read_barcodes(range(2)) == ["1H7", None]
+    assert barcode_scan.page_rotations == {0: 90}
+    render_page.assert_not_called()
+
+    page = barcode_scan[0]
+
+    assert page.shape[:2] == (200, 300)
+    render_page.assert_called_once_with(1)
+    assert barcode_scan[0] is page
+    assert barcode_scan.rendered_count == 1
+
+
+@patch("app.utility.barcode_reader.decode", return_value=[])
+def test_barcode_scan_previews_skip_slow_fallback(mock_decode):
+    barcode_scan = BarcodeScan([blank_page()], MagicMock())
+
+    with patch.object(
+        barcode_scan.reader, "locate_candidates", return_value=[(0, 0, 50, 20)]
+    ):
+        assert barcode_scan.read_barcodes([0]) == [None]
+
+    # Native and located region decodes in each of the four orientations
+    assert mock_decode.call_count == 8
+
+
+def test_barcode_scan_renders_pages_concurrently():
+    previews = [
+        PageImage(np.zeros((30, 20, 3), dtype=np.uint8), page_number=page_number)
+        for page_number in (1, 2)
+    ]
+    # Each render waits for the other, so this only passes if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def render_page(page_number):
+        barrier.wait()
+        return PageImage(
+            np.zeros((300, 200, 3), dtype=np.uint8), page_number=page_number
+        )
+
+    barcode_scan = BarcodeScan(previews, render_page, reader=MagicMock())
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pages = list(executor.map(barcode_scan.__getitem__, [0, 1]))
+
+    assert [page.page_number for page in pages] == [1, 2]
+    assert barcode_scan.rendered_count == 2
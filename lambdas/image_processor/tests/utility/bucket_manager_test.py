@@ -1,11 +1,15 @@
+import json
 import os
+import threading
+import time
 import boto3
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 from moto import mock_aws
 import pytest
 from app.utility.bucket_manager import BucketManager, ScanLocation
 from app.utility.custom_logging import LogMessageDetails
 
+
 @pytest.fixture(autouse=True)
 def setup_environment_variables():
     os.environ["ENVIRONMENT"] = "testing"
@@ -40,10 +44,13 @@ def test_setup_s3_connection(mock_boto3, bucket_manager):
     bucket_manager.setup_s3_connection()
     if bucket_manager.environment == "local":
         mock_boto3.assert_called_with(
-            "s3", endpoint_url="http://localstack:4566", region_name="eu-west-1"
+            "s3",
+            endpoint_url="http://localstack:4566",
+            region_name="eu-west-1",
+            config=ANY,
         )
     else:
-        mock_boto3.assert_called_with("s3", region_name="eu-west-1")
+        mock_boto3.assert_called_with("s3", region_name="eu-west-1", config=ANY)
 
 
 def test_download_scanned_images(bucket_manager, monkeypatch):
@@ -109,7 +116,10 @@ def test_download_scanned_images(bucket_manager, monkeypatch):
     expected_result = {
         "scans": [
             {"location": "/tmp/output/5fbcd594bac0e_my_scan.pdf", "template": "TEST"},
-            {"location": "/tmp/output/5a980ebab6ae2_additional - correspondence.msg", "template": None},
+            {
+                "location": "/tmp/output/5a980ebab6ae2_additional - correspondence.msg",
+                "template": None,
+            },
         ],
         "continuations": {
             "continuation_1": {
@@ -120,7 +130,7 @@ def test_download_scanned_images(bucket_manager, monkeypatch):
                 "location": "/tmp/output/my_continuation_sheet2.pdf",
                 "template": "TEST",
             },
-        }
+        },
     }
 
     assert result.scans[0].template == expected_result["scans"][0]["template"]
@@ -142,6 +152,136 @@ def test_download_scanned_images(bucket_manager, monkeypatch):
         == expected_result["continuations"]["continuation_2"]["template"]
     )
 
+
+def test_download_scanned_images_keeps_order(bucket_manager, monkeypatch):
+    s3_urls_dict = {
+        "lpaScans": [
+            {"location": "s3://my_bucket/correspondence.pdf"},
+            {"location": "s3://my_bucket/lpa.pdf", "template": "LP1F"},
+        ],
+        "continuationSheets": [
+            {"location": "s3://my_bucket/continuation_1.pdf", "template": "LPC"},
+            {"location": "s3://my_bucket/continuation_2.pdf", "template": "LPC"},
+        ],
+    }
+    delays = {"lpa.pdf": 0.05, "continuation_1.pdf": 0.05}
+
+    def download_file(bucket, key, path):
+        time.sleep(delays.get(key, 0))
+
+    mock_s3 = MagicMock()
+    mock_s3.download_file = MagicMock(side_effect=download_file)
+    monkeypatch.setattr(bucket_manager, "s3", mock_s3)
+
+    result = bucket_manager.download_scanned_images(s3_urls_dict, "/tmp/output")
+
+    assert [scan.location for scan in result.scans] == [
+        "/tmp/output/lpa.pdf",
+        "/tmp/output/correspondence.pdf",
+    ]
+    assert {
+        key: continuation.location for key, continuation in result.continuations.items()
+    } == {
+        "continuation_1": "/tmp/output/continuation_1.pdf",
+        "continuation_2": "/tmp/output/continuation_2.pdf",
+    }
+
+
+def test_download_scanned_images_names_failed_document(bucket_manager, monkeypatch):
+    s3_urls_dict = {
+        "lpaScans": [{"location": "s3://my_bucket/lpa.pdf", "template": "LP1F"}],
+        "continuationSheets": [
+            {"location": "s3://my_bucket/continuation_1.pdf", "template": "LPC"},
+        ],
+    }
+
+    def download_file(bucket, key, path):
+        if key == "continuation_1.pdf":
+            raise Exception("Not Found")
+
+    mock_s3 = MagicMock()
+    mock_s3.download_file = MagicMock(side_effect=download_file)
+    monkeypatch.setattr(bucket_manager, "s3", mock_s3)
+
+    with pytest.raises(
+        Exception,
+        match="Error downloading scanned continuation sheet s3://my_bucket/continuation_1.pdf: Not Found",
+    ):
+        bucket_manager.download_scanned_images(s3_urls_dict, "/tmp/output")
+
+
+def test_download_scanned_images_on_demand(bucket_manager, monkeypatch):
+    s3_urls_dict = {
+        "lpaScans": [
+            {"location": "s3://my_bucket/correspondence.pdf"},
+            {"location": "s3://my_bucket/lpa.pdf", "template": "LP1F"},
+            {"location": "s3://my_bucket/other.pdf"},
+        ],
+        "continuationSheets": [
+            {"location": "s3://my_bucket/continuation_1.pdf", "template": "LPC"},
+        ],
+    }
+    prefetch_started = threading.Event()
+    overlapped = []
+
+    def download_file(bucket, key, path):
+        if key == "correspondence.pdf":
+            prefetch_started.set()
+        if key == "lpa.pdf":
+            # The next scan should be prefetched while the first is still downloading
+            overlapped.append(prefetch_started.wait(timeout=5))
+
+    mock_s3 = MagicMock()
+    mock_s3.download_file = MagicMock(side_effect=download_file)
+    monkeypatch.setattr(bucket_manager, "s3", mock_s3)
+
+    result = bucket_manager.download_scanned_images(
+        s3_urls_dict, "/tmp/output", on_demand=True
+    )
+
+    # Only the continuation is downloaded up front
+    assert [scan.local_location for scan in result.scans] == [None, None, None]
+    assert result.continuations["continuation_1"].location == (
+        "/tmp/output/continuation_1.pdf"
+    )
+
+    assert result.scans[0].location == "/tmp/output/lpa.pdf"
+    assert overlapped == [True]
+    result.close()
+
+    # Scans the matcher never asked for, beyond the prefetch, aren't downloaded
+    downloaded_keys = [call.args[1] for call in mock_s3.download_file.call_args_list]
+    assert sorted(downloaded_keys) == [
+        "continuation_1.pdf",
+        "correspondence.pdf",
+        "lpa.pdf",
+    ]
+    assert result.scans[1].local_location == "/tmp/output/correspondence.pdf"
+    assert result.scans[2].local_location is None
+
+
+def test_download_scanned_images_on_demand_names_failed_document(
+    bucket_manager, monkeypatch
+):
+    s3_urls_dict = {
+        "lpaScans": [{"location": "s3://my_bucket/lpa.pdf", "template": "LP1F"}],
+    }
+
+    mock_s3 = MagicMock()
+    mock_s3.download_file = MagicMock(side_effect=Exception("Not Found"))
+    monkeypatch.setattr(bucket_manager, "s3", mock_s3)
+
+    result = bucket_manager.download_scanned_images(
+        s3_urls_dict, "/tmp/output", on_demand=True
+    )
+
+    with pytest.raises(
+        Exception, match="Error downloading scanned document LP1F: Not Found"
+    ):
+        result.scans[0].location
+    result.close()
+
+
 @mock_aws
 def test_put_images_to_bucket(bucket_manager):
     s3 = boto3.client("s3", region_name="us-east-1")
@@ -180,6 +320,69 @@ def test_put_images_to_bucket(bucket_manager):
     }
 
 
+def test_put_images_to_bucket_writes_instructions_last(bucket_manager, tmp_path):
+    path_selection = {}
+    for key in ["instructions", "preferences", "continuation_1", "continuation_2"]:
+        image_path = tmp_path / f"{key}.jpg"
+        image_path.write_bytes(key.encode())
+        path_selection[key] = str(image_path)
+
+    uploaded = []
+    open_bodies = []
+
+    def put_object(Key, Body, **kwargs):
+        open_bodies.append(Body)
+        # Finish the other images in reverse to show they don't need to finish in order
+        time.sleep(0.01 * (len(path_selection) - len(uploaded)))
+        uploaded.append(Key)
+
+    mock_s3 = MagicMock()
+    mock_s3.put_object = MagicMock(side_effect=put_object)
+    bucket_manager.s3 = mock_s3
+
+    images = bucket_manager.put_images_to_bucket(
+        path_selection=path_selection,
+        uid="700000000001",
+        continuation_instruction_count=2,
+        continuation_preference_count=0,
+        continuation_unknown_count=0,
+    )
+
+    assert images == [f"iap-700000000001-{key}" for key in path_selection]
+    assert sorted(uploaded) == sorted(images)
+    assert uploaded[-1] == "iap-700000000001-instructions"
+    assert all(body.closed for body in open_bodies)
+
+
+def test_put_images_to_bucket_skips_instructions_on_failure(bucket_manager, tmp_path):
+    path_selection = {}
+    for key in ["instructions", "continuation_1"]:
+        image_path = tmp_path / f"{key}.jpg"
+        image_path.write_bytes(key.encode())
+        path_selection[key] = str(image_path)
+
+    def put_object(Key, **kwargs):
+        if Key.endswith("continuation_1"):
+            raise Exception("Access Denied")
+
+    mock_s3 = MagicMock()
+    mock_s3.put_object = MagicMock(side_effect=put_object)
+    bucket_manager.s3 = mock_s3
+
+    with pytest.raises(
+        Exception, match="Failed to add file 'iap-700000000001-continuation_1'"
+    ):
+        bucket_manager.put_images_to_bucket(
+            path_selection=path_selection,
+            uid="700000000001",
+            continuation_instruction_count=1,
+            continuation_preference_count=0,
+            continuation_unknown_count=0,
+        )
+
+    assert mock_s3.put_object.call_count == 1
+
+
 @mock_aws
 def test_put_error_image_to_bucket(bucket_manager):
     s3 = boto3.client("s3", region_name="us-east-1")
@@ -201,6 +404,58 @@ def test_put_error_image_to_bucket(bucket_manager):
     }
 
 
+@mock_aws
+def test_put_manifest_to_bucket(bucket_manager, tmp_path):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    iap_bucket = "my-test-bucket"
+    uid = "700000000001"
+    bucket_manager.s3 = s3
+    bucket_manager.iap_bucket = iap_bucket
+    s3.create_bucket(Bucket=iap_bucket)
+
+    path_selection = {}
+    for key, content in [("instructions", b"abc"), ("continuation_preferences_1", b"")]:
+        image_path = tmp_path / f"{key}.jpg"
+        image_path.write_bytes(content)
+        path_selection[key] = str(image_path)
+
+    bucket_manager.put_manifest_to_bucket(
+        uid=uid,
+        path_selection=path_selection,
+        continuation_instruction_count=0,
+        continuation_preference_count=1,
+        continuation_unknown_count=0,
+    )
+
+    response = s3.get_object(Bucket=iap_bucket, Key=f"iap-{uid}-manifest")
+    assert json.loads(response["Body"].read()) == {
+        "uid": uid,
+        "processError": 0,
+        "continuationSheets": {"instructions": 0, "preferences": 1, "unknown": 0},
+        "images": {
+            f"iap-{uid}-instructions": 3,
+            f"iap-{uid}-continuation_preferences_1": 0,
+        },
+    }
+
+
+@mock_aws
+def test_put_error_image_to_bucket_writes_error_manifest(bucket_manager):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    iap_bucket = "my-test-bucket"
+    uid = "700000000001"
+    bucket_manager.s3 = s3
+    bucket_manager.iap_bucket = iap_bucket
+    s3.create_bucket(Bucket=iap_bucket)
+
+    bucket_manager.put_error_image_to_bucket(uid=uid)
+
+    response = s3.get_object(Bucket=iap_bucket, Key=f"iap-{uid}-manifest")
+    manifest = json.loads(response["Body"].read())
+    assert manifest["processError"] == 1
+    assert manifest["images"] == {f"iap-{uid}-instructions": 0}
+
+
 def test_reorder_list_by_relevance(bucket_manager):
     scan_list = [
         ScanLocation(location="blah", template="LPA123"),
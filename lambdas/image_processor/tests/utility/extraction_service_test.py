@@ -1,5 +1,7 @@
+import re
 from unittest.mock import MagicMock
 
+import numpy as np
 import pytest
 import cv2
 from app.utility.extraction_service import (
@@ -9,7 +11,10 @@ from app.utility.extraction_service import (
 )
 
 # from app.utility.bucket_manager import ScanLocationStore, ScanLocation
+from app.utility.barcode_reader import BarcodeScan
 from app.utility.custom_logging import LogMessageDetails
+from app.utility.page_image import PageImage
+from app.utility.page_scheduler import PageScheduler
 from form_tools.form_operators import FormOperator
 
 
@@ -33,6 +38,14 @@ def form_operator():
 class MockFormMeta:
     def __init__(self, form_pages):
         self.form_pages = form_pages
+        self.barcodes = {
+            form_page.page_number: form_page.additional_args["extra"]["barcode"]
+            for form_page in form_pages
+        }
+        self.identifiers = {
+            form_page.page_number: re.compile(form_page.identifier, re.DOTALL)
+            for form_page in form_pages
+        }
 
 
 class MockFormPage:
@@ -436,6 +449,95 @@ def test_find_matches_from_barcodes_multiple_matches(
     assert len(result.image_page_map) == 2
 
 
+def test_find_matches_from_barcodes_stops_reading_pages(
+    extraction_service, mock_form_metastore_barcode_multiple, monkeypatch
+):
+    images = ["page_1", "page_2", "page_3", "page_4", "page_5", "page_6"]
+    barcodes = {"page_1": "1C2", "page_2": "1C2"}
+
+    mock_get_barcode_from_image = MagicMock(side_effect=barcodes.get)
+    monkeypatch.setattr(
+        ExtractionService, "get_barcode_from_image", mock_get_barcode_from_image
+    )
+    monkeypatch.setattr(
+        "app.utility.extraction_service.get_page_scheduler",
+        lambda: PageScheduler(max_workers=2),
+    )
+    monkeypatch.setattr(cv2, "imread", lambda image: image)
+
+    result = extraction_service.find_matches_from_barcodes(
+        images, mock_form_metastore_barcode_multiple, None
+    )
+
+    assert result.meta_id == "meta_1"
+    assert result.image_page_map == {1: ["page_1"], 2: ["page_2"]}
+    assert mock_get_barcode_from_image.call_count == 2
+
+
+def test_images_by_barcode_keeps_page_order():
+    image_barcode_dict = {0: "1C2", 2: "1H7", 3: "1C2"}
+
+    assert ExtractionService.images_by_barcode(image_barcode_dict) == {
+        "1C2": [0, 3],
+        "1H7": [2],
+    }
+
+
+def test_match_on_barcodes_uses_low_resolution_pages(
+    extraction_service, mock_form_metastore_barcode_single, monkeypatch
+):
+    previews = [PageImage(np.zeros((30, 20, 3), dtype=np.uint8), page_number=1)]
+    reader = MagicMock()
+    reader.read.return_value = "1H7"
+    full_page = PageImage(np.zeros((300, 200, 3), dtype=np.uint8), page_number=1)
+    barcode_scan = BarcodeScan(previews, lambda page_number: full_page, reader=reader)
+    monkeypatch.setattr(
+        extraction_service, "get_cached_barcode_scan", lambda form_path: barcode_scan
+    )
+    mock_get_preprocessed_images = MagicMock()
+    monkeypatch.setattr(
+        extraction_service,
+        "get_cached_preprocessed_images",
+        mock_get_preprocessed_images,
+    )
+
+    result = extraction_service.match_on_barcodes(
+        "scan.pdf", mock_form_metastore_barcode_single, None
+    )
+
+    assert result.meta_id == "meta_1"
+    # The matched page is rendered at full resolution
+    assert result.image_page_map[1][0].shape == (300, 200, 3)
+    mock_get_preprocessed_images.assert_not_called()
+
+
+def test_match_on_barcodes_falls_back_to_preprocessed_pages(
+    extraction_service, mock_form_metastore_barcode_single, monkeypatch
+):
+    previews = [PageImage(np.zeros((30, 20, 3), dtype=np.uint8), page_number=1)]
+    reader = MagicMock()
+    reader.read.return_value = None
+    barcode_scan = BarcodeScan(previews, MagicMock(), reader=reader)
+    monkeypatch.setattr(
+        extraction_service, "get_cached_barcode_scan", lambda form_path: barcode_scan
+    )
+    processed_page = PageImage(np.zeros((310, 210, 3), dtype=np.uint8))
+    monkeypatch.setattr(
+        extraction_service,
+        "get_cached_preprocessed_images",
+        MagicMock(return_value=[processed_page]),
+    )
+    monkeypatch.setattr(
+        ExtractionService, "get_barcode_from_image", MagicMock(return_value="1H7")
+    )
+
+    result = extraction_service.match_on_barcodes(
+        "scan.pdf", mock_form_metastore_barcode_single, None
+    )
+
+    assert result.image_page_map[1][0].shape == (310, 210, 3)
+
+
 def test_similarity_score(extraction_service):
     # Test case 1: Identical strings
     str1 = "The quick brown fox jumps over the lazy dog."
@@ -570,38 +672,6 @@ def test_get_meta_page_text(extraction_service):
     assert meta_page_text == expected_meta_page_text
 
 
-def test_calculate_similarity_ratio(extraction_service, monkeypatch):
-    form_page = MockFormPage(page_number=1, barcode="", page_text="meta_page_1_text")
-    form_image_as_string = "Expects meta_page_1 as regex"
-    meta_page_text = "Expects meta_page_1 as regex"
-
-    expected_ratio = 100
-
-    # Call the method being tested
-    ratio = extraction_service.calculate_similarity_ratio(
-        form_page, form_image_as_string, meta_page_text
-    )
-
-    # Assert the results
-    assert ratio == expected_ratio
-
-
-def test_calculate_similarity_ratio_no_regex(extraction_service, monkeypatch):
-    form_page = MockFormPage(page_number=1, barcode="", page_text="meta_page_1_text")
-    form_image_as_string = "Form image as string"
-    meta_page_text = "Form image as string"
-
-    expected_ratio = 0  # Replace with the expected similarity ratio
-
-    # Call the method being tested
-    ratio = extraction_service.calculate_similarity_ratio(
-        form_page, form_image_as_string, meta_page_text
-    )
-
-    # Assert the results
-    assert ratio == expected_ratio
-
-
 def test_get_similarity_score(extraction_service):
     sorted_sim_scores = [
         {
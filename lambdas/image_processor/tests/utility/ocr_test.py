@@ -0,0 +1,99 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.utility import ocr
+from app.utility.ocr import TesseractPool, detect_orientation
+
+
+@pytest.fixture(autouse=True)
+def reset_pools():
+    ocr.close_tesseract_pools()
+    yield
+    ocr.close_tesseract_pools()
+
+
+@patch("app.utility.ocr.PyTessBaseAPI")
+def test_pool_reuses_handles(mock_api):
+    pool = TesseractPool(psm=3, lang="eng", size=2)
+
+    with pool.handle() as api_1:
+        pass
+    with pool.handle() as api_2:
+        pass
+
+    assert api_1 is api_2
+    mock_api.assert_called_once_with(psm=3, lang="eng")
+    api_1.Clear.assert_called()
+
+
+@patch("app.utility.ocr.PyTessBaseAPI", side_effect=lambda **_: MagicMock())
+def test_pool_is_bounded_across_threads(mock_api):
+    pool = TesseractPool(size=2)
+    barrier = threading.Barrier(4, timeout=5)
+    in_use = set()
+    max_in_use = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        for _ in range(5):
+            with pool.handle() as api:
+                with lock:
+                    in_use.add(id(api))
+                    max_in_use.append(len(in_use))
+                with lock:
+                    in_use.discard(id(api))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_api.call_count <= 2
+    assert max(max_in_use) <= 2
+
+
+@patch("app.utility.ocr.PyTessBaseAPI")
+def test_close_ends_handles(mock_api):
+    pool = TesseractPool(size=1)
+    with pool.handle() as api:
+        pass
+
+    pool.close()
+
+    api.End.assert_called_once()
+    with pytest.raises(RuntimeError):
+        with pool.handle():
+            pass
+
+
+@pytest.mark.parametrize(
+    "osd_result, expected",
+    [
+        (None, None),
+        (
+            {
+                "orient_deg": 90,
+                "orient_conf": 12.5,
+                "script_name": "Latin",
+                "script_conf": 5.0,
+            },
+            {
+                "orientation": 90,
+                "rotate": 270,
+                "orientation_conf": 12.5,
+                "script": "Latin",
+                "script_conf": 5.0,
+            },
+        ),
+    ],
+)
+@patch("app.utility.ocr.PyTessBaseAPI")
+def test_detect_orientation(mock_api, osd_result, expected):
+    mock_api.return_value.DetectOrientationScript.return_value = osd_result
+
+    assert detect_orientation(np.zeros((10, 10, 3), dtype=np.uint8)) == expected
@@ -0,0 +1,140 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.utility.image_reader import ImageReader
+from app.utility.page_image import PageImage, PageSequence, load_page_image
+
+
+@pytest.fixture
+def page_image():
+    image = np.zeros((40, 20, 3), dtype=np.uint8)
+    image[:, :, 2] = 255
+    return PageImage(image, page_number=1, source="test.pdf")
+
+
+def test_gray_is_cached_until_rotate(page_image):
+    gray = page_image.gray
+
+    assert gray.shape == (40, 20)
+    assert page_image.gray is gray
+
+    page_image.rotate(90)
+
+    assert page_image.shape[:2] == (20, 40)
+    assert page_image.gray.shape == (20, 40)
+
+
+def test_rgb(page_image):
+    assert page_image.rgb[0, 0].tolist() == [255, 0, 0]
+
+
+def test_downscaled(page_image):
+    assert page_image.downscaled(20).shape[:2] == (20, 10)
+    assert page_image.downscaled(100) is page_image.image
+
+
+def test_save_is_opt_in(page_image, tmp_path):
+    assert list(tmp_path.iterdir()) == []
+
+    file_name = page_image.save(str(tmp_path))
+
+    assert np.array_equal(cv2.imread(file_name), page_image.image)
+
+
+def test_load_page_image(page_image, tmp_path):
+    file_name = page_image.save(str(tmp_path))
+
+    assert load_page_image(page_image) is page_image.image
+    assert load_page_image(page_image.image) is page_image.image
+    assert np.array_equal(load_page_image(file_name), page_image.image)
+
+
+def test_read_pages_from_tif(tmp_path):
+    file_name = str(tmp_path / "scan.tif")
+    pages = [
+        np.full((30, 20), 50, dtype=np.uint8),
+        np.full((30, 20), 200, dtype=np.uint8),
+    ]
+    cv2.imwritemulti(file_name, pages)
+
+    page_images = ImageReader.read_pages(file_name)
+
+    assert [page.page_number for page in page_images] == [1, 2]
+    assert all(page.shape == (30, 20, 3) for page in page_images)
+    assert page_images[1].gray[0, 0] == 200
+
+
+def test_page_sequence_renders_lazily_in_chunks():
+    rendered = []
+
+    def render_pages(first_page, last_page):
+        rendered.append((first_page, last_page))
+        return [
+            PageImage(np.zeros((2, 2, 3), dtype=np.uint8), page_number=page_number)
+            for page_number in range(first_page, last_page + 1)
+        ]
+
+    pages = PageSequence(5, render_pages, chunk_size=2)
+
+    assert len(pages) == 5
+    assert pages.rendered_count == 0
+
+    assert pages[1].page_number == 2
+    assert rendered == [(1, 2)]
+
+    assert [page.page_number for page in pages[1:4]] == [2, 3, 4]
+    assert rendered == [(1, 2), (3, 4)]
+
+    assert [page.page_number for page in pages] == [1, 2, 3, 4, 5]
+    assert rendered == [(1, 2), (3, 4), (5, 5)]
+
+    with pytest.raises(IndexError):
+        _ = pages[5]
+
+
+def test_open_pages_from_tif(tmp_path):
+    file_name = str(tmp_path / "scan.tif")
+    cv2.imwritemulti(
+        file_name, [np.full((30, 20), value, dtype=np.uint8) for value in (10, 20, 30)]
+    )
+    preprocessed = []
+
+    pages = ImageReader.open_pages(
+        file_name, chunk_size=2, preprocess=lambda chunk: preprocessed.extend(chunk)
+    )
+
+    assert len(pages) == 3
+    assert pages[0].gray[0, 0] == 10
+    assert len(preprocessed) == 2
+    assert [page.gray[0, 0] for page in pages] == [10, 20, 30]
+    assert [page.page_number for page in preprocessed] == [1, 2, 3]
+
+
+def test_open_barcode_scan_reads_pdf_once(monkeypatch):
+    from PIL import Image
+
+    from app.utility import image_reader
+
+    reads = []
+    rendered = []
+
+    def read_bytes(file_name):
+        reads.append(file_name)
+        return b"%PDF"
+
+    def convert_from_bytes(raw_img, first_page, last_page, **kwargs):
+        assert raw_img == b"%PDF"
+        rendered.append((first_page, last_page, kwargs.get("dpi")))
+        return [Image.new("RGB", (20, 30)) for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(ImageReader, "_read_bytes", staticmethod(read_bytes))
+    monkeypatch.setattr(image_reader, "pdfinfo_from_bytes", lambda _: {"Pages": 2})
+    monkeypatch.setattr(image_reader, "convert_from_bytes", convert_from_bytes)
+
+    barcode_scan = ImageReader.open_barcode_scan("scan.pdf", chunk_size=2)
+    _ = barcode_scan.preview_pages[0]
+    _ = barcode_scan[1]
+
+    assert reads == ["scan.pdf"]
+    assert rendered == [(1, 2, 150), (2, 2, None)]
@@ -0,0 +1,59 @@
+import random
+import threading
+import time
+
+import pytest
+
+from app.utility.page_scheduler import PageScheduler
+
+
+@pytest.fixture
+def page_scheduler():
+    scheduler = PageScheduler(max_workers=4)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_map_keeps_page_order(page_scheduler):
+    def slow_double(page):
+        time.sleep(random.uniform(0, 0.01))
+        return page * 2
+
+    pages = list(range(20))
+
+    assert page_scheduler.map(slow_double, pages) == [page * 2 for page in pages]
+
+
+def test_map_uses_multiple_workers(page_scheduler):
+    thread_names = set()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def record_thread(page):
+        thread_names.add(threading.current_thread().name)
+        barrier.wait()
+        return page
+
+    page_scheduler.map(record_thread, [1, 2])
+
+    assert len(thread_names) == 2
+
+
+def test_map_runs_inline_with_single_worker():
+    page_scheduler = PageScheduler(max_workers=1)
+
+    thread_names = page_scheduler.map(
+        lambda page: threading.current_thread().name, [1, 2]
+    )
+
+    assert thread_names == [threading.current_thread().name] * 2
+    assert page_scheduler._executor is None
+
+
+def test_map_raises_page_exceptions(page_scheduler):
+    def fail_on_three(page):
+        if page == 3:
+            raise ValueError("bad page")
+        return page
+
+    with pytest.raises(ValueError, match="bad page"):
+        page_scheduler.map(fail_on_three, [1, 2, 3, 4])
@@ -0,0 +1,62 @@
+import os
+from unittest.mock import ANY, MagicMock, patch
+
+import pytest
+
+from app.utility.bucket_manager import BucketManager
+from app.utility.custom_logging import LogMessageDetails
+from app.utility.runtime_context import (
+    RuntimeContext,
+    get_runtime_context,
+    reset_runtime_context,
+)
+
+
+@pytest.fixture(autouse=True)
+def setup_environment_variables():
+    os.environ["ENVIRONMENT"] = "testing"
+    os.environ["TARGET_ENVIRONMENT"] = "target-testing"
+    reset_runtime_context()
+    yield
+    reset_runtime_context()
+
+
+def test_get_or_create_builds_once():
+    runtime_context = RuntimeContext()
+    factory = MagicMock(return_value="built")
+
+    assert runtime_context.get_or_create("key", factory) == "built"
+    assert runtime_context.get_or_create("key", factory) == "built"
+    factory.assert_called_once()
+
+
+def test_invalidate():
+    runtime_context = RuntimeContext()
+    runtime_context.get_or_create("key_1", lambda: 1)
+    runtime_context.get_or_create("key_2", lambda: 2)
+
+    runtime_context.invalidate("key_1")
+    assert "key_1" not in runtime_context
+    assert "key_2" in runtime_context
+
+    runtime_context.invalidate()
+    assert "key_2" not in runtime_context
+
+
+def test_get_runtime_context_is_shared_until_reset():
+    runtime_context = get_runtime_context()
+    assert get_runtime_context() is runtime_context
+
+    reset_runtime_context()
+    assert get_runtime_context() is not runtime_context
+
+
+@patch("boto3.client")
+def test_bucket_managers_share_s3_client(mock_boto3):
+    runtime_context = get_runtime_context()
+
+    bucket_manager_1 = BucketManager("abc", LogMessageDetails(), runtime_context)
+    bucket_manager_2 = BucketManager("def", LogMessageDetails(), runtime_context)
+
+    assert bucket_manager_1.s3 is bucket_manager_2.s3
+    mock_boto3.assert_called_once_with("s3", region_name="eu-west-1", config=ANY)
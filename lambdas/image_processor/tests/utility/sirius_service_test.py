@@ -45,15 +45,39 @@ def test_build_sirius_headers(sirius_service, monkeypatch):
         assert "exp" in decoded_token
 
 
+def test_build_sirius_headers_reuses_token(sirius_service, monkeypatch):
+    monkeypatch.setenv("SESSION_DATA", "test-session-data")
+
+    with patch.object(
+        sirius_service, "get_secret", return_value="my-test-secret"
+    ) as mock_get_secret:
+        headers_1 = sirius_service.build_sirius_headers()
+        headers_2 = sirius_service.build_sirius_headers()
+
+        assert headers_1["Authorization"] == headers_2["Authorization"]
+        mock_get_secret.assert_called_once()
+
+        # A new token is signed shortly before the current one expires
+        sirius_service.auth_cache.token_refresh_at = 0
+        sirius_service.build_sirius_headers()
+        mock_get_secret.assert_called_once()
+
+        # and the secret is fetched again once the cached copy is too old
+        sirius_service.auth_cache.secret_expires_at = 0
+        sirius_service.auth_cache.token_refresh_at = 0
+        sirius_service.build_sirius_headers()
+        assert mock_get_secret.call_count == 2
+
+
 @pytest.fixture
 def mock_get():
-    with patch("app.utility.sirius_service.requests.get") as mock_get:
+    with patch("app.utility.sirius_service.requests.Session.get") as mock_get:
         yield mock_get
 
 
 def test_make_request_to_sirius_successful(mock_get, monkeypatch, sirius_service):
     # Setup the mock response
-    mock_response = MagicMock()
+    mock_response = MagicMock(status_code=200)
     mock_response.text = '{"key": "value"}'
     mock_get.return_value = mock_response
 
@@ -70,6 +94,26 @@ def test_make_request_to_sirius_successful(mock_get, monkeypatch, sirius_service
     assert response_dict == {"key": "value"}
 
 
+def test_make_request_to_sirius_refreshes_secret_on_auth_error(
+    mock_get, monkeypatch, sirius_service
+):
+    monkeypatch.setenv("SESSION_DATA", "test-session-data")
+    unauthorised_response = MagicMock(status_code=401)
+    ok_response = MagicMock(status_code=200, text='{"key": "value"}')
+    mock_get.side_effect = [unauthorised_response, ok_response]
+
+    with patch.object(
+        sirius_service, "get_secret", side_effect=["old-secret", "new-secret"]
+    ):
+        response_dict = sirius_service.make_request_to_sirius(test_uid)
+
+    assert response_dict == {"key": "value"}
+    assert mock_get.call_count == 2
+    token = mock_get.call_args.kwargs["headers"]["Authorization"][7:]
+    assert jwt.decode(token, "new-secret", algorithms=["HS256"])
+    assert sirius_service.auth_cache.secret == "new-secret"
+
+
 def test_make_request_to_sirius_exception(mock_get, monkeypatch, sirius_service):
     # Setup the mock request exception
     mock_get.side_effect = requests.exceptions.RequestException("Test Exception")
@@ -89,7 +133,7 @@ def test_make_request_to_sirius_exception(mock_get, monkeypatch, sirius_service)
 
 def test_make_request_to_sirius_decode_exception(mock_get, monkeypatch, sirius_service):
     # Setup the mock response
-    mock_response = MagicMock()
+    mock_response = MagicMock(status_code=200)
     mock_response.text = "Invalid JSON"
     mock_get.return_value = mock_response
 
@@ -140,3 +184,33 @@ def test_get_secret(sirius_service):
     with pytest.raises(Exception) as e:
         sirius_service.get_secret()
     assert "Unable to get secret for JWT key from Secrets Manager" in str(e)
+
+
+@patch("app.utility.sirius_service.time.sleep")
+def test_get_from_sirius_retries_server_errors(mock_sleep, mock_get, sirius_service):
+    mock_get.side_effect = [
+        requests.exceptions.ConnectionError("Connection reset"),
+        MagicMock(status_code=503),
+        MagicMock(status_code=200),
+    ]
+
+    response = sirius_service.get_from_sirius("http://sirius-test", headers={})
+
+    assert response.status_code == 200
+    assert mock_get.call_count == 3
+    assert mock_sleep.call_count == 2
+    assert mock_get.call_args.kwargs["timeout"] == sirius_service.timeout
+
+
+@patch("app.utility.sirius_service.time.sleep")
+def test_get_from_sirius_gives_up_after_max_attempts(
+    mock_sleep, mock_get, sirius_service
+):
+    sirius_service.max_attempts = 2
+    mock_get.side_effect = requests.exceptions.ReadTimeout("Read timed out")
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        sirius_service.get_from_sirius("http://sirius-test", headers={})
+
+    assert mock_get.call_count == 2
+    mock_sleep.assert_called_once()
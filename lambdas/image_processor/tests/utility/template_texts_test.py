@@ -0,0 +1,123 @@
+import os
+import re
+
+from fuzzywuzzy import fuzz
+
+from app.utility.template_texts import TemplateTexts
+
+target_texts_directory = "extraction/target_texts"
+
+
+class MockFormPage:
+    def __init__(self, page_text, identifier):
+        self.additional_args = {"extra": {"page_text": page_text}}
+        self.identifier = identifier
+
+
+def compile_identifiers(form_pages):
+    return [re.compile(form_page.identifier, re.DOTALL) for form_page in form_pages]
+
+
+def test_page_text_is_read_once(monkeypatch):
+    template_texts = TemplateTexts(target_texts_directory)
+    form_page = MockFormPage("lp1f_1.txt", "(.*instructions.*)")
+
+    text = template_texts.page_text(form_page)
+    monkeypatch.setattr("builtins.open", None)
+
+    assert template_texts.page_text(form_page) == text
+
+
+def test_similarity_matrix_matches_fuzz_ratio():
+    template_texts = TemplateTexts(target_texts_directory)
+    form_pages = [
+        MockFormPage(file_name, "(.*instructions.*)" if index % 2 else "(.*)")
+        for index, file_name in enumerate(sorted(os.listdir(target_texts_directory)))
+    ]
+    meta_page_texts = [template_texts.page_text(form_page) for form_page in form_pages]
+    scan_texts = [
+        meta_page_texts[0],
+        meta_page_texts[1][: len(meta_page_texts[1]) // 2],
+        meta_page_texts[2].upper(),
+        "",
+    ]
+
+    identifiers = compile_identifiers(form_pages)
+
+    scores = template_texts.similarity_matrix(
+        form_pages, identifiers, meta_page_texts, scan_texts
+    )
+
+    assert scores.shape == (len(form_pages), len(scan_texts))
+    for row, identifier in enumerate(identifiers):
+        for column, scan_text in enumerate(scan_texts):
+            expected = (
+                fuzz.ratio(scan_text, meta_page_texts[row])
+                if identifier.search(scan_text)
+                else 0
+            )
+            assert scores[row, column] == expected
+
+
+def test_similarity_matrix_without_scan_pages():
+    template_texts = TemplateTexts(target_texts_directory)
+    form_page = MockFormPage("lp1f_1.txt", "(.*)")
+
+    scores = template_texts.similarity_matrix(
+        [form_page],
+        compile_identifiers([form_page]),
+        [template_texts.page_text(form_page)],
+        [],
+    )
+
+    assert scores.shape == (1, 0)
+
+
+def test_token_index_shortlists_matching_template():
+    template_texts = TemplateTexts(target_texts_directory)
+    file_names = sorted(os.listdir(target_texts_directory))
+    form_pages = [MockFormPage(file_name, "(.*)") for file_name in file_names]
+
+    for form_page in form_pages:
+        scan_text = template_texts.page_text(form_page)
+        shortlist = template_texts.token_index.shortlist(scan_text, file_names, 3)
+
+        # Some templates have pages with the same text, either of which will do
+        assert scan_text in [
+            template_texts.page_text(MockFormPage(file_name, "(.*)"))
+            for file_name in shortlist
+        ]
+
+
+def test_similarity_matrix_shortlist_keeps_best_matches():
+    template_texts = TemplateTexts(target_texts_directory)
+    file_names = sorted(os.listdir(target_texts_directory))
+    form_pages = [MockFormPage(file_name, "(.*)") for file_name in file_names]
+    groups = [file_name.split("_")[0] for file_name in file_names]
+    meta_page_texts = [template_texts.page_text(form_page) for form_page in form_pages]
+    scan_texts = [meta_page_texts[0], meta_page_texts[-1].upper()]
+
+    identifiers = compile_identifiers(form_pages)
+
+    full = template_texts.similarity_matrix(
+        form_pages, identifiers, meta_page_texts, scan_texts
+    )
+    pruned = template_texts.similarity_matrix(
+        form_pages,
+        identifiers,
+        meta_page_texts,
+        scan_texts,
+        groups=groups,
+        shortlist_size=2,
+    )
+
+    # Templates that aren't shortlisted aren't scored
+    assert (pruned == 0).any(axis=1).sum() > 0
+    assert (pruned.argmax(axis=0) == full.argmax(axis=0)).all()
+    for row in range(len(form_pages)):
+        if pruned[row].any():
+            assert (pruned[row] == full[row]).all()
+            # Every page of a shortlisted template is scored
+            for other in range(len(form_pages)):
+                if groups[other] == groups[row]:
+                    assert (pruned[other] == full[other]).all()
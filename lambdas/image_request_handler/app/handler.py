@@ -1,13 +1,16 @@
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from aws_xray_sdk.core import xray_recorder
 from aws_xray_sdk.core import patch_all
 
 import boto3
 import botocore.exceptions
+from app.utility.aws_clients import client_config, get_or_create_client
 from app.utility.custom_logging import custom_logger, get_event_details_for_logs
+from app.utility.status_cache import StatusCache, get_status_cache
 
 logger = custom_logger("request_handler")
 
@@ -15,21 +18,32 @@ patch_all()
 
 
 class ImageRequestHandler:
-    def __init__(self, uid, bucket, sqs_queue, event):
+    def __init__(self, uid, bucket, sqs_queue, event, status_cache: StatusCache = None):
         self.environment = os.getenv("ENVIRONMENT")
-        self.s3 = self.setup_s3_connection()
-        self.sqs = self.setup_sqs_connection()
+        # Clients are built once per container and reused by warm invocations
+        self.s3 = get_or_create_client(
+            ("s3", self.environment), self.setup_s3_connection
+        )
+        self.sqs = get_or_create_client(
+            ("sqs", self.environment), self.setup_sqs_connection
+        )
         self.uid = str(int(uid))
         self.bucket = bucket
         self.sqs_queue = sqs_queue
         self.images_to_check = self.images_to_check()
         self.total_images = len(self.images_to_check)
         self.image_to_store_metadata_against = f"iap-{self.uid}-instructions"
+        self.manifest = f"iap-{self.uid}-manifest"
+        self.instructions_version = None
         self.continuation_sheet_instructions_count = 0
         self.continuation_sheet_preferences_count = 0
         self.continuation_sheet_unknown_count = 0
         self.url_expiration = 60
+        self.status_check_workers = int(os.getenv("STATUS_CHECK_WORKERS", "10"))
         self.event = event
+        self.status_cache = (
+            status_cache if status_cache is not None else get_status_cache()
+        )
 
     def setup_sqs_connection(self):
         if self.environment == "local":
@@ -37,9 +51,10 @@ class ImageRequestHandler:
                 "sqs",
                 endpoint_url="http://localstack-processor:4566",
                 region_name="eu-west-1",
+                config=client_config(),
             )
         else:
-            sqs = boto3.client("sqs", region_name="eu-west-1")
+            sqs = boto3.client("sqs", region_name="eu-west-1", config=client_config())
         return sqs
 
     def setup_s3_connection(self):
@@ -48,9 +63,10 @@ class ImageRequestHandler:
                 "s3",
                 endpoint_url="http://localstack-request-handler:4566",
                 region_name="eu-west-1",
+                config=client_config(),
             )
         else:
-            s3 = boto3.client("s3", region_name="eu-west-1")
+            s3 = boto3.client("s3", region_name="eu-west-1", config=client_config())
         return s3
 
     def process_request(self) -> dict:
@@ -61,12 +77,40 @@ class ImageRequestHandler:
         - dict: HTTP response with signed URLs for processed images.
         """
         try:
-            # Check the statuses of the images to be processed
-            image_statuses = self.check_image_statuses(self.images_to_check)
+            # Completed collections don't change, so a warm container answers repeat
+            # requests from its cache with a single check that the instructions image is
+            # the one the statuses were cached against. Any other container may have seen
+            # the extracts deleted and queued the collection again
+            image_statuses = None
+            if self.uid in self.status_cache:
+                if self.instructions_in_bucket() is None:
+                    # e.g. the extracts have been deleted to be extracted again
+                    self.status_cache.invalidate(self.uid)
+                else:
+                    image_statuses = self.status_cache.get(
+                        self.uid, version=self.instructions_version
+                    )
+            cached = image_statuses is not None
+            if not cached:
+                # Processed images are described by a manifest that answers the request in a
+                # single read. Older UIDs and those still being processed don't have one, so
+                # fall back to checking each image
+                image_statuses = self.image_statuses_from_manifest(self.images_to_check)
+                if image_statuses is None:
+                    image_statuses = self.check_image_statuses(self.images_to_check)
 
             # Get the overall status of the image collection based on individual image statuses
             image_collection_status = self.get_image_collection_status(image_statuses)
 
+            if image_collection_status == "COLLECTION_COMPLETE":
+                if not cached and self.instructions_version is not None:
+                    self.status_cache.put(
+                        self.uid, image_statuses, version=self.instructions_version
+                    )
+            else:
+                # e.g. the extracts have been deleted so the collection is being processed again
+                self.status_cache.invalidate(self.uid)
+
             if image_collection_status == "COLLECTION_ERROR":
                 raise Exception("Collection Error")
 
@@ -122,68 +166,163 @@ class ImageRequestHandler:
         """
 
         image_statuses = {}
-        # Check the status of each image in the list
-        for image in images_to_check:
-            logger.debug(f"Checking image status for {image}")
-            image_statuses[image] = self.image_status_in_bucket(image)
-
-        # Check the status of continuation instruction images
-        for index in range(self.continuation_sheet_instructions_count):
-            continuation_instruction_image = (
-                f"iap-{self.uid}-continuation_instructions_{index + 1}"
-            )
-            try:
-                logger.debug(
-                    f"Checking continuation instruction image status for: {continuation_instruction_image}"
-                )
-                image_statuses[
-                    continuation_instruction_image
-                ] = self.image_status_in_bucket(continuation_instruction_image)
-            except Exception as e:
-                raise Exception(
-                    f"Error assigning image status for instruction "
-                    f"continuation sheets {continuation_instruction_image}: {e}"
+        # The instructions image carries the continuation sheet counts, so it's checked
+        # before the rest to learn which continuation images to look for
+        metadata_image = self.image_to_store_metadata_against
+        if metadata_image in images_to_check:
+            logger.debug(f"Checking image status for {metadata_image}")
+            image_statuses[metadata_image] = self.image_status_in_bucket(metadata_image)
+
+        images = [(image, None) for image in images_to_check if image != metadata_image]
+        images.extend(self.continuation_images())
+
+        # The remaining images are independent of each other so are checked concurrently
+        if len(images) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(len(images), self.status_check_workers)
+            ) as executor:
+                statuses = list(
+                    executor.map(lambda args: self.check_image_status(*args), images)
                 )
+        else:
+            statuses = [self.check_image_status(*args) for args in images]
 
-        # Check the status of continuation preference images
-        for index in range(self.continuation_sheet_preferences_count):
-            continuation_preference_image = (
-                f"iap-{self.uid}-continuation_preferences_{index + 1}"
-            )
-            try:
-                logger.debug(
-                    f"Checking continuation preference image status for: {continuation_preference_image}"
-                )
-                image_statuses[
-                    continuation_preference_image
-                ] = self.image_status_in_bucket(continuation_preference_image)
-            except Exception as e:
-                raise Exception(
-                    f"Error assigning image status for preference  "
-                    f"continuation sheets {continuation_preference_image}: {e}"
-                )
+        for (image, _), status in zip(images, statuses):
+            image_statuses[image] = status
 
-        # Check the status of continuation preference images
-        for index in range(self.continuation_sheet_unknown_count):
-            continuation_unknown_image = (
-                f"iap-{self.uid}-continuation_unknown_{index + 1}"
-            )
-            try:
-                logger.debug(
-                    f"Checking continuation preference image status for: {continuation_unknown_image}"
+        logger.debug(f"Image statuses: {image_statuses}")
+        return image_statuses
+
+    def continuation_images(self) -> list:
+        """
+        Returns the continuation sheet images expected from the current counts, as tuples of
+        image name and continuation sheet type.
+        """
+        images = []
+        for sheet_type, count in [
+            ("instructions", self.continuation_sheet_instructions_count),
+            ("preferences", self.continuation_sheet_preferences_count),
+            ("unknown", self.continuation_sheet_unknown_count),
+        ]:
+            for index in range(count):
+                images.append(
+                    (
+                        f"iap-{self.uid}-continuation_{sheet_type}_{index + 1}",
+                        sheet_type,
+                    )
                 )
-                image_statuses[
-                    continuation_unknown_image
-                ] = self.image_status_in_bucket(continuation_unknown_image)
-            except Exception as e:
-                raise Exception(
-                    f"Error assigning image status for unknown  "
-                    f"continuation sheets {continuation_unknown_image}: {e}"
+        return images
+
+    def image_statuses_from_manifest(self, images_to_check) -> dict:
+        """
+        Reads the manifest written by the processor and returns the status of each image,
+        in the same form as check_image_statuses. The manifest is only used if the
+        instructions image it lists is still in the bucket with the same size and error flag.
+
+        Args:
+        - images_to_check (list): A list of image names to check the status of.
+
+        Returns:
+        - dict: A dictionary mapping each image name to its status, or None if there's
+          no usable manifest or it's out of date.
+        """
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.manifest)
+            manifest = json.loads(response["Body"].read())
+            continuation_sheets = manifest["continuationSheets"]
+            instructions_count = int(continuation_sheets["instructions"])
+            preferences_count = int(continuation_sheets["preferences"])
+            unknown_count = int(continuation_sheets["unknown"])
+            process_error = int(manifest["processError"])
+            image_sizes = manifest["images"]
+            # A manifest left behind after its images were deleted, or the collection
+            # was queued again, no longer describes the bucket. The placeholder added when
+            # a collection is queued is empty like the error file, but isn't flagged
+            instructions = self.instructions_in_bucket()
+            if (
+                instructions is None
+                or self.image_to_store_metadata_against not in image_sizes
+                or instructions["ContentLength"]
+                != image_sizes[self.image_to_store_metadata_against]
+                or instructions.get("Metadata", {}).get("processerror", "0")
+                != str(process_error)
+            ):
+                logger.debug(f"{self.manifest} doesn't match the images in the bucket")
+                return None
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] not in ["NoSuchKey", "404"]:
+                logger.warning(f"Unable to read {self.manifest}: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"Unable to read {self.manifest}: {e}")
+            return None
+
+        self.continuation_sheet_instructions_count = instructions_count
+        self.continuation_sheet_preferences_count = preferences_count
+        self.continuation_sheet_unknown_count = unknown_count
+
+        image_statuses = {}
+        images = list(images_to_check)
+        images.extend(image for image, _ in self.continuation_images())
+        for image in images:
+            if image == self.image_to_store_metadata_against and process_error == 1:
+                image_statuses[image] = "ERROR"
+            elif image not in image_sizes:
+                image_statuses[image] = "NOT_FOUND"
+            else:
+                image_statuses[image] = (
+                    "EXISTS" if image_sizes[image] > 0 else "IN_PROGRESS"
                 )
 
-        logger.debug(f"Image statuses: {image_statuses}")
+        logger.debug(f"Image statuses from {self.manifest}: {image_statuses}")
         return image_statuses
 
+    def instructions_in_bucket(self) -> dict:
+        """
+        Returns the head_object response for the instructions image in the bucket, or None
+        if it doesn't exist, and records its version.
+        """
+        try:
+            file = self.s3.head_object(
+                Bucket=self.bucket, Key=self.image_to_store_metadata_against
+            )
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ["NoSuchKey", "404"]:
+                self.instructions_version = None
+                return None
+            raise
+        self.set_instructions_version(file)
+        return file
+
+    def set_instructions_version(self, file: dict) -> None:
+        """
+        Records the version of the instructions image from a head_object response. The ETag
+        alone doesn't change if an extract is replaced with the same bytes but different
+        continuation sheet counts, so the last modified time is included.
+        """
+        self.instructions_version = (file.get("ETag"), file.get("LastModified"))
+
+    def check_image_status(
+        self, image: str, continuation_sheet_type: str = None
+    ) -> str:
+        """
+        Returns the status of a single image, naming the continuation sheet type on error.
+        """
+        if continuation_sheet_type is None:
+            logger.debug(f"Checking image status for {image}")
+            return self.image_status_in_bucket(image)
+
+        try:
+            logger.debug(
+                f"Checking continuation {continuation_sheet_type} image status for: {image}"
+            )
+            return self.image_status_in_bucket(image)
+        except Exception as e:
+            raise Exception(
+                f"Error assigning image status for {continuation_sheet_type} "
+                f"continuation sheets {image}: {e}"
+            )
+
     def image_status_in_bucket(self, image: str) -> str:
         """
         Returns the status of an image in a bucket. The status is one of
@@ -211,6 +350,7 @@ class ImageRequestHandler:
                 self.continuation_sheet_unknown_count = int(
                     file["Metadata"]["continuationsheetsunknown"]
                 )
+                self.set_instructions_version(file)
                 process_error = file["Metadata"]["processerror"]
                 if process_error == "1":
                     return "ERROR"
@@ -0,0 +1,53 @@
+import os
+import threading
+from typing import Any, Callable, Hashable
+
+from botocore.config import Config
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_config() -> Config:
+    """
+    Returns the botocore config shared by the lambda's boto3 clients.
+
+    The status checks are made concurrently, so the connection pool is sized for them
+    and connections are kept alive between warm invocations.
+    """
+    return Config(
+        max_pool_connections=int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "20")),
+        connect_timeout=int(os.getenv("AWS_CONNECT_TIMEOUT", "2")),
+        read_timeout=int(os.getenv("AWS_READ_TIMEOUT", "5")),
+        retries={
+            "max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "3")),
+            "mode": "standard",
+        },
+        tcp_keepalive=True,
+    )
+
+
+def get_or_create_client(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """
+    Returns the client stored against key, building it with factory the first time it's
+    needed in this container.
+
+    Args:
+    - key (Hashable): Key identifying the client, e.g. ("s3", environment).
+    - factory (Callable): Zero argument callable used to build the client.
+
+    Returns:
+    - The cached client.
+    """
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def reset_clients() -> None:
+    """
+    Discards the cached clients so that they're rebuilt on next use.
+    """
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from app.utility.custom_logging import custom_logger
+
+logger = custom_logger("status_cache")
+
+
+class StatusCache:
+    """
+    Holds the image statuses of completed image collections, keyed by UID.
+
+    Once a collection is complete its images don't change, so warm invocations can answer
+    repeat requests without checking every image. Each entry records the version of the
+    instructions image it was cached against, and is only used while the instructions image
+    in the bucket has the same version, in case the extracts have been deleted or extracted
+    again since. Entries expire after ttl_seconds, and the least recently used entries are
+    dropped once max_entries is reached.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid: str, version: Hashable = None) -> dict:
+        """
+        Returns the cached image statuses for a UID.
+
+        Args:
+        - uid (str): The UID of the image collection.
+        - version (Hashable): The version of the instructions image now in the bucket.
+
+        Returns:
+        - dict: A copy of the cached image statuses, or None if there's no entry, it has
+          expired or it was cached against a different version of the instructions image.
+        """
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+            expires_at, image_statuses, cached_version = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[uid]
+                logger.debug(f"Cached image statuses for {uid} have expired")
+                return None
+            if cached_version != version:
+                del self._entries[uid]
+                logger.debug(f"Cached image statuses for {uid} are out of date")
+                return None
+            self._entries.move_to_end(uid)
+            return dict(image_statuses)
+
+    def put(self, uid: str, image_statuses: dict, version: Hashable = None) -> None:
+        """
+        Stores the image statuses of a completed collection against a UID.
+
+        Args:
+        - uid (str): The UID of the image collection.
+        - image_statuses (dict): A dictionary mapping each image name to its status.
+        - version (Hashable): The version of the instructions image the statuses describe.
+        """
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[uid] = (
+                time.monotonic() + self.ttl_seconds,
+                dict(image_statuses),
+                version,
+            )
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uid: str = None) -> None:
+        """
+        Removes the cached image statuses for a UID.
+        If no UID is given, all cached entries are removed.
+
+        Args:
+        - uid (str): The UID of the image collection.
+        """
+        with self._lock:
+            if uid is None:
+                self._entries.clear()
+            elif self._entries.pop(uid, None) is not None:
+                logger.debug(f"Invalidated cached image statuses for {uid}")
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_status_cache = None
+_status_cache_lock = threading.Lock()
+
+
+def get_status_cache() -> StatusCache:
+    """
+    Returns the process level status cache, creating it on first use.
+    """
+    global _status_cache
+    with _status_cache_lock:
+        if _status_cache is None:
+            _status_cache = StatusCache(
+                ttl_seconds=float(os.getenv("STATUS_CACHE_TTL_SECONDS", "300")),
+                max_entries=int(os.getenv("STATUS_CACHE_MAX_ENTRIES", "1000")),
+            )
+        return _status_cache
+
+
+def reset_status_cache() -> None:
+    """
+    Discards the process level status cache so that every collection is checked again.
+    """
+    global _status_cache
+    with _status_cache_lock:
+        _status_cache = None
@@ -2,9 +2,11 @@ import os
 import boto3
 import pytest
 import json
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 from moto import mock_aws
 from lambdas.image_request_handler.app.handler import ImageRequestHandler
+from app.utility.aws_clients import reset_clients
+from app.utility.status_cache import StatusCache, reset_status_cache
 from botocore.stub import Stubber
 
 test_uid = 700000001
@@ -62,6 +64,8 @@ def setup_environment_variables():
     os.environ["AWS_ACCESS_KEY_ID"] = "testing"
     os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
     os.environ["ENVIRONMENT"] = "testing"
+    reset_status_cache()
+    reset_clients()
 
 
 @pytest.fixture
@@ -91,10 +95,13 @@ def test_setup_sqs_connection(mock_boto3, image_request_handler):
     image_request_handler.setup_sqs_connection()
     if image_request_handler.environment == "local":
         mock_boto3.assert_called_with(
-            "sqs", endpoint_url="http://localstack:4566", region_name="eu-west-1"
+            "sqs",
+            endpoint_url="http://localstack:4566",
+            region_name="eu-west-1",
+            config=ANY,
         )
     else:
-        mock_boto3.assert_called_with("sqs", region_name="eu-west-1")
+        mock_boto3.assert_called_with("sqs", region_name="eu-west-1", config=ANY)
 
 
 @patch("boto3.client")
@@ -102,21 +109,39 @@ def test_setup_s3_connection(mock_boto3, image_request_handler):
     image_request_handler.setup_s3_connection()
     if image_request_handler.environment == "local":
         mock_boto3.assert_called_with(
-            "s3", endpoint_url="http://localstack:4566", region_name="eu-west-1"
+            "s3",
+            endpoint_url="http://localstack:4566",
+            region_name="eu-west-1",
+            config=ANY,
         )
     else:
-        mock_boto3.assert_called_with("s3", region_name="eu-west-1")
+        mock_boto3.assert_called_with("s3", region_name="eu-west-1", config=ANY)
+
+
+@patch("boto3.client")
+def test_handlers_share_clients(mock_boto3):
+    handler_1 = ImageRequestHandler(test_uid, test_bucket, test_queue, event)
+    handler_2 = ImageRequestHandler(test_uid, test_bucket, test_queue, event)
+
+    assert handler_1.s3 is handler_2.s3
+    assert handler_1.sqs is handler_2.sqs
+    assert mock_boto3.call_count == 2
+    config = mock_boto3.call_args.kwargs["config"]
+    assert config.max_pool_connections >= handler_1.status_check_workers
+    assert config.tcp_keepalive is True
 
 
 @patch.object(ImageRequestHandler, "image_status_in_bucket")
 def test_check_image_statuses(mock_image_status_in_bucket):
     images_to_check = ["image1", "image2", "image3", "image4"]
-    mock_image_status_in_bucket.side_effect = [
-        "NOT_FOUND",
-        "IN_PROGRESS",
-        "EXISTS",
-        "EXISTS",
-    ]
+    statuses = {
+        "image1": "NOT_FOUND",
+        "image2": "IN_PROGRESS",
+        "image3": "EXISTS",
+        "image4": "EXISTS",
+    }
+    # Images are checked concurrently so the statuses can't depend on call order
+    mock_image_status_in_bucket.side_effect = lambda image: statuses[image]
     handler = ImageRequestHandler("700000001", "test-bucket", "test-queue", event)
     # Test the method with mocked return values
     image_statuses = handler.check_image_statuses(images_to_check)
@@ -129,6 +154,55 @@ def test_check_image_statuses(mock_image_status_in_bucket):
     }
 
 
+def test_check_image_statuses_reads_instructions_first():
+    handler = ImageRequestHandler("700000001", "test-bucket", "test-queue", event)
+    checked = []
+
+    def image_status_in_bucket(image):
+        checked.append(image)
+        if image == handler.image_to_store_metadata_against:
+            handler.continuation_sheet_instructions_count = 2
+            handler.continuation_sheet_preferences_count = 1
+            handler.continuation_sheet_unknown_count = 1
+        return "EXISTS"
+
+    with patch.object(
+        handler, "image_status_in_bucket", side_effect=image_status_in_bucket
+    ):
+        image_statuses = handler.check_image_statuses(handler.images_to_check)
+
+    assert checked[0] == "iap-700000001-instructions"
+    assert list(image_statuses) == [
+        "iap-700000001-instructions",
+        "iap-700000001-preferences",
+        "iap-700000001-continuation_instructions_1",
+        "iap-700000001-continuation_instructions_2",
+        "iap-700000001-continuation_preferences_1",
+        "iap-700000001-continuation_unknown_1",
+    ]
+    assert handler.get_image_collection_status(image_statuses) == "COLLECTION_COMPLETE"
+
+
+def test_check_image_statuses_names_failed_continuation_sheet():
+    handler = ImageRequestHandler("700000001", "test-bucket", "test-queue", event)
+    handler.continuation_sheet_preferences_count = 1
+
+    def image_status_in_bucket(image):
+        if "continuation" in image:
+            raise Exception("Client Error")
+        return "EXISTS"
+
+    with patch.object(
+        handler, "image_status_in_bucket", side_effect=image_status_in_bucket
+    ):
+        with pytest.raises(
+            Exception,
+            match="Error assigning image status for preferences continuation sheets "
+            "iap-700000001-continuation_preferences_1: Client Error",
+        ):
+            handler.check_image_statuses(handler.images_to_check)
+
+
 @mock_aws
 def test_image_status_in_bucket(image_request_handler):
     s3 = boto3.client("s3", region_name="us-east-1")
@@ -163,6 +237,238 @@ def test_image_status_in_bucket(image_request_handler):
             _ = image_request_handler.image_status_in_bucket(image)
 
 
+@mock_aws
+def test_image_statuses_from_manifest(image_request_handler):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    manifest = {
+        "uid": str(test_uid),
+        "processError": 0,
+        "continuationSheets": {"instructions": 1, "preferences": 0, "unknown": 0},
+        "images": {
+            f"iap-{test_uid}-instructions": 100,
+            f"iap-{test_uid}-preferences": 100,
+            f"iap-{test_uid}-continuation_instructions_1": 100,
+        },
+    }
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-manifest",
+        Body=json.dumps(manifest).encode(),
+    )
+    s3.put_object(
+        Bucket=test_bucket, Key=f"iap-{test_uid}-instructions", Body=b"0" * 100
+    )
+
+    with patch.object(image_request_handler, "image_status_in_bucket") as mock_status:
+        image_statuses = image_request_handler.image_statuses_from_manifest(
+            image_request_handler.images_to_check
+        )
+
+    mock_status.assert_not_called()
+    assert image_statuses == {
+        f"iap-{test_uid}-instructions": "EXISTS",
+        f"iap-{test_uid}-preferences": "EXISTS",
+        f"iap-{test_uid}-continuation_instructions_1": "EXISTS",
+    }
+    assert image_request_handler.continuation_sheet_instructions_count == 1
+
+
+@mock_aws
+def test_image_statuses_from_manifest_with_process_error(image_request_handler):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    manifest = {
+        "uid": str(test_uid),
+        "processError": 1,
+        "continuationSheets": {"instructions": 0, "preferences": 0, "unknown": 0},
+        "images": {f"iap-{test_uid}-instructions": 0},
+    }
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-manifest",
+        Body=json.dumps(manifest).encode(),
+    )
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-instructions",
+        Metadata={"ProcessError": "1"},
+    )
+
+    image_statuses = image_request_handler.image_statuses_from_manifest(
+        image_request_handler.images_to_check
+    )
+
+    assert image_statuses == {
+        f"iap-{test_uid}-instructions": "ERROR",
+        f"iap-{test_uid}-preferences": "NOT_FOUND",
+    }
+    assert (
+        image_request_handler.get_image_collection_status(image_statuses)
+        == "COLLECTION_ERROR"
+    )
+
+
+@pytest.mark.parametrize(
+    "images", [{}, {f"iap-{test_uid}-instructions": 0}], ids=["unlisted", "listed"]
+)
+@mock_aws
+def test_image_statuses_from_error_manifest_with_placeholder(
+    image_request_handler, images
+):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    manifest = {
+        "uid": str(test_uid),
+        "processError": 1,
+        "continuationSheets": {"instructions": 0, "preferences": 0, "unknown": 0},
+        "images": images,
+    }
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-manifest",
+        Body=json.dumps(manifest).encode(),
+    )
+    # The errored extracts have been deleted and the collection queued again
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-instructions",
+        Metadata={
+            "ContinuationSheetsInstructions": "0",
+            "ContinuationSheetsPreferences": "0",
+            "ContinuationSheetsUnknown": "0",
+            "ProcessError": "0",
+        },
+    )
+
+    assert (
+        image_request_handler.image_statuses_from_manifest(
+            image_request_handler.images_to_check
+        )
+        is None
+    )
+
+
+@mock_aws
+def test_process_request_ignores_error_manifest_for_requeued_collection():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-manifest",
+        Body=json.dumps(
+            {
+                "uid": str(test_uid),
+                "processError": 1,
+                "continuationSheets": {
+                    "instructions": 0,
+                    "preferences": 0,
+                    "unknown": 0,
+                },
+                "images": {f"iap-{test_uid}-instructions": 0},
+            }
+        ).encode(),
+    )
+    handler = ImageRequestHandler(
+        test_uid,
+        test_bucket,
+        test_queue,
+        event,
+        status_cache=StatusCache(ttl_seconds=300, max_entries=10),
+    )
+    handler.add_temp_images_to_bucket()
+
+    response = handler.process_request()
+
+    assert json.loads(response["body"])["status"] == "COLLECTION_IN_PROGRESS"
+
+
+@mock_aws
+def test_image_statuses_from_manifest_without_manifest(image_request_handler):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+
+    assert (
+        image_request_handler.image_statuses_from_manifest(
+            image_request_handler.images_to_check
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize("instructions", [None, b""])
+@mock_aws
+def test_image_statuses_from_out_of_date_manifest(image_request_handler, instructions):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    manifest = {
+        "uid": str(test_uid),
+        "processError": 0,
+        "continuationSheets": {"instructions": 0, "preferences": 0, "unknown": 0},
+        "images": {
+            f"iap-{test_uid}-instructions": 100,
+            f"iap-{test_uid}-preferences": 100,
+        },
+    }
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-manifest",
+        Body=json.dumps(manifest).encode(),
+    )
+    # The images have been deleted, or replaced by placeholders when queued again
+    if instructions is not None:
+        s3.put_object(
+            Bucket=test_bucket, Key=f"iap-{test_uid}-instructions", Body=instructions
+        )
+
+    assert (
+        image_request_handler.image_statuses_from_manifest(
+            image_request_handler.images_to_check
+        )
+        is None
+    )
+
+
+@mock_aws
+def test_process_request_requeues_collection_with_out_of_date_manifest():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    sqs = boto3.client("sqs", region_name="eu-west-1")
+    sqs.create_queue(QueueName=test_queue)
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-manifest",
+        Body=json.dumps(
+            {
+                "uid": str(test_uid),
+                "processError": 0,
+                "continuationSheets": {
+                    "instructions": 0,
+                    "preferences": 0,
+                    "unknown": 0,
+                },
+                "images": {
+                    f"iap-{test_uid}-instructions": 100,
+                    f"iap-{test_uid}-preferences": 100,
+                },
+            }
+        ).encode(),
+    )
+
+    handler = ImageRequestHandler(
+        test_uid,
+        test_bucket,
+        test_queue,
+        event,
+        status_cache=StatusCache(ttl_seconds=300, max_entries=10),
+    )
+    with patch.object(handler, "add_to_sqs") as mock_add_to_sqs:
+        response = handler.process_request()
+
+    assert json.loads(response["body"])["status"] == "COLLECTION_NOT_STARTED"
+    mock_add_to_sqs.assert_called_once()
+
+
 @mock_aws
 def test_add_to_sqs(image_request_handler):
     sqs = boto3.client("sqs", region_name="eu-west-1")
@@ -346,3 +652,162 @@ def test_process_request(image_request_handler):
         assert response["statusCode"] == 200
         assert len(response_body["signedUrls"].items()) == 5
         assert response_body["status"] == "COLLECTION_COMPLETE"
+
+
+def put_extracts(s3, continuation_instructions_count=0):
+    """
+    Puts a completed collection's extracts in the test bucket.
+    """
+    s3.put_object(
+        Bucket=test_bucket,
+        Key=f"iap-{test_uid}-instructions",
+        Body=f"instructions with {continuation_instructions_count} continuations".encode(),
+        Metadata={
+            "ContinuationSheetsInstructions": str(continuation_instructions_count),
+            "ContinuationSheetsPreferences": "0",
+            "ContinuationSheetsUnknown": "0",
+            "ProcessError": "0",
+        },
+    )
+    s3.put_object(Bucket=test_bucket, Key=f"iap-{test_uid}-preferences", Body=b"0")
+    for index in range(continuation_instructions_count):
+        s3.put_object(
+            Bucket=test_bucket,
+            Key=f"iap-{test_uid}-continuation_instructions_{index + 1}",
+            Body=b"0",
+        )
+
+
+@mock_aws
+def test_process_request_uses_cached_statuses_for_complete_collection():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    put_extracts(s3)
+    status_cache = StatusCache(ttl_seconds=300, max_entries=10)
+
+    handler = ImageRequestHandler(
+        test_uid, test_bucket, test_queue, event, status_cache=status_cache
+    )
+    handler.process_request()
+    assert str(test_uid) in status_cache
+
+    handler = ImageRequestHandler(
+        test_uid, test_bucket, test_queue, event, status_cache=status_cache
+    )
+    with patch.object(handler, "check_image_statuses") as mock_check, patch.object(
+        handler, "image_statuses_from_manifest"
+    ) as mock_manifest:
+        response = handler.process_request()
+
+    mock_check.assert_not_called()
+    mock_manifest.assert_not_called()
+    response_body = json.loads(response["body"])
+    assert response_body["status"] == "COLLECTION_COMPLETE"
+    assert len(response_body["signedUrls"]) == 2
+
+
+@mock_aws
+def test_process_request_rechecks_expired_cache_entry():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    sqs = boto3.client("sqs", region_name="eu-west-1")
+    sqs.create_queue(QueueName=test_queue)
+    status_cache = StatusCache(ttl_seconds=300, max_entries=10)
+    status_cache.put(
+        str(test_uid),
+        {
+            f"iap-{test_uid}-instructions": "EXISTS",
+            f"iap-{test_uid}-preferences": "EXISTS",
+        },
+    )
+
+    # The extracts have since been deleted, so once the entry expires the collection
+    # is started again rather than served from the cache
+    handler = ImageRequestHandler(
+        test_uid, test_bucket, test_queue, event, status_cache=status_cache
+    )
+    with patch("app.utility.status_cache.time.monotonic", return_value=float("inf")):
+        response = handler.process_request()
+
+    assert json.loads(response["body"])["status"] == "COLLECTION_NOT_STARTED"
+    assert str(test_uid) not in status_cache
+
+
+@mock_aws
+def test_process_request_rechecks_cache_entry_for_deleted_extracts():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    sqs = boto3.client("sqs", region_name="eu-west-1")
+    sqs.create_queue(QueueName=test_queue)
+    status_cache = StatusCache(ttl_seconds=300, max_entries=10)
+    status_cache.put(
+        str(test_uid),
+        {
+            f"iap-{test_uid}-instructions": "EXISTS",
+            f"iap-{test_uid}-preferences": "EXISTS",
+        },
+    )
+
+    # The extracts have been deleted since the statuses were cached
+    handler = ImageRequestHandler(
+        test_uid, test_bucket, test_queue, event, status_cache=status_cache
+    )
+    with patch.object(handler, "add_to_sqs") as mock_add_to_sqs:
+        response = handler.process_request()
+
+    assert json.loads(response["body"])["status"] == "COLLECTION_NOT_STARTED"
+    mock_add_to_sqs.assert_called_once()
+    assert str(test_uid) not in status_cache
+
+
+@mock_aws
+def test_process_request_rechecks_cache_entry_for_replaced_extracts():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=test_bucket)
+    put_extracts(s3)
+    status_cache = StatusCache(ttl_seconds=300, max_entries=10)
+
+    handler = ImageRequestHandler(
+        test_uid, test_bucket, test_queue, event, status_cache=status_cache
+    )
+    response = handler.process_request()
+    assert len(json.loads(response["body"])["signedUrls"]) == 2
+
+    # Another container has seen the extracts deleted and the collection has been
+    # extracted again, this time with a continuation sheet
+    put_extracts(s3, continuation_instructions_count=1)
+
+    handler = ImageRequestHandler(
+        test_uid, test_bucket, test_queue, event, status_cache=status_cache
+    )
+    response = handler.process_request()
+
+    response_body = json.loads(response["body"])
+    assert response_body["status"] == "COLLECTION_COMPLETE"
+    assert len(response_body["signedUrls"]) == 3
+    assert status_cache.get(str(test_uid), version=handler.instructions_version) == {
+        f"iap-{test_uid}-instructions": "EXISTS",
+        f"iap-{test_uid}-preferences": "EXISTS",
+        f"iap-{test_uid}-continuation_instructions_1": "EXISTS",
+    }
+
+
+def test_status_cache_ignores_entry_for_other_version():
+    status_cache = StatusCache(ttl_seconds=300, max_entries=10)
+    status_cache.put("1", {"iap-1-instructions": "EXISTS"}, version="a")
+
+    assert status_cache.get("1", version="b") is None
+    assert "1" not in status_cache
+
+
+def test_status_cache_evicts_least_recently_used():
+    status_cache = StatusCache(ttl_seconds=300, max_entries=2)
+    status_cache.put("1", {"iap-1-instructions": "EXISTS"})
+    status_cache.put("2", {"iap-2-instructions": "EXISTS"})
+    assert status_cache.get("1") == {"iap-1-instructions": "EXISTS"}
+
+    status_cache.put("3", {"iap-3-instructions": "EXISTS"})
+
+    assert len(status_cache) == 2
+    assert "1" in status_cache
+    assert "2" not in status_cache